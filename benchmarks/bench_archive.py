@@ -0,0 +1,81 @@
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+import pandas as pd
+
+from benchmarks.synthetic import make_battles
+from set_up_scripts import features_ext
+from set_up_scripts.battle_store import BattleStore, archive_path
+from set_up_scripts.data_processing import DataHandler
+from set_up_scripts.encoding import BattleVocabulary, decode_battle, encode_battle
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def scan_for(file_path, battle_id):
+    """Ricerca di una battaglia nel .jsonl senza indice: si legge fino alla riga giusta."""
+    with open(file_path, 'rb') as f:
+        for line in f:
+            battle = json.loads(line)
+            if battle['battle_id'] == battle_id:
+                return battle
+
+
+def main(n_battles=20000, n_lookups=200):
+    """
+    train.jsonl contro il suo archivio binario (BattleStore.save / DataHandler.open_archive):
+    conversione una tantum, apertura, estrazione delle feature su tutto il file e lettura di
+    singole battaglie per battle_id, con le stesse battaglie e le stesse feature.
+    """
+    battles = make_battles(n_battles)
+    with tempfile.TemporaryDirectory() as data_path:
+        file_path = os.path.join(data_path, 'train.jsonl')
+        with open(file_path, 'w') as f:
+            f.writelines(json.dumps(b) + "\n" for b in battles)
+        print(f"Battaglie: {n_battles}  ({os.path.getsize(file_path) / 2 ** 20:.1f} MB di JSONL)")
+
+        handler = DataHandler(data_path)
+        _, convert_time = timed(lambda: DataHandler(data_path, archive=True).open_archive(file_path))
+        path = archive_path(file_path)
+        size = sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+        print(f"Conversione una tantum: {convert_time:7.2f}s  ({size / 2 ** 20:.1f} MB di archivio)")
+
+        data, read_time = timed(lambda: list(handler.iter_train_battles()))
+        store, open_time = timed(lambda: BattleStore.open(path))
+        print(f"Lettura del JSONL:      {read_time:9.4f}s")
+        print(f"Apertura dell'archivio: {open_time:9.4f}s")
+
+        feature_handler = features_ext.FeatureHandler(None)
+        for engine in ('dict', 'columnar'):
+            reference, jsonl_time = timed(lambda: feature_handler.create_advanced_features(
+                list(handler.iter_train_battles()), engine=engine))
+            df, archive_time = timed(lambda: feature_handler.create_advanced_features(
+                BattleStore.open(path), engine=engine))
+            pd.testing.assert_frame_equal(reference, df, check_exact=True)
+            print(f"[{engine}] JSONL + feature:     {jsonl_time:7.2f}s")
+            print(f"[{engine}] archivio + feature:  {archive_time:7.2f}s  (speedup {jsonl_time / archive_time:.1f}x)")
+
+        ids = random.Random(0).sample([b['battle_id'] for b in data], min(n_lookups, len(data)))
+        vocab = BattleVocabulary()
+        scanned, scan_time = timed(lambda: [scan_for(file_path, i) for i in ids])
+        fetched, get_time = timed(lambda: [decode_battle(store.get(i), store.vocab) for i in ids])
+        for battle, decoded in zip(scanned, fetched):
+            assert decode_battle(encode_battle(battle, vocab), vocab) == decoded
+        print(f"{len(ids)} battaglie per battle_id, scansione del JSONL: {scan_time / len(ids) * 1e3:9.3f} ms l'una")
+        print(f"{len(ids)} battaglie per battle_id, archivio:            {get_time / len(ids) * 1e3:9.3f} ms l'una")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--battles", type=int, default=20000)
+    parser.add_argument("--lookups", type=int, default=200)
+    args = parser.parse_args()
+    main(args.battles, args.lookups)
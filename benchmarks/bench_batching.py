@@ -0,0 +1,66 @@
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.bench_online import train_models
+from benchmarks.synthetic import make_battles
+from models import online
+from models.batching import MicroBatcher
+from models.online import BattlePredictor
+
+
+async def load_test(predictor, battles, clients, max_batch_size, max_wait_ms):
+    """clients richieste in volo alla volta (ogni client manda la successiva appena riceve la risposta)."""
+    probas = [None] * len(battles)
+    latencies = np.empty(len(battles))
+    async with MicroBatcher(predictor, max_batch_size, max_wait_ms) as batcher:
+        async def client(indices):
+            for i in indices:
+                start = time.perf_counter()
+                probas[i] = await batcher.predict_proba(battles[i])
+                latencies[i] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        await asyncio.gather(*(client(range(c, len(battles), clients)) for c in range(clients)))
+        elapsed = time.perf_counter() - start
+    return np.array(probas), latencies, elapsed, np.mean(batcher.batch_sizes)
+
+
+def main(n_requests=5000, clients=64, max_batch_size=64, max_wait_ms=2.0):
+    """
+    Throughput e latenza sotto carico concorrente di MicroBatcher rispetto a una battaglia per
+    chiamata (max_batch_size=1); le probabilita' devono coincidere con predict_many.
+    """
+    battles = make_battles(3000 + n_requests)
+    requests = [{k: v for k, v in b.items() if k != 'player_won'} for b in battles[3000:]]
+    with tempfile.TemporaryDirectory() as model_dir:
+        train_models(battles[:3000], model_dir)
+        print(f"Richieste: {n_requests}, client concorrenti: {clients}, "
+              f"blocchi <= {max_batch_size} battaglie / {max_wait_ms} ms")
+        for name in ('stacking', 'voting'):
+            predictor = BattlePredictor(name, os.path.join(model_dir, online.MODELS[name][0]))
+            expected = predictor.predict_many(requests)
+            results = {}
+            for label, size in (("una per chiamata", 1), ("micro-batch", max_batch_size)):
+                probas, latencies, elapsed, mean_batch = asyncio.run(
+                    load_test(predictor, requests, clients, size, max_wait_ms))
+                assert np.allclose(probas, expected, rtol=0, atol=1e-9)
+                p50, p99 = np.percentile(latencies, [50, 99]) * 1e3
+                results[label] = n_requests / elapsed
+                print(f"{name}: {label:17s} {n_requests / elapsed:9,.0f} battaglie/s   p50 {p50:7.2f} ms   "
+                      f"p99 {p99:7.2f} ms   blocco medio {mean_batch:5.1f}")
+            print(f"{name}: speedup {results['micro-batch'] / results['una per chiamata']:.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--clients", type=int, default=64)
+    parser.add_argument("--max-batch-size", type=int, default=64)
+    parser.add_argument("--max-wait-ms", type=float, default=2.0)
+    args = parser.parse_args()
+    main(args.requests, args.clients, args.max_batch_size, args.max_wait_ms)
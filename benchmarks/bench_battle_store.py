@@ -0,0 +1,101 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+from benchmarks.synthetic import make_battles
+from set_up_scripts import features_ext, features_ext_vot
+from set_up_scripts.battle_store import BattleStore
+from set_up_scripts.columnar import columnar_features, flatten_battles
+from set_up_scripts.encoding import BattleVocabulary, EncodedBattles, encode_battle
+
+LAYOUTS = ("dict", "record", "store")
+
+
+def _rss_mb():
+    """RSS attuale del processo (Linux, /proc/self/statm)."""
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+
+
+def _load(layout, lines):
+    if layout == "dict":
+        return [json.loads(line) for line in lines]
+    vocab = BattleVocabulary()
+    records = (encode_battle(json.loads(line), vocab) for line in lines)
+    if layout == "record":
+        return EncodedBattles(vocab, records)
+    return BattleStore.from_records(records, vocab)
+
+
+def _rss_child(layout, path):
+    """Processo figlio: crescita dell'RSS (MB) per tenere le battaglie del .jsonl, lette riga per riga, con layout."""
+    baseline = _rss_mb()
+    with open(path, 'rb') as f:
+        data = _load(layout, f)
+    print(json.dumps({'rss': _rss_mb() - baseline, 'n': len(data)}))
+
+
+def peak_rss(layout, path):
+    out = subprocess.run([sys.executable, "-m", "benchmarks.bench_battle_store", "--rss-child", layout,
+                          "--path", path], capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.splitlines()[-1])['rss']
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main(n_battles=20000):
+    """
+    Battaglie come dict, come EncodedBattles e come BattleStore (struct-of-arrays): RSS di un
+    processo che le tiene in memoria, estrazione delle feature sui dict e sulle viste dello store e
+    costruzione della TurnTable (flatten_battles contro store.turn_table), con le stesse feature.
+    """
+    print(f"Battaglie: {n_battles}")
+    lines = [json.dumps(b) for b in make_battles(n_battles)]
+    with tempfile.NamedTemporaryFile("w", suffix=".jsonl") as f:
+        f.writelines(line + "\n" for line in lines)
+        f.flush()
+        for layout in LAYOUTS:
+            print(f"RSS {layout:7s} {peak_rss(layout, f.name):8.1f} MB")
+
+    battles = _load("dict", lines)
+    store = _load("store", lines)
+    print(f"Array dello store: {store.nbytes / 2 ** 20:.1f} MB")
+
+    for feature_set, extract, extract_record in (
+            ("stacking", features_ext.extract_battle_features, features_ext.extract_record_features),
+            ("voting", features_ext_vot.extract_battle_features, features_ext_vot.extract_record_features)):
+        reference, dict_time = timed(lambda: pd.DataFrame([extract(b) for b in battles]).fillna(0))
+        df, store_time = timed(lambda: pd.DataFrame([extract_record(r, store.vocab) for r in store]).fillna(0))
+        pd.testing.assert_frame_equal(reference, df, check_exact=True)
+        print(f"[{feature_set}] loop sui dict:   {dict_time:7.2f}s  ({n_battles / dict_time:8.0f} battaglie/s)")
+        print(f"[{feature_set}] loop sullo store: {store_time:7.2f}s  ({n_battles / store_time:8.0f} battaglie/s)")
+
+    flat, flatten_time = timed(lambda: flatten_battles(battles))
+    table, table_time = timed(store.turn_table)
+    for feature_set in ("stacking", "voting"):
+        pd.testing.assert_frame_equal(columnar_features(flat, feature_set), columnar_features(table, feature_set),
+                                      check_exact=True)
+    print(f"TurnTable da flatten_battles: {flatten_time:7.2f}s")
+    print(f"TurnTable da store.turn_table: {table_time:7.2f}s  (speedup {flatten_time / table_time:.1f}x)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--battles", type=int, default=20000)
+    parser.add_argument("--rss-child", choices=LAYOUTS, default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--path", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.rss_child:
+        _rss_child(args.rss_child, args.path)
+    else:
+        main(args.battles)
@@ -0,0 +1,44 @@
+import argparse
+import time
+
+import pandas as pd
+
+from benchmarks.synthetic import make_battles
+from set_up_scripts import features_ext, features_ext_vot
+from set_up_scripts.columnar import flatten_battles, columnar_features
+
+
+def main(n_battles=50000):
+    """
+    Confronta il loop sui dict con lo stadio colonnare: l'appiattimento si fa una volta sola,
+    poi ogni set di feature e' una serie di riduzioni vettoriali.
+    """
+    battles = make_battles(n_battles)
+    print(f"Battaglie: {n_battles}")
+
+    start = time.perf_counter()
+    table = flatten_battles(battles)
+    flatten_time = time.perf_counter() - start
+    print(f"Appiattimento in TurnTable:      {flatten_time:7.2f}s ({len(table.turns['battle'])} turni)")
+
+    for feature_set, module in (("stacking", features_ext), ("voting", features_ext_vot)):
+        start = time.perf_counter()
+        reference = pd.DataFrame([module.extract_battle_features(b) for b in battles]).fillna(0)
+        dict_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        df = columnar_features(table, feature_set)
+        columnar_time = time.perf_counter() - start
+        pd.testing.assert_frame_equal(reference, df, check_exact=True)
+
+        print(f"[{feature_set}] loop sui dict:       {dict_time:7.2f}s")
+        print(f"[{feature_set}] riduzioni colonnari: {columnar_time:7.2f}s  "
+              f"(speedup {dict_time / columnar_time:.1f}x, "
+              f"{dict_time / (columnar_time + flatten_time):.1f}x con l'appiattimento)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--battles", type=int, default=50000)
+    args = parser.parse_args()
+    main(args.battles)
@@ -0,0 +1,50 @@
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+from benchmarks.synthetic import make_battles
+from set_up_scripts import features_ext, features_ext_vot
+from set_up_scripts.data_processing import DataHandler
+
+
+def main(n_battles=50000, engine='dict'):
+    """
+    Confronta le due pipeline separate (ogni set di feature rilegge il JSONL e riscandisce le
+    timeline) con la modalita' combinata di set_up_all (una lettura, un passaggio per entrambi).
+    """
+    with tempfile.TemporaryDirectory() as data_path:
+        with open(os.path.join(data_path, "train.jsonl"), "w") as f:
+            for battle in make_battles(n_battles):
+                f.write(json.dumps(battle) + "\n")
+
+        start = time.perf_counter()
+        separate = []
+        for module in (features_ext, features_ext_vot):
+            handler = DataHandler(data_path)
+            handler.load_train_data()
+            separate.append(module.FeatureHandler(None).create_advanced_features(handler.train_data, engine=engine))
+        separate_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        handler = DataHandler(data_path)
+        handler.load_train_data()
+        combined = features_ext.FeatureHandler(None).create_both_feature_sets(handler.train_data, engine=engine)
+        combined_time = time.perf_counter() - start
+
+    for expected, df in zip(separate, combined):
+        pd.testing.assert_frame_equal(expected, df)
+    print(f"Battaglie: {n_battles}, engine: {engine}")
+    print(f"Due pipeline separate: {separate_time:7.2f}s")
+    print(f"Modalita' combinata:   {combined_time:7.2f}s  (speedup {separate_time / combined_time:.2f}x)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--battles", type=int, default=50000)
+    parser.add_argument("--engine", default='dict', choices=['dict', 'columnar'])
+    args = parser.parse_args()
+    main(args.battles, args.engine)
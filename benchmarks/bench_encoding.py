@@ -0,0 +1,64 @@
+import argparse
+import json
+import time
+import tracemalloc
+
+import pandas as pd
+
+from benchmarks.synthetic import make_battles
+from set_up_scripts import features_ext, features_ext_vot
+from set_up_scripts.encoding import BattleVocabulary, EncodedBattles, encode_battle
+
+
+def allocated(build):
+    """Memoria allocata (MB) dagli oggetti costruiti da build, con il risultato."""
+    tracemalloc.start()
+    result = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size / 2 ** 20
+
+
+def main(n_battles=20000):
+    """
+    Battaglie come dict decodificati dal JSON contro BattleRecord codificati (id interi e array):
+    memoria occupata e tempo dell'estrazione delle feature, con le stesse feature.
+    """
+    lines = [json.dumps(b) for b in make_battles(n_battles)]
+    print(f"Battaglie: {n_battles}")
+
+    vocab = BattleVocabulary()
+    ingestion = {
+        "dict": lambda: [json.loads(line) for line in lines],
+        "codificata": lambda: EncodedBattles(vocab, [encode_battle(json.loads(line), vocab) for line in lines]),
+    }
+    for label, build in ingestion.items():
+        start = time.perf_counter()
+        build()
+        print(f"Lettura {label:10s} {time.perf_counter() - start:7.2f}s")
+    battles, dict_mb = allocated(ingestion["dict"])
+    records, encoded_mb = allocated(ingestion["codificata"])
+    print(f"Memoria dict:       {dict_mb:8.1f} MB")
+    print(f"Memoria codificata: {encoded_mb:8.1f} MB  ({dict_mb / encoded_mb:.1f}x in meno)")
+
+    for feature_set, extract, extract_record in (
+            ("stacking", features_ext.extract_battle_features, features_ext.extract_record_features),
+            ("voting", features_ext_vot.extract_battle_features, features_ext_vot.extract_record_features)):
+        start = time.perf_counter()
+        reference = pd.DataFrame([extract(b) for b in battles]).fillna(0)
+        dict_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        df = pd.DataFrame([extract_record(r, vocab) for r in records]).fillna(0)
+        record_time = time.perf_counter() - start
+        pd.testing.assert_frame_equal(reference, df, check_exact=True)
+
+        print(f"[{feature_set}] loop sui dict:    {dict_time:7.2f}s")
+        print(f"[{feature_set}] loop sui record:  {record_time:7.2f}s  (speedup {dict_time / record_time:.2f}x)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--battles", type=int, default=20000)
+    args = parser.parse_args()
+    main(args.battles)
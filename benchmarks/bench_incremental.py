@@ -0,0 +1,80 @@
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.bench_online import train_models
+from benchmarks.synthetic import make_battles
+from models import online
+from models.online import EXTRACTORS, BattlePredictor
+from set_up_scripts.incremental import IncrementalFeatures
+
+
+def rescan(predictor, battle):
+    """Punteggio dopo ogni turno riestraendo le feature dall'intera timeline parziale."""
+    timeline = battle['battle_timeline']
+    start = {k: v for k, v in battle.items() if k != 'battle_timeline'}
+    return [predictor.predict_proba({**start, 'battle_timeline': timeline[:k]}) for k in range(1, len(timeline) + 1)]
+
+
+def incremental(predictor, battle):
+    """Punteggio dopo ogni turno con LiveBattle (un update O(1) per turno)."""
+    live = predictor.live({k: v for k, v in battle.items() if k != 'battle_timeline'})
+    return [live.update(turn) for turn in battle['battle_timeline']]
+
+
+def feature_times(battles, feature_set):
+    """Solo feature dopo ogni turno: estrattore sulla timeline parziale contro IncrementalFeatures."""
+    extract = EXTRACTORS[feature_set]
+    start = time.perf_counter()
+    for battle in battles:
+        timeline = battle['battle_timeline']
+        for k in range(1, len(timeline) + 1):
+            extract({**battle, 'battle_timeline': timeline[:k]})
+    rescan_time = time.perf_counter() - start
+    start = time.perf_counter()
+    for battle in battles:
+        state = IncrementalFeatures(battle)
+        for turn in battle['battle_timeline']:
+            state.update(turn)
+            state.features(feature_set)
+    return rescan_time, time.perf_counter() - start
+
+
+def main(n_train=3000, n_live=200):
+    """
+    Battaglie valutate dopo ogni turno: LiveBattle rispetto alla riestrazione della timeline
+    parziale a ogni turno; le probabilita' devono coincidere turno per turno.
+    """
+    battles = make_battles(n_train + n_live)
+    live_battles = [{k: v for k, v in b.items() if k != 'player_won'} for b in battles[n_train:]]
+    n_turns = sum(len(b['battle_timeline']) for b in live_battles)
+    with tempfile.TemporaryDirectory() as model_dir:
+        train_models(battles[:n_train], model_dir)
+        print(f"Battaglie in corso: {n_live}, turni valutati: {n_turns}")
+        for feature_set in EXTRACTORS:
+            rescan_time, incremental_time = feature_times(live_battles, feature_set)
+            print(f"feature {feature_set}: riestrazione {rescan_time:6.2f} s   incrementale {incremental_time:6.2f} s   "
+                  f"speedup {rescan_time / incremental_time:.2f}x")
+        for name in online.MODELS:
+            predictor = BattlePredictor(name, os.path.join(model_dir, online.MODELS[name][0]))
+            times = {}
+            results = {}
+            for label, func in (("riestrazione", rescan), ("incrementale", incremental)):
+                start = time.perf_counter()
+                results[label] = [func(predictor, battle) for battle in live_battles]
+                times[label] = time.perf_counter() - start
+                print(f"{name}: {label:13s} {times[label]:7.2f} s   {n_turns / times[label]:9,.0f} turni/s")
+            for expected, probas in zip(results["riestrazione"], results["incrementale"]):
+                assert np.allclose(probas, expected, rtol=0, atol=1e-9)
+            print(f"{name}: speedup {times['riestrazione'] / times['incrementale']:.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--train", type=int, default=3000)
+    parser.add_argument("--live", type=int, default=200)
+    args = parser.parse_args()
+    main(args.train, args.live)
@@ -0,0 +1,46 @@
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from benchmarks.synthetic import iter_battle_chunks
+from set_up_scripts.decoders import available_backends, get_decoder
+
+
+def write_jsonl(path, n_battles):
+    with open(path, 'w') as f:
+        for chunk in iter_battle_chunks(n_battles):
+            for battle in chunk:
+                f.write(json.dumps(battle) + '\n')
+
+
+def main(n_battles=20000, repeat=3):
+    """Throughput (battaglie/s) dei decoder disponibili, con e senza selezione dei campi."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'train.jsonl')
+        write_jsonl(path, n_battles)
+        with open(path, 'rb') as f:
+            lines = f.readlines()
+        size_mb = os.path.getsize(path) / 1e6
+
+    print(f"Battaglie: {n_battles} ({size_mb:.1f} MB)")
+    for backend in available_backends():
+        for feature_fields_only in (False, True):
+            decode = get_decoder(backend, feature_fields_only)
+            best = float('inf')
+            for _ in range(repeat):
+                start = time.perf_counter()
+                for line in lines:
+                    decode(line)
+                best = min(best, time.perf_counter() - start)
+            label = f"{backend}{' (solo campi feature)' if feature_fields_only else ''}"
+            print(f"{label:32s} {n_battles / best:12,.0f} battaglie/s  {size_mb / best:8.1f} MB/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--battles", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    main(args.battles, args.repeat)
@@ -0,0 +1,78 @@
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+from benchmarks.synthetic import make_battles
+from set_up_scripts import features_ext
+from set_up_scripts.data_processing import DataHandler
+from set_up_scripts.line_index import build_line_index
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main(n_battles=20000, n_jobs=None, chunksize=256, n_samples=100):
+    """
+    train.jsonl letto riga per riga nel processo principale contro JsonlBattles (indice delle
+    righe): costruzione e aggiornamento dell'indice dopo un'aggiunta in coda, lettura ed estrazione
+    delle feature con il parsing nei worker, campionamento di battaglie senza leggere il file.
+    """
+    n_jobs = n_jobs or os.cpu_count()
+    battles = make_battles(n_battles)
+    appended = make_battles(n_battles // 10)
+    with tempfile.TemporaryDirectory() as data_path:
+        file_path = os.path.join(data_path, 'train.jsonl')
+        with open(file_path, 'w') as f:
+            f.writelines(json.dumps(b) + "\n" for b in battles)
+        print(f"Battaglie: {n_battles}  ({os.path.getsize(file_path) / 2 ** 20:.1f} MB), worker: {n_jobs}")
+
+        _, build_time = timed(lambda: build_line_index(file_path))
+        _, cached_time = timed(lambda: build_line_index(file_path))
+        with open(file_path, 'a') as f:
+            f.writelines(json.dumps(b) + "\n" for b in appended)
+        lines, refresh_time = timed(lambda: build_line_index(file_path))
+        assert len(lines) == n_battles + len(appended)
+        print(f"Indice: creazione {build_time:7.3f}s, riuso {cached_time:7.4f}s, "
+              f"dopo {len(appended)} battaglie aggiunte {refresh_time:7.4f}s")
+
+        feature_handler = features_ext.FeatureHandler(None)
+
+        def sequential():
+            handler = DataHandler(data_path)
+            handler.load_train_data()
+            return feature_handler.create_advanced_features(handler.train_data, n_jobs=n_jobs, chunksize=chunksize)
+
+        def indexed():
+            handler = DataHandler(data_path, indexed=True)
+            handler.load_train_data()
+            return feature_handler.create_advanced_features(handler.train_data, n_jobs=n_jobs, chunksize=chunksize)
+
+        reference, sequential_time = timed(sequential)
+        df, indexed_time = timed(indexed)
+        pd.testing.assert_frame_equal(reference, df, check_exact=True)
+        print(f"Parsing nel processo principale + feature: {sequential_time:7.2f}s")
+        print(f"Parsing nei worker (JsonlBattles) + feature: {indexed_time:7.2f}s  "
+              f"(speedup {sequential_time / indexed_time:.2f}x)")
+
+        handler = DataHandler(data_path, indexed=True)
+        sample, sample_time = timed(lambda: handler.sample_battles(n_samples, seed=0))
+        _, full_time = timed(lambda: list(DataHandler(data_path).iter_train_battles()))
+        assert all(battle in battles + appended for battle in sample[:10])
+        print(f"{n_samples} battaglie a caso dall'indice: {sample_time:7.3f}s (lettura completa {full_time:7.2f}s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--battles", type=int, default=20000)
+    parser.add_argument("--n-jobs", type=int, default=None)
+    parser.add_argument("--chunksize", type=int, default=256)
+    parser.add_argument("--samples", type=int, default=100)
+    args = parser.parse_args()
+    main(args.battles, args.n_jobs, args.chunksize, args.samples)
@@ -0,0 +1,122 @@
+import argparse
+import json
+import os
+import pickle
+import socket
+import tempfile
+import threading
+import time
+import urllib.request
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import AdaBoostClassifier, RandomForestClassifier, StackingClassifier, VotingClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.preprocessing import StandardScaler
+
+from benchmarks.synthetic import make_battles
+from models import online
+from models.online import BattlePredictor
+from set_up_scripts.columnar import columnar_features, flatten_battles
+from set_up_scripts.feature_schema import apply_feature_schema
+
+
+def train_models(battles, model_dir):
+    """Scaler e modelli come nella pipeline (stacking e logistic sul set stacking, voting sul set voting)."""
+    table = flatten_battles(battles)
+    for feature_set, names in (('stacking', ('stacking', 'logistic')), ('voting', ('voting',))):
+        df = apply_feature_schema(columnar_features(table, feature_set), feature_set)
+        X, y = df.drop(columns=['battle_id', 'player_won']), df['player_won']
+        scaler = StandardScaler().fit(X)
+        X_scaled = scaler.transform(X)
+        logreg = LogisticRegression(C=1, max_iter=1000).fit(X_scaled, y)
+        forest = RandomForestClassifier(n_estimators=50, max_depth=6, random_state=42)
+        models = {
+            'stacking': StackingClassifier([('logreg', logreg), ('rf', forest)],
+                                           final_estimator=LogisticRegression(max_iter=1000), cv=3),
+            'logistic': logreg,
+            'voting': VotingClassifier([('logreg', logreg), ('rf', forest),
+                                        ('adaboost', AdaBoostClassifier(n_estimators=50, random_state=42))],
+                                       voting='soft'),
+        }
+        set_dir = os.path.join(model_dir, feature_set)
+        os.makedirs(set_dir)
+        with open(os.path.join(set_dir, online.SCALER_FILENAME), "wb") as f:
+            pickle.dump(scaler, f)
+        for name in names:
+            model = models[name] if name == 'logistic' else models[name].fit(X_scaled, y)
+            with open(os.path.join(set_dir, online.MODELS[name][1]), "wb") as f:
+                pickle.dump(model, f)
+
+
+def batch_proba(predictor, battles):
+    """Stesso calcolo della pipeline batch: DataFrame delle feature, scaler.transform, predict_proba."""
+    extract = predictor.extract
+    df = pd.DataFrame([extract(b) for b in battles]).fillna(0)
+    feature_set = online.MODELS[predictor.name][0]
+    X = apply_feature_schema(df, feature_set)[predictor.columns]
+    return predictor.model.predict_proba(predictor.scaler.transform(X))[:, 1]
+
+
+def latencies(func, battles):
+    times = np.empty(len(battles))
+    for i, battle in enumerate(battles):
+        start = time.perf_counter()
+        func(battle)
+        times[i] = time.perf_counter() - start
+    return times
+
+
+def report(label, times):
+    p50, p99 = np.percentile(times, [50, 99]) * 1e3
+    print(f"{label:28s} p50 {p50:7.3f} ms   p99 {p99:7.3f} ms   {len(times) / times.sum():9,.0f} battaglie/s")
+
+
+def http_latencies(predictor, battles):
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    thread = threading.Thread(target=online.serve_http, args=(predictor, "127.0.0.1", port), daemon=True)
+    thread.start()
+    time.sleep(0.2)
+    url = f"http://127.0.0.1:{port}/predict"
+
+    def post(battle):
+        request = urllib.request.Request(url, data=json.dumps(battle).encode(), method="POST")
+        with urllib.request.urlopen(request) as response:
+            return json.loads(response.read())
+
+    return latencies(post, battles)
+
+
+def main(n_train=5000, n_requests=2000, http=False):
+    """
+    Latenza per battaglia di BattlePredictor (estrazione + scaling + modello, senza DataFrame)
+    rispetto al percorso batch su una battaglia alla volta; le probabilita' devono coincidere.
+    """
+    battles = make_battles(n_train + n_requests)
+    train, requests = battles[:n_train], battles[n_train:]
+    requests = [{k: v for k, v in b.items() if k != 'player_won'} for b in requests]
+    with tempfile.TemporaryDirectory() as model_dir:
+        train_models(train, model_dir)
+        print(f"Battaglie di addestramento: {n_train}, richieste: {n_requests}")
+        for name in online.MODELS:
+            predictor = BattlePredictor(name, os.path.join(model_dir, online.MODELS[name][0]))
+            # su X float32 predict_proba di sklearn calcola in float32: restano solo differenze di arrotondamento
+            online_proba, reference = predictor.predict_many(requests), batch_proba(predictor, requests)
+            assert np.allclose(online_proba, reference, rtol=0, atol=1e-6)
+            assert np.array_equal(online_proba >= 0.5, reference >= 0.5)
+
+            report(f"{name}: BattlePredictor", latencies(predictor.predict_proba, requests))
+            report(f"{name}: percorso batch", latencies(lambda b: batch_proba(predictor, [b]), requests[:200]))
+            if http:
+                report(f"{name}: HTTP", http_latencies(predictor, requests[:500]))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--train", type=int, default=5000)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--http", action="store_true")
+    args = parser.parse_args()
+    main(args.train, args.requests, args.http)
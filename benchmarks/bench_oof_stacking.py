@@ -0,0 +1,52 @@
+import argparse
+import time
+
+import numpy as np
+from sklearn.ensemble import HistGradientBoostingClassifier
+from sklearn.linear_model import LogisticRegression
+
+from benchmarks.synthetic import load_training_set
+from models.folds import get_fold_cache
+from models.stacking_functions import build_stacking_model, tune_stacking_model
+
+try:
+    from xgboost import XGBClassifier
+except ImportError:
+    XGBClassifier = None
+
+
+def main(n_battles=5000):
+    """
+    Confronta tune_stacking_model in modalita' 'grid' (lo stacking viene riaddestrato per ogni
+    candidato e fold) e 'oof' (predizioni dei modelli base calcolate una volta per fold):
+    tempi e verifica che parametri, score e predizioni del modello scelto coincidano.
+    """
+    X, y = load_training_set(n_battles)
+    folds = get_fold_cache(X, y)
+    logreg = LogisticRegression(C=100, solver='liblinear', random_state=123, max_iter=1000)
+    if XGBClassifier is not None:
+        booster = XGBClassifier(n_estimators=100, max_depth=3, random_state=123, eval_metric='logloss', n_jobs=-1)
+    else:
+        booster = HistGradientBoostingClassifier(max_iter=100, random_state=123)
+
+    results = {}
+    for mode in ('oof', 'grid'):
+        stack = build_stacking_model(logreg, booster)
+        start = time.perf_counter()
+        results[mode] = tune_stacking_model(stack, folds.X_train_scaled, y, cv=folds.splits, mode=mode)
+        results[mode + '_time'] = time.perf_counter() - start
+
+    assert results['oof'].get_params()['passthrough'] == results['grid'].get_params()['passthrough']
+    assert results['oof'].final_estimator.get_params() == results['grid'].final_estimator.get_params()
+    assert np.array_equal(results['oof'].predict_proba(folds.X_train_scaled),
+                          results['grid'].predict_proba(folds.X_train_scaled))
+    print(f"\nGridSearchCV sullo stacking: {results['grid_time']:7.2f}s")
+    print(f"Predizioni OOF in cache:     {results['oof_time']:7.2f}s  "
+          f"(speedup {results['grid_time'] / results['oof_time']:.1f}x, stesso modello)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--battles", type=int, default=5000)
+    args = parser.parse_args()
+    main(args.battles)
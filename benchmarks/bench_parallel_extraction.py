@@ -0,0 +1,41 @@
+import argparse
+import os
+import time
+
+import pandas as pd
+
+from benchmarks.synthetic import make_battles
+from set_up_scripts import features_ext, features_ext_vot
+
+
+def main(n_battles=50000, workers=(1, 2, 4, 8), chunksize=256, feature_set="stacking"):
+    """Misura lo scaling di create_advanced_features al variare del numero di worker."""
+    module = features_ext if feature_set == "stacking" else features_ext_vot
+    battles = make_battles(n_battles)
+    handler = module.FeatureHandler(battles)
+
+    print(f"Battaglie: {n_battles} - CPU disponibili: {os.cpu_count()} - chunksize: {chunksize}")
+    reference = None
+    timings = {}
+    for n_jobs in workers:
+        start = time.perf_counter()
+        df = handler.create_advanced_features(battles, n_jobs=n_jobs, chunksize=chunksize)
+        timings[n_jobs] = time.perf_counter() - start
+        if reference is None:
+            reference = df
+        else:
+            pd.testing.assert_frame_equal(reference, df, check_exact=True)
+
+    base = timings[workers[0]]
+    for n_jobs, elapsed in timings.items():
+        print(f"{n_jobs} worker: {elapsed:7.2f}s  ({n_battles / elapsed:,.0f} battaglie/s, speedup {base / elapsed:.2f}x)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--battles", type=int, default=50000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--chunksize", type=int, default=256)
+    parser.add_argument("--feature-set", choices=["stacking", "voting"], default="stacking")
+    args = parser.parse_args()
+    main(args.battles, tuple(args.workers), args.chunksize, args.feature_set)
@@ -0,0 +1,79 @@
+import argparse
+import time
+
+from sklearn.ensemble import StackingClassifier, RandomForestClassifier, HistGradientBoostingClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.model_selection import GridSearchCV, ParameterGrid
+from sklearn.preprocessing import StandardScaler
+
+from benchmarks.synthetic import make_battles
+from models.parallelism import ParallelBudget
+from set_up_scripts.columnar import flatten_battles, columnar_features
+
+try:
+    from xgboost import XGBClassifier
+except ImportError:
+    XGBClassifier = None
+
+PARAM_GRID = {
+    'final_estimator__C': [0.1, 10],
+    'passthrough': [False, True],
+}
+
+
+def build_stack():
+    """Stacking come in stacking_functions, con n_jobs=-1 a ogni livello (i default attuali)."""
+    if XGBClassifier is not None:
+        booster = XGBClassifier(n_estimators=100, max_depth=5, random_state=123, eval_metric='logloss', n_jobs=-1)
+    else:
+        # stesso uso di OpenMP di XGBoost, per quando xgboost non e' installato
+        booster = HistGradientBoostingClassifier(max_iter=100, random_state=123)
+    return StackingClassifier(
+        estimators=[
+            ('logreg', LogisticRegression(random_state=123, max_iter=1000)),
+            ('boost', booster),
+            ('rf', RandomForestClassifier(n_estimators=100, max_depth=10, random_state=42, n_jobs=-1)),
+        ],
+        final_estimator=LogisticRegression(random_state=123, max_iter=1000),
+        cv=5,
+        n_jobs=-1,
+    )
+
+
+def main(n_battles=5000, n_cores=None):
+    """
+    Confronta la grid search dello stacking con n_jobs=-1 a tutti i livelli e la stessa
+    ricerca con il budget di ParallelBudget; i risultati devono coincidere.
+    """
+    df = columnar_features(flatten_battles(make_battles(n_battles)), 'stacking')
+    X = StandardScaler().fit_transform(df.drop(columns=['battle_id', 'player_won']))
+    y = df['player_won']
+    budget = ParallelBudget(n_cores=n_cores)
+    print(f"Battaglie: {n_battles}, core: {budget.n_cores}, "
+          f"booster: {'XGBoost' if XGBClassifier is not None else 'HistGradientBoosting'}")
+
+    start = time.perf_counter()
+    default = GridSearchCV(build_stack(), PARAM_GRID, cv=5, scoring='accuracy', n_jobs=-1).fit(X, y)
+    default_time = time.perf_counter() - start
+    print(f"n_jobs=-1 ovunque:     {default_time:7.2f}s")
+
+    stack = build_stack()
+    allocation = budget.allocate('stacking', len(ParameterGrid(PARAM_GRID)) * 5, len(stack.estimators))
+    budget.describe('stacking', allocation)
+    budget.configure(stack, allocation)
+    start = time.perf_counter()
+    with budget.limits(allocation):
+        budgeted = GridSearchCV(stack, PARAM_GRID, cv=5, scoring='accuracy', n_jobs=allocation.outer).fit(X, y)
+    budget_time = time.perf_counter() - start
+    print(f"ParallelBudget:        {budget_time:7.2f}s  (speedup {default_time / budget_time:.2f}x)")
+
+    assert default.best_params_ == budgeted.best_params_
+    assert abs(default.best_score_ - budgeted.best_score_) < 1e-12
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--battles", type=int, default=5000)
+    parser.add_argument("--cores", type=int, default=None)
+    args = parser.parse_args()
+    main(args.battles, args.cores)
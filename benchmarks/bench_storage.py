@@ -0,0 +1,79 @@
+import argparse
+import multiprocessing as mp
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import make_battles
+from set_up_scripts.artifact_store import ArtifactStore
+from set_up_scripts.columnar import flatten_battles, columnar_features
+
+
+def _rss_mb():
+    """RSS corrente del processo in MB (da /proc, solo Linux)."""
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+
+
+def _measure_load(save_dir, fmt, name, queue):
+    # gira in un processo nuovo, cosi' la RSS misura solo il caricamento
+    before = _rss_mb()
+    start = time.perf_counter()
+    df = ArtifactStore(save_dir, fmt=fmt).load(name)
+    load_time = time.perf_counter() - start
+    after_load = _rss_mb()
+    total = sum(float(np.sum(df[col].to_numpy())) for col in df.columns)
+    queue.put((load_time, after_load - before, _rss_mb() - before, total))
+
+
+def make_frame(n_rows, n_battles=20000):
+    """Dataset di feature delle dimensioni di X_train, replicando le righe di n_battles battaglie sintetiche."""
+    df = columnar_features(flatten_battles(make_battles(n_battles)), "stacking")
+    df = df.drop(columns=["battle_id", "player_won"])
+    reps = -(-n_rows // len(df))
+    return pd.concat([df] * reps, ignore_index=True).iloc[:n_rows].reset_index(drop=True)
+
+
+def main(n_rows=1000000):
+    """
+    Confronta il vecchio salvataggio (pickle + CSV) con il formato colonnare .npy:
+    tempo di scrittura, tempo di caricamento e memoria occupata dopo il caricamento.
+    """
+    df = make_frame(n_rows)
+    print(f"Dataset: {df.shape[0]} righe x {df.shape[1]} colonne "
+          f"({df.memory_usage(index=False).sum() / 2 ** 20:.0f} MB in memoria)")
+
+    save_dir = tempfile.mkdtemp()
+    ctx = mp.get_context("spawn")
+    try:
+        for fmt, export_csv, label in (("pickle", True, "pickle + CSV"), ("pickle", False, "pickle"),
+                                       ("npy", False, "npy (mmap)")):
+            name = f"X_{fmt}_{int(export_csv)}"
+            store = ArtifactStore(save_dir, fmt=fmt, export_csv=export_csv)
+            start = time.perf_counter()
+            store.write(name, df)
+            write_time = time.perf_counter() - start
+
+            queue = ctx.Queue()
+            process = ctx.Process(target=_measure_load, args=(save_dir, fmt, name, queue))
+            process.start()
+            load_time, rss_load, rss_scan, total = queue.get()
+            process.join()
+
+            assert np.isclose(total, sum(float(np.sum(df[col].to_numpy())) for col in df.columns))
+            pd.testing.assert_frame_equal(store.load(name, mmap=False), df, check_exact=True)
+            print(f"{label:>13}: scrittura {write_time:6.2f}s | caricamento {load_time:6.3f}s | "
+                  f"RSS dopo il caricamento {rss_load:7.1f} MB, dopo una lettura completa {rss_scan:7.1f} MB")
+    finally:
+        shutil.rmtree(save_dir)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1000000)
+    args = parser.parse_args()
+    main(args.rows)
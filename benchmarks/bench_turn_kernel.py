@@ -0,0 +1,60 @@
+import argparse
+import time
+
+import pandas as pd
+
+from benchmarks.synthetic import make_battles
+from set_up_scripts import features_ext, features_ext_vot
+from set_up_scripts.columnar import flatten_battles, columnar_features
+from set_up_scripts.turn_kernel import NUMBA_AVAILABLE, accumulate_turns, kernel_features
+
+
+def main(n_battles=50000, n_interpreted=2000):
+    """
+    Kernel per turno di turn_kernel (compilato con numba se installato) contro il loop sui dict e
+    le riduzioni colonnari, con le stesse feature. Senza numba il kernel gira interpretato su
+    n_interpreted battaglie, solo per il controllo di parita'.
+    """
+    battles = make_battles(n_battles)
+    table = flatten_battles(battles)
+    print(f"Battaglie: {n_battles}, numba: {'si' if NUMBA_AVAILABLE else 'no (kernel interpretato)'}")
+
+    if NUMBA_AVAILABLE:
+        # la prima chiamata compila (o legge la cache di numba)
+        accumulate_turns(flatten_battles(battles[:10]))
+    else:
+        battles = battles[:n_interpreted]
+        table = flatten_battles(battles)
+
+    start = time.perf_counter()
+    acc = accumulate_turns(table)
+    kernel_time = time.perf_counter() - start
+    print(f"Kernel sugli accumulatori:       {kernel_time:7.2f}s ({len(battles)} battaglie)")
+
+    for feature_set, module in (("stacking", features_ext), ("voting", features_ext_vot)):
+        start = time.perf_counter()
+        reference = pd.DataFrame([module.extract_battle_features(b) for b in battles]).fillna(0)
+        dict_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        columnar = columnar_features(table, feature_set)
+        columnar_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        df = kernel_features(table, feature_set, acc)
+        assembly_time = time.perf_counter() - start
+        pd.testing.assert_frame_equal(columnar, df, check_exact=True)
+        pd.testing.assert_frame_equal(reference, df[reference.columns], check_exact=True)
+
+        print(f"[{feature_set}] loop sui dict:       {dict_time:7.2f}s")
+        print(f"[{feature_set}] riduzioni colonnari: {columnar_time:7.2f}s")
+        print(f"[{feature_set}] kernel per turno:    {kernel_time + assembly_time:7.2f}s  "
+              f"(speedup {dict_time / (kernel_time + assembly_time):.1f}x sul loop sui dict)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--battles", type=int, default=50000)
+    parser.add_argument("--interpreted", type=int, default=2000)
+    args = parser.parse_args()
+    main(args.battles, args.interpreted)
@@ -0,0 +1,148 @@
+import copy
+import os
+import random
+
+from set_up_scripts.artifact_store import load_artifact
+from set_up_scripts.columnar import flatten_battles, columnar_features
+from set_up_scripts.dicts import pokemon_types, gen1_type
+
+STATUSES = ['nostatus', 'nostatus', 'nostatus', 'par', 'slp', 'brn', 'psn', 'tox', 'frz', 'fnt']
+MOVE_TYPES = [t.upper() for t in gen1_type]
+N_TURNS = 30
+
+
+def _pokemon(rng, name):
+    return {
+        'name': name,
+        'level': 100,
+        'types': pokemon_types[name],
+        'base_hp': rng.randint(20, 250),
+        'base_atk': rng.randint(20, 150),
+        'base_def': rng.randint(20, 180),
+        'base_spa': rng.randint(20, 150),
+        'base_spd': rng.randint(20, 150),
+        'base_spe': rng.randint(20, 150),
+    }
+
+
+def _move(rng):
+    if rng.random() < 0.1:
+        return None
+    return {
+        'name': 'move',
+        'type': rng.choice(MOVE_TYPES),
+        'category': rng.choice(['PHYSICAL', 'SPECIAL', 'STATUS']),
+        'base_power': rng.choice([0, 40, 60, 80, 90, 100, 120]),
+        'accuracy': rng.choice([0.7, 0.85, 1.0, 1.0]),
+        'priority': 0,
+    }
+
+
+def _state(rng, name, hp, status):
+    return {
+        'name': name,
+        'hp_pct': hp,
+        'status': status,
+        'effects': ['noeffect'],
+        'boosts': {k: rng.randint(-2, 2) for k in ('atk', 'def', 'spa', 'spd', 'spe')},
+    }
+
+
+def make_battle(rng, battle_id, n_turns=N_TURNS):
+    """Genera una battaglia sintetica con la stessa struttura di train.jsonl."""
+    names = list(pokemon_types)
+    p1_team = [_pokemon(rng, n) for n in rng.sample(names, 6)]
+    p2_team = rng.sample(names, 6)
+    p1_active, p2_active = p1_team[0]['name'], p2_team[0]
+    p1_hp = {p['name']: 1.0 for p in p1_team}
+    p2_hp = {n: 1.0 for n in p2_team}
+
+    timeline = []
+    for turn in range(1, n_turns + 1):
+        if rng.random() < 0.15:
+            p1_active = rng.choice(list(p1_hp))
+        if rng.random() < 0.15:
+            p2_active = rng.choice(p2_team)
+        p1_hp[p1_active] = max(0.0, round(p1_hp[p1_active] - rng.random() * 0.3, 2))
+        p2_hp[p2_active] = max(0.0, round(p2_hp[p2_active] - rng.random() * 0.3, 2))
+        p1_status = 'fnt' if p1_hp[p1_active] == 0 else rng.choice(STATUSES[:-1])
+        p2_status = 'fnt' if p2_hp[p2_active] == 0 else rng.choice(STATUSES[:-1])
+        timeline.append({
+            'turn': turn,
+            'p1_pokemon_state': _state(rng, p1_active, p1_hp[p1_active], p1_status),
+            'p1_move_details': _move(rng),
+            'p2_pokemon_state': _state(rng, p2_active, p2_hp[p2_active], p2_status),
+            'p2_move_details': _move(rng),
+        })
+
+    return {
+        'player_won': rng.random() < 0.5,
+        'p1_team_details': p1_team,
+        'p2_lead_details': _pokemon(rng, p2_team[0]),
+        'battle_timeline': timeline,
+        'battle_id': battle_id,
+    }
+
+
+def make_battles(n, seed=0, n_turns=N_TURNS):
+    rng = random.Random(seed)
+    return [make_battle(rng, i, n_turns) for i in range(n)]
+
+
+def make_edge_battles():
+    """Battaglie sintetiche con i casi limite del loop sui dict (per i test di parita' tra i motori)."""
+    rng = random.Random(7)
+    base = [make_battle(rng, i, n_turns=rng.randint(1, 12)) for i in range(12)]
+    battles = copy.deepcopy(base)
+
+    # timeline vuota
+    battles[0]['battle_timeline'] = []
+    # mosse senza accuracy o senza tipo
+    for turn in battles[1]['battle_timeline']:
+        turn['p1_move_details'] = {'base_power': 50}
+        turn['p2_move_details'] = {'base_power': 70, 'type': 'FIRE'}
+    for turn in battles[2]['battle_timeline']:
+        if turn['p1_move_details']:
+            turn['p1_move_details'].pop('type')
+    # specie e tipi sconosciuti
+    battles[3]['p1_team_details'][0]['name'] = 'missingno'
+    for turn in battles[3]['battle_timeline']:
+        turn['p1_pokemon_state']['name'] = 'missingno'
+        if turn['p2_move_details']:
+            turn['p2_move_details']['type'] = 'SHADOW'
+    # lead esausti al primo turno
+    for side in ('p1', 'p2'):
+        state = battles[4]['battle_timeline'][0][f'{side}_pokemon_state']
+        state['status'], state['hp_pct'] = 'fnt', 0.0
+    battles[5]['battle_timeline'][0]['p2_pokemon_state']['status'] = 'fnt'
+    # ko dal solo hp a 0, senza status 'fnt'
+    battles[10]['battle_timeline'][0]['p1_pokemon_state'].update(hp_pct=0.0, status='nostatus')
+    # nome vuoto (non conta come switch ne' come pokemon visto)
+    for turn in battles[11]['battle_timeline'][::2]:
+        turn['p2_pokemon_state']['name'] = ''
+    # team, lead e campi mancanti
+    battles[6].pop('p1_team_details')
+    battles[7].pop('p2_lead_details')
+    battles[8]['p2_lead_details'].pop('name')
+    for turn in battles[9]['battle_timeline']:
+        turn['p1_pokemon_state']['hp_pct'] = None
+        turn['p2_pokemon_state'].pop('boosts')
+    return battles
+
+
+def iter_battle_chunks(n, chunk_size=10000, seed=0, n_turns=N_TURNS):
+    """Genera n battaglie a blocchi, per non tenerle tutte in memoria."""
+    rng = random.Random(seed)
+    for start in range(0, n, chunk_size):
+        stop = min(n, start + chunk_size)
+        yield [make_battle(rng, i, n_turns) for i in range(start, stop)]
+
+
+def load_training_set(n_battles, data_dir="data"):
+    """X_train e Y_train di data/ se esistono (sulle battaglie sintetiche l'accuracy e' casuale)."""
+    if os.path.exists(os.path.join(data_dir, "X_train.pkl")) or os.path.isdir(os.path.join(data_dir, "X_train.npy")):
+        print(f"Dataset: X_train di {data_dir}/")
+        return load_artifact("X_train", data_dir), load_artifact("Y_train", data_dir)
+    print(f"Dataset: {n_battles} battaglie sintetiche")
+    df = columnar_features(flatten_battles(make_battles(n_battles)), 'stacking')
+    return df.drop(columns=['battle_id', 'player_won']), df['player_won']
@@ -0,0 +1,185 @@
+import argparse
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from models.online import MODEL_DIR, MODELS, BattlePredictor
+from set_up_scripts.decoders import get_decoder
+
+
+class MicroBatcher:
+    """
+    Coda asyncio davanti a BattlePredictor: le battaglie che arrivano insieme vengono raccolte
+    in blocchi di al piu' max_batch_size, aspettando al massimo max_wait_ms dalla prima del
+    blocco, e valutate con una sola predict_many (estrazione delle feature e modello). Il calcolo
+    gira in un thread, cosi' mentre un blocco viene valutato il successivo si riempie. Se
+    predict_many fallisce il blocco viene rivalutato una battaglia alla volta, cosi' l'errore
+    arriva solo a chi ha mandato le battaglie non valide.
+    """
+
+    def __init__(self, predictor, max_batch_size=64, max_wait_ms=2.0):
+        self.predictor = predictor
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.batch_sizes = []
+        self._queue = None
+        self._worker = None
+        self._executor = None
+        # blocco in raccolta e blocco in valutazione
+        self._batch = []
+        self._pending = None
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._worker = asyncio.create_task(self._run())
+        return self
+
+    async def close(self):
+        """
+        Ferma la raccolta, aspetta il blocco in valutazione e fa fallire le richieste ancora in
+        coda; l'executor viene chiuso senza bloccare il loop.
+        """
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+        if self._pending is not None:
+            await self._pending
+            self._pending = None
+        waiting = self._batch
+        self._batch = []
+        while not self._queue.empty():
+            waiting.append(self._queue.get_nowait())
+        for _, future in waiting:
+            if not future.done():
+                future.set_exception(RuntimeError("MicroBatcher chiuso"))
+        await asyncio.to_thread(self._executor.shutdown)
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def predict_proba(self, battle):
+        """Probabilita' che vinca il giocatore 1, calcolata nel prossimo blocco."""
+        if self._worker is None:
+            raise RuntimeError("MicroBatcher non avviato o gia' chiuso")
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((battle, future))
+        return await future
+
+    async def _collect(self, batch):
+        """Riempie batch dalla coda; batch resta visibile a close se la raccolta viene interrotta."""
+        batch.append(await self._queue.get())
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._collect(self._batch)
+            if self._pending is not None:
+                # shield: la cancellazione del worker non deve interrompere il blocco in valutazione
+                await asyncio.shield(self._pending)
+            batch, self._batch = self._batch, []
+            self._pending = asyncio.ensure_future(self._score(loop, batch))
+
+    async def _score(self, loop, batch):
+        battles = [battle for battle, _ in batch]
+        self.batch_sizes.append(len(battles))
+        try:
+            probas = await loop.run_in_executor(self._executor, self.predictor.predict_many, battles)
+        except Exception:
+            probas = await loop.run_in_executor(self._executor, self._score_each, battles)
+        for (_, future), proba in zip(batch, probas):
+            if future.done():
+                continue
+            if isinstance(proba, Exception):
+                future.set_exception(proba)
+            else:
+                future.set_result(float(proba))
+
+    def _score_each(self, battles):
+        """Probabilita' (o eccezione) di ogni battaglia valutata da sola."""
+        results = []
+        for battle in battles:
+            try:
+                results.append(self.predictor.predict_proba(battle))
+            except Exception as e:
+                results.append(e)
+        return results
+
+
+async def serve_tcp(batcher, host="127.0.0.1", port=8001):
+    """
+    Server a righe JSON: ogni riga e' una battaglia, ogni risposta una riga con battle_id e
+    probabilita' (nell'ordine delle richieste della connessione). Le righe di tutte le connessioni
+    finiscono negli stessi blocchi.
+    """
+    decode = get_decoder()
+
+    async def handle(reader, writer):
+        responses = asyncio.Queue()
+
+        async def respond():
+            while True:
+                task = await responses.get()
+                if task is None:
+                    break
+                writer.write(json.dumps(await task).encode() + b"\n")
+                await writer.drain()
+
+        async def score(line):
+            try:
+                battle = decode(line)
+                proba = await batcher.predict_proba(battle)
+            except Exception as e:
+                return {'error': str(e)}
+            return {'battle_id': battle.get('battle_id'), 'player_won_proba': proba, 'player_won': int(proba >= 0.5)}
+
+        responder = asyncio.create_task(respond())
+        while line := await reader.readline():
+            if line.strip():
+                await responses.put(asyncio.create_task(score(line)))
+        await responses.put(None)
+        await responder
+        writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    async with server:
+        await server.serve_forever()
+
+
+async def _main(args):
+    predictor = BattlePredictor(args.model, args.model_dir)
+    async with MicroBatcher(predictor, args.max_batch_size, args.max_wait_ms) as batcher:
+        print(f"Predizioni {args.model} a blocchi su {args.host}:{args.port}")
+        await serve_tcp(batcher, args.host, args.port)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default="stacking", choices=list(MODELS))
+    parser.add_argument("--model-dir", default=MODEL_DIR)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--max-batch-size", type=int, default=64)
+    parser.add_argument("--max-wait-ms", type=float, default=2.0)
+    try:
+        asyncio.run(_main(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
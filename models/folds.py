@@ -0,0 +1,111 @@
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import KFold
+from sklearn.preprocessing import StandardScaler
+
+
+N_SPLITS = 5
+RANDOM_STATE = 42
+# FoldCache tenute in memoria (una per set di feature in pipeline_all), le meno recenti vengono scartate
+MAX_FOLD_CACHES = 2
+
+
+def data_fingerprint(*arrays):
+    """Hash del contenuto di DataFrame, Series o array (None e' ammesso)."""
+    digest = hashlib.sha1()
+    for data in arrays:
+        if data is None:
+            digest.update(b'none')
+        elif isinstance(data, (pd.DataFrame, pd.Series)):
+            digest.update(pd.util.hash_pandas_object(data, index=False).values.tobytes())
+            names = data.columns if isinstance(data, pd.DataFrame) else [data.name]
+            digest.update(str(list(names)).encode())
+        else:
+            data = np.ascontiguousarray(data)
+            digest.update(str((data.shape, data.dtype)).encode())
+            digest.update(data.tobytes())
+    return digest.hexdigest()
+
+
+def n_splits(cv):
+    """Numero di fold di cv: un intero, uno splitter di sklearn o una lista di split."""
+    if isinstance(cv, int):
+        return cv
+    return cv.get_n_splits() if hasattr(cv, 'get_n_splits') else len(cv)
+
+
+class FoldCache:
+    """
+    Split della 5-fold CV (KFold con shuffle, random_state=42) e matrici scalate condivisi da
+    tuning, stacking, voting e logistic. Lo StandardScaler viene addestrato una volta sola su
+    X_train (come lo scaler salvato da tune_model); le matrici scalate vengono calcolate alla
+    prima richiesta e poi riusate, i fold restano indici (splits) su quelle matrici.
+    """
+
+    def __init__(self, X_train, Y_train, X_test=None, n_splits=N_SPLITS, random_state=RANDOM_STATE):
+        self.X_train = X_train
+        self.Y_train = Y_train
+        self.X_test = None
+        self._test_fingerprint = None
+        self.kfold = KFold(n_splits=n_splits, shuffle=True, random_state=random_state)
+        self.splits = list(self.kfold.split(X_train))
+        self._scaler = None
+        self._scaled = {}
+        if X_test is not None:
+            self.set_test(X_test)
+
+    def set_test(self, X_test):
+        fingerprint = data_fingerprint(X_test)
+        if fingerprint != self._test_fingerprint:
+            self.X_test = X_test
+            self._test_fingerprint = fingerprint
+            self._scaled.pop('test', None)
+
+    @property
+    def n_splits(self):
+        return len(self.splits)
+
+    @property
+    def scaler(self):
+        if self._scaler is None:
+            self._scaler = StandardScaler().fit(self.X_train)
+        return self._scaler
+
+    @property
+    def X_train_scaled(self):
+        if 'train' not in self._scaled:
+            self._scaled['train'] = self.scaler.transform(self.X_train)
+        return self._scaled['train']
+
+    @property
+    def X_test_scaled(self):
+        if self.X_test is None:
+            raise ValueError("FoldCache creato senza X_test.")
+        if 'test' not in self._scaled:
+            self._scaled['test'] = self.scaler.transform(self.X_test)
+        return self._scaled['test']
+
+
+_CACHES = OrderedDict()
+
+
+def get_fold_cache(X_train, Y_train, X_test=None, n_splits=N_SPLITS, random_state=RANDOM_STATE):
+    """
+    FoldCache per X_train e Y_train: gli step della pipeline con gli stessi dati ricevono la
+    stessa istanza. X_test, se passato, viene agganciato alla cache (e sostituito se cambia).
+    Restano in memoria solo le ultime MAX_FOLD_CACHES istanze usate.
+    """
+    key = (data_fingerprint(X_train, Y_train), n_splits, random_state)
+    if key in _CACHES:
+        _CACHES.move_to_end(key)
+    else:
+        _CACHES[key] = FoldCache(X_train, Y_train, n_splits=n_splits, random_state=random_state)
+        while len(_CACHES) > MAX_FOLD_CACHES:
+            _CACHES.popitem(last=False)
+    cache = _CACHES[key]
+    if X_test is not None:
+        cache.set_test(X_test)
+    return cache
@@ -1,32 +1,37 @@
 import os
 
 import pandas as pd
-from sklearn.model_selection import KFold, cross_val_score
+from sklearn.model_selection import cross_val_score
 
-from models.stacking_functions import load_data, load_scaler, load_pickle
+from models.parallelism import ParallelBudget
+from models.folds import get_fold_cache
+from models.stacking_functions import DATA_DIR, load_data, load_pickle
 
 MODEL_DIR = "models/generated_models"
 MODEL_FILENAME = "logistic_regression_best_model.pkl"
 SUBMISSION_PATH = "fds-pokemon-battles-prediction-2025/submission_LOG.csv"
 
 
-def main():
-    X_train, X_test, Y_train, test_df = load_data()
-    X_train_scaled, X_test_scaled = load_scaler(X_train, X_test)
+def main(budget=None, data_dir=DATA_DIR, model_dir=MODEL_DIR):
+    X_train, X_test, Y_train, test_df = load_data(data_dir)
+    folds = get_fold_cache(X_train, Y_train, X_test)
+    X_train_scaled, X_test_scaled = folds.X_train_scaled, folds.X_test_scaled
 
-    model_path = os.path.join(MODEL_DIR, MODEL_FILENAME)
+    model_path = os.path.join(model_dir, MODEL_FILENAME)
     print(f"Caricamento modello logistico da: {model_path}")
     logistic_model = load_pickle(model_path)
 
-    kf = KFold(n_splits=5, shuffle=True, random_state=42)
-    cv_scores = cross_val_score(
-        logistic_model,
-        X_train_scaled,
-        Y_train,
-        cv=kf,
-        scoring="accuracy",
-        n_jobs=-1,
-    )
+    budget = budget or ParallelBudget()
+    allocation = budget.allocate("cv", folds.n_splits)
+    with budget.limits(allocation):
+        cv_scores = cross_val_score(
+            logistic_model,
+            X_train_scaled,
+            Y_train,
+            cv=folds.splits,
+            scoring="accuracy",
+            n_jobs=allocation.outer,
+        )
 
     print("\n--- Risultati Cross-Validation (Logistic Regression) ---")
     print(f"Accuratezze sui 5 fold: {cv_scores}")
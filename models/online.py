@@ -0,0 +1,280 @@
+import argparse
+import json
+import os
+import pickle
+import sys
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import numpy as np
+from sklearn.ensemble import (AdaBoostClassifier, ExtraTreesClassifier, RandomForestClassifier, StackingClassifier,
+                              VotingClassifier)
+from sklearn.linear_model import LogisticRegression
+from sklearn.tree import DecisionTreeClassifier
+
+from set_up_scripts import features_ext, features_ext_vot
+from set_up_scripts.columnar import columnar_features, flatten_battles
+from set_up_scripts.decoders import get_decoder
+from set_up_scripts.feature_schema import FEATURE_DTYPES, REAL, apply_feature_schema
+from set_up_scripts.incremental import IncrementalFeatures
+
+MODEL_DIR = "models/generated_models"
+SCALER_FILENAME = "logistic_regression_scaler.pkl"
+
+# set di feature e file di ciascun modello servibile
+MODELS = {
+    'stacking': ('stacking', "stacking_best_model.pkl"),
+    'logistic': ('stacking', "logistic_regression_best_model.pkl"),
+    'voting': ('voting', "voting_best_model.pkl"),
+}
+EXTRACTORS = {
+    'stacking': features_ext.extract_battle_features,
+    'voting': features_ext_vot.extract_battle_features,
+}
+# da questa dimensione in su un blocco di battaglie passa dal motore colonnare
+COLUMNAR_MIN_BATCH = 64
+# righe di controllo di positive_proba contro predict_proba all'avvio, e scarto ammesso
+# (predict_proba lavora in float32 sulle righe float32)
+CHECK_ROWS = 16
+CHECK_ATOL = 1e-6
+
+
+def _sigmoid(z):
+    return 1.0 / (1.0 + np.exp(-z))
+
+
+def positive_proba(model, x):
+    """
+    Probabilita' della classe 1 per le righe di x, senza i controlli sull'input di predict_proba.
+    Regressione logistica, alberi, foreste, AdaBoost, stacking e voting soft sono calcolati a mano sui
+    modelli addestrati, XGBoost con inplace_predict; gli altri modelli passano da predict_proba.
+    Usa dettagli interni di sklearn (tree_.predict come frazioni di classe, _weights_not_none):
+    BattlePredictor la confronta con predict_proba all'avvio e, se non coincide, non la usa.
+    """
+    if isinstance(model, LogisticRegression) and model.coef_.shape[0] == 1:
+        # in float64: con x e coef_ float32 il prodotto cambierebbe con il numero di righe del blocco
+        return _sigmoid(x.astype(np.float64) @ model.coef_[0].astype(np.float64) + float(model.intercept_[0]))
+    if isinstance(model, DecisionTreeClassifier) and model.n_outputs_ == 1 and model.n_classes_ == 2:
+        return model.tree_.predict(x.astype(np.float32))[:, 1]
+    if isinstance(model, (RandomForestClassifier, ExtraTreesClassifier)) and model.n_outputs_ == 1 \
+            and model.n_classes_ == 2:
+        # come predict_proba, senza il Parallel di joblib per ogni chiamata
+        x32 = x.astype(np.float32)
+        total = np.zeros(len(x))
+        for tree in model.estimators_:
+            total += tree.tree_.predict(x32)[:, 1]
+        return total / len(model.estimators_)
+    if isinstance(model, AdaBoostClassifier) and getattr(model, 'algorithm', 'SAMME') == 'SAMME' \
+            and model.n_classes_ == 2 \
+            and all(isinstance(tree, DecisionTreeClassifier) and tree.n_classes_ == 2 for tree in model.estimators_):
+        # SAMME binario: predict_proba e' la sigmoide di decision_function, 2 * voto pesato / somma dei pesi
+        x32 = x.astype(np.float32)
+        decision = np.zeros(len(x))
+        for tree, weight in zip(model.estimators_, model.estimator_weights_):
+            proba = tree.tree_.predict(x32)
+            decision += np.where(proba[:, 1] > proba[:, 0], weight, -weight)
+        return _sigmoid(2 * decision / model.estimator_weights_.sum())
+    if isinstance(model, StackingClassifier) and len(model.classes_) == 2:
+        columns = []
+        for estimator, method in zip(model.estimators_, model.stack_method_):
+            if isinstance(estimator, str):
+                continue
+            if method == 'predict_proba':
+                columns.append(positive_proba(estimator, x))
+            else:
+                columns.append(getattr(estimator, method)(x))
+        meta = np.column_stack(columns)
+        if model.passthrough:
+            meta = np.hstack([meta, x])
+        return positive_proba(model.final_estimator_, meta)
+    if isinstance(model, VotingClassifier) and model.voting == 'soft' and len(model.classes_) == 2:
+        probas = np.column_stack([positive_proba(estimator, x) for estimator in model.estimators_])
+        return np.average(probas, axis=1, weights=model._weights_not_none)
+    if hasattr(model, 'get_booster') and getattr(model, 'n_classes_', 2) == 2:
+        return model.get_booster().inplace_predict(x, validate_features=False)
+    return model.predict_proba(x)[:, 1]
+
+
+class BattlePredictor:
+    """
+    Predizione online di singole battaglie: scaler e modello (stacking, logistic o voting)
+    vengono caricati una volta da model_dir. predict_proba estrae le feature della battaglia
+    con l'estrattore del set di feature del modello e le porta in un array nell'ordine delle
+    colonne di X_train (feature_names_in_ dello scaler), con i tipi di feature_schema, senza DataFrame.
+    """
+
+    def __init__(self, model='stacking', model_dir=MODEL_DIR):
+        if model not in MODELS:
+            raise ValueError(f"Modello '{model}' non supportato. Modelli: {list(MODELS)}")
+        feature_set, model_filename = MODELS[model]
+        with open(os.path.join(model_dir, SCALER_FILENAME), "rb") as f:
+            scaler = pickle.load(f)
+        with open(os.path.join(model_dir, model_filename), "rb") as f:
+            self.model = pickle.load(f)
+        self.name = model
+        self.feature_set = feature_set
+        self.extract = EXTRACTORS[feature_set]
+        self.scaler = scaler
+        self.columns = list(scaler.feature_names_in_)
+        # le colonne float32 di X_train vengono arrotondate allo stesso modo e la matrice ha il tipo
+        # che X_train prende da feature_schema (float32 se tutte le colonne sono compatte), su cui
+        # scaler.transform sottrae e divide in place con media e scala convertite a quel tipo
+        schema = FEATURE_DTYPES[feature_set]
+        self.real = np.array([schema.get(col) == REAL for col in self.columns])
+        self.dtype = np.result_type(*(np.dtype(schema.get(col, np.float64)) for col in self.columns))
+        self.mean = scaler.mean_.astype(self.dtype)
+        self.scale = scaler.scale_.astype(self.dtype)
+        self.fast_proba = self._check_positive_proba()
+
+    def _check_positive_proba(self):
+        """True se positive_proba coincide con predict_proba del modello su righe scalate di prova."""
+        rng = np.random.default_rng(0)
+        x = rng.standard_normal((CHECK_ROWS, len(self.columns))).astype(self.dtype)
+        x[0] = 0
+        expected = self.model.predict_proba(x)[:, 1]
+        try:
+            fast = positive_proba(self.model, x)
+        except Exception as e:
+            print(f"positive_proba non disponibile per {type(self.model).__name__} ({e}), uso predict_proba.")
+            return False
+        if not np.allclose(fast, expected, rtol=0, atol=CHECK_ATOL):
+            print(f"positive_proba diversa da predict_proba per {type(self.model).__name__} "
+                  f"con questa versione di scikit-learn, uso predict_proba.")
+            return False
+        return True
+
+    def positive_proba(self, x):
+        """Probabilita' della classe 1 per le righe scalate x."""
+        if self.fast_proba:
+            return positive_proba(self.model, x)
+        return self.model.predict_proba(x)[:, 1]
+
+    def _scale(self, x):
+        """Come scaler.transform su x (gia' di tipo self.dtype)."""
+        x -= self.mean
+        x /= self.scale
+        return x
+
+    def row(self, values):
+        """Riga scalata (1, n_feature) da un dict di feature; una feature assente vale 0 come nel fillna del batch."""
+        x = np.array([values.get(col, 0) for col in self.columns], dtype=np.float64)
+        x[self.real] = x[self.real].astype(np.float32)
+        return self._scale(x.astype(self.dtype)).reshape(1, -1)
+
+    def features(self, battle):
+        return self.row(self.extract(battle))
+
+    def predict_proba(self, battle):
+        """Probabilita' che vinca il giocatore 1."""
+        return float(self.positive_proba(self.features(battle))[0])
+
+    def batch_features(self, battles):
+        """Matrice scalata delle battaglie; i blocchi grandi usano columnar_features (stessi valori)."""
+        if len(battles) < COLUMNAR_MIN_BATCH:
+            return np.vstack([self.features(battle) for battle in battles])
+        df = apply_feature_schema(columnar_features(flatten_battles(battles), self.feature_set), self.feature_set)
+        x = df.reindex(columns=self.columns, fill_value=0).to_numpy(dtype=self.dtype, copy=True)
+        return self._scale(x)
+
+    def predict_many(self, battles):
+        """Probabilita' di vittoria del giocatore 1 per ogni battaglia, con una sola chiamata al modello."""
+        return self.positive_proba(self.batch_features(battles))
+
+    def live(self, battle):
+        """LiveBattle per una battaglia in corso (battle senza timeline o con i turni gia' giocati)."""
+        return LiveBattle(self, battle)
+
+
+class LiveBattle:
+    """
+    Probabilita' di vittoria di una battaglia in corso: ogni turno aggiorna le feature in O(1)
+    con IncrementalFeatures, senza riscandire la timeline, e update restituisce la probabilita'
+    calcolata sulla timeline vista finora.
+    """
+
+    def __init__(self, predictor, battle):
+        self.predictor = predictor
+        self.state = IncrementalFeatures(battle)
+        for turn in battle.get('battle_timeline', []):
+            self.state.update(turn)
+
+    def proba(self):
+        values = self.state.features(self.predictor.feature_set)
+        return float(self.predictor.positive_proba(self.predictor.row(values))[0])
+
+    def update(self, turn):
+        """Applica un turno e restituisce la nuova probabilita' che vinca il giocatore 1."""
+        self.state.update(turn)
+        return self.proba()
+
+
+def _response(predictor, battle):
+    proba = predictor.predict_proba(battle)
+    return {'battle_id': battle.get('battle_id'), 'player_won_proba': proba, 'player_won': int(proba >= 0.5)}
+
+
+def serve_stdio(predictor, stdin=None, stdout=None):
+    """Legge una battaglia JSON per riga da stdin e scrive una risposta JSON per riga su stdout."""
+    stdin = stdin or sys.stdin.buffer
+    stdout = stdout or sys.stdout
+    decode = get_decoder()
+    for line in stdin:
+        if not line.strip():
+            continue
+        try:
+            result = _response(predictor, decode(line))
+        except Exception as e:
+            result = {'error': str(e)}
+        stdout.write(json.dumps(result) + "\n")
+        stdout.flush()
+
+
+def serve_http(predictor, host="127.0.0.1", port=8000):
+    """POST /predict con una battaglia JSON (o una lista di battaglie) nel corpo."""
+    decode = get_decoder()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if self.path != "/predict":
+                self.send_error(404)
+                return
+            try:
+                body = decode(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                if isinstance(body, list):
+                    result = [_response(predictor, battle) for battle in body]
+                else:
+                    result = _response(predictor, body)
+                status = 200
+            except Exception as e:
+                result, status = {'error': str(e)}, 400
+            payload = json.dumps(result).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = HTTPServer((host, port), Handler)
+    print(f"Predizioni {predictor.name} su http://{host}:{port}/predict", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default="stacking", choices=list(MODELS))
+    parser.add_argument("--model-dir", default=MODEL_DIR)
+    parser.add_argument("--http", type=int, default=None, help="porta HTTP; senza, stdio")
+    parser.add_argument("--host", default="127.0.0.1")
+    args = parser.parse_args()
+    predictor = BattlePredictor(args.model, args.model_dir)
+    if args.http is None:
+        serve_stdio(predictor)
+    else:
+        serve_http(predictor, args.host, args.http)
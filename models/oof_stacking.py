@@ -0,0 +1,105 @@
+from copy import deepcopy
+
+import numpy as np
+from joblib import Parallel, delayed
+from scipy.stats import rankdata
+from sklearn.base import clone
+from sklearn.metrics import accuracy_score
+from sklearn.model_selection import ParameterGrid, check_cv, cross_val_predict
+from sklearn.preprocessing import LabelEncoder
+from sklearn.utils import _safe_indexing
+
+
+def _stack_method(estimator, stack_method):
+    if stack_method != 'auto':
+        return stack_method
+    for method in ('predict_proba', 'decision_function', 'predict'):
+        if hasattr(estimator, method):
+            return method
+
+
+def _meta_features(predictions, methods):
+    """Come StackingClassifier: nel caso binario di predict_proba si tiene solo la seconda colonna."""
+    columns = []
+    for preds, method in zip(predictions, methods):
+        if preds.ndim == 1:
+            columns.append(preds.reshape(-1, 1))
+        elif method == 'predict_proba' and preds.shape[1] == 2:
+            columns.append(preds[:, 1:])
+        else:
+            columns.append(preds)
+    return np.hstack(columns)
+
+
+def _fold_predictions(stack_model, X, y, train_idx, val_idx):
+    """
+    Per un fold esterno: predizioni out-of-fold dei modelli base sul train del fold (la CV interna
+    di StackingClassifier) e predizioni sul fold di validazione dei modelli base addestrati su tutto il train.
+    """
+    X_tr, X_val = _safe_indexing(X, train_idx), _safe_indexing(X, val_idx)
+    y_tr = y[train_idx]
+    estimators = [est for _, est in stack_model.estimators if est != 'drop']
+    methods = [_stack_method(est, stack_model.stack_method) for est in estimators]
+
+    cv = check_cv(stack_model.cv, y=y_tr, classifier=True)
+    if hasattr(cv, 'random_state') and cv.random_state is None:
+        cv.random_state = np.random.RandomState()
+    oof = [cross_val_predict(clone(est), X_tr, y_tr, cv=deepcopy(cv), method=method)
+           for est, method in zip(estimators, methods)]
+    val = [getattr(clone(est).fit(X_tr, y_tr), method)(X_val) for est, method in zip(estimators, methods)]
+    return _meta_features(oof, methods), _meta_features(val, methods)
+
+
+class OOFStackingSearch:
+    """
+    Grid search sugli iperparametri del meta-modello (final_estimator__*) e su passthrough di uno
+    StackingClassifier. Questi parametri non cambiano i modelli base, quindi le loro predizioni
+    out-of-fold vengono calcolate una volta per fold esterno e riusate da tutti i candidati:
+    i risultati coincidono con GridSearchCV(stack_model, param_grid, cv=cv, scoring='accuracy').
+    """
+
+    def __init__(self, stack_model, param_grid, cv=5, n_jobs=None):
+        unsupported = [k for k in ParameterGrid(param_grid).param_grid[0]
+                       if k != 'passthrough' and not k.startswith('final_estimator__')]
+        if unsupported:
+            raise ValueError(f"Parametri non supportati dalla ricerca OOF (cambiano i modelli base): {unsupported}")
+        self.stack_model = stack_model
+        self.param_grid = param_grid
+        self.cv = cv
+        self.n_jobs = n_jobs
+
+    def fit(self, X, y):
+        y_encoded = LabelEncoder().fit_transform(y)
+        splits = list(check_cv(self.cv, y=y, classifier=True).split(X, y))
+
+        self.fold_predictions_ = Parallel(n_jobs=self.n_jobs)(
+            delayed(_fold_predictions)(self.stack_model, X, y_encoded, train_idx, val_idx)
+            for train_idx, val_idx in splits
+        )
+
+        candidates = list(ParameterGrid(self.param_grid))
+        scores = np.empty((len(candidates), len(splits)))
+        for i, params in enumerate(candidates):
+            passthrough = params.get('passthrough', self.stack_model.passthrough)
+            final_params = {k[len('final_estimator__'):]: v for k, v in params.items() if k != 'passthrough'}
+            for j, ((train_idx, val_idx), (meta_tr, meta_val)) in enumerate(zip(splits, self.fold_predictions_)):
+                if passthrough:
+                    meta_tr = np.hstack([meta_tr, _safe_indexing(X, train_idx)])
+                    meta_val = np.hstack([meta_val, _safe_indexing(X, val_idx)])
+                final = clone(self.stack_model.final_estimator).set_params(**final_params)
+                final.fit(meta_tr, y_encoded[train_idx])
+                scores[i, j] = accuracy_score(y_encoded[val_idx], final.predict(meta_val))
+
+        means = np.average(scores, axis=1)
+        self.cv_results_ = {
+            'params': candidates,
+            'mean_test_score': means,
+            'std_test_score': np.sqrt(np.average((scores - means[:, None]) ** 2, axis=1)),
+            'rank_test_score': np.asarray(rankdata(-means, method='min'), dtype=np.int32),
+            **{f'split{j}_test_score': scores[:, j] for j in range(len(splits))},
+        }
+        self.best_index_ = int(self.cv_results_['rank_test_score'].argmin())
+        self.best_params_ = candidates[self.best_index_]
+        self.best_score_ = means[self.best_index_]
+        self.best_estimator_ = clone(self.stack_model).set_params(**self.best_params_).fit(X, y)
+        return self
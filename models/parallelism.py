@@ -0,0 +1,84 @@
+import os
+from contextlib import contextmanager
+from typing import NamedTuple
+
+from sklearn.ensemble import StackingClassifier, VotingClassifier
+from threadpoolctl import threadpool_limits
+
+
+# stadi della pipeline con un budget proprio
+STAGES = ('tuning', 'stacking', 'voting', 'cv')
+
+
+class Allocation(NamedTuple):
+    outer: int      # fit paralleli della ricerca / cross-validation (processi joblib)
+    ensemble: int   # modelli base addestrati in parallelo da Stacking/VotingClassifier
+    threads: int    # thread nativi per fit (n_jobs di XGBoost e RandomForest, OpenMP, BLAS)
+
+
+def available_cores():
+    """Core utilizzabili dal processo; la variabile d'ambiente POKEMON_N_CORES li sovrascrive."""
+    if os.environ.get('POKEMON_N_CORES'):
+        return int(os.environ['POKEMON_N_CORES'])
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+class ParallelBudget:
+    """
+    Divide i core tra la ricerca esterna (GridSearchCV, cross_val_score), l'ensemble interno
+    e i thread nativi, in modo che il prodotto dei tre non superi n_cores.
+    stages permette di fissare per uno stadio uno o piu' livelli, es.
+    ParallelBudget(stages={'stacking': {'outer': 4}}); gli altri livelli si adattano.
+    """
+
+    def __init__(self, n_cores=None, stages=None):
+        self.n_cores = n_cores or available_cores()
+        self.stages = stages or {}
+        unknown = set(self.stages) - set(STAGES)
+        if unknown:
+            raise ValueError(f"Stadi non riconosciuti: {sorted(unknown)}. Stadi: {STAGES}")
+
+    def allocate(self, stage, n_tasks, n_estimators=1):
+        """Allocazione per uno stadio con n_tasks fit indipendenti e n_estimators modelli nell'ensemble."""
+        fixed = self.stages.get(stage, {})
+        outer = fixed.get('outer', max(1, min(self.n_cores, n_tasks)))
+        remaining = max(1, self.n_cores // outer)
+        ensemble = fixed.get('ensemble', max(1, min(remaining, n_estimators)))
+        threads = fixed.get('threads', max(1, remaining // ensemble))
+        return Allocation(outer, ensemble, threads)
+
+    @staticmethod
+    def configure(estimator, allocation):
+        """
+        Imposta n_jobs su estimator e sui modelli annidati secondo allocation; i modelli con
+        n_jobs=None (es. LogisticRegression, dove non ha effetto) restano invariati.
+        """
+        params = estimator.get_params(deep=True)
+        updates = {}
+        for key, value in params.items():
+            if not key.endswith('n_jobs') or value is None:
+                continue
+            owner_key = key[:-len('n_jobs')].rstrip('_')
+            owner = params[owner_key] if owner_key else estimator
+            ensemble = isinstance(owner, (StackingClassifier, VotingClassifier))
+            updates[key] = allocation.ensemble if ensemble else allocation.threads
+        estimator.set_params(**updates)
+        return estimator
+
+    @staticmethod
+    @contextmanager
+    def limits(allocation):
+        """
+        Limita i thread nativi (OpenMP/BLAS) nel processo corrente. Nei worker joblib (loky)
+        il limite e' gia' core // fit paralleli, mentre XGBoost e RandomForest ricevono n_jobs
+        da configure.
+        """
+        with threadpool_limits(limits=allocation.threads):
+            yield
+
+    def describe(self, stage, allocation):
+        print(f"Parallelismo [{stage}] su {self.n_cores} core: {allocation.outer} fit paralleli x "
+              f"{allocation.ensemble} modelli dell'ensemble x {allocation.threads} thread")
+
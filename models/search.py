@@ -0,0 +1,118 @@
+import numpy as np
+from sklearn.base import BaseEstimator, ClassifierMixin
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+from sklearn.model_selection import (GridSearchCV, HalvingGridSearchCV, ParameterGrid, ParameterSampler,
+                                     RandomizedSearchCV, train_test_split)
+
+from models.folds import n_splits
+from models.tuning_store import CachedSearch
+
+
+# grid: ricerca esaustiva; halving: successive halving (i candidati peggiori vengono scartati
+# a ogni giro, i migliori ricevono piu' dati o alberi); random: campionamento di n_iter punti
+SEARCH_STRATEGIES = ('grid', 'halving', 'random')
+
+# modelli per cui la risorsa del successive halving e' il numero di alberi invece delle righe
+TREE_RESOURCES = {'random_forest': 'n_estimators', 'xgboost': 'n_estimators'}
+
+
+class EarlyStoppingXGBClassifier(ClassifierMixin, BaseEstimator):
+    """
+    XGBClassifier che ferma il boosting quando la logloss su una quota di validazione del fold
+    (validation_fraction) non migliora per early_stopping_rounds giri. n_estimators e' il massimo.
+    """
+
+    def __init__(self, n_estimators=250, learning_rate=0.1, max_depth=3, min_child_weight=1,
+                 early_stopping_rounds=20, validation_fraction=0.1, random_state=123,
+                 eval_metric='logloss', n_jobs=-1):
+        self.n_estimators = n_estimators
+        self.learning_rate = learning_rate
+        self.max_depth = max_depth
+        self.min_child_weight = min_child_weight
+        self.early_stopping_rounds = early_stopping_rounds
+        self.validation_fraction = validation_fraction
+        self.random_state = random_state
+        self.eval_metric = eval_metric
+        self.n_jobs = n_jobs
+
+    def _xgb(self, n_estimators, **kwargs):
+        from xgboost import XGBClassifier
+        return XGBClassifier(n_estimators=n_estimators, learning_rate=self.learning_rate,
+                             max_depth=self.max_depth, min_child_weight=self.min_child_weight,
+                             random_state=self.random_state, eval_metric=self.eval_metric,
+                             n_jobs=self.n_jobs, **kwargs)
+
+    def fit(self, X, y):
+        X_fit, X_val, y_fit, y_val = train_test_split(X, y, test_size=self.validation_fraction,
+                                                      stratify=y, random_state=self.random_state)
+        self.model_ = self._xgb(self.n_estimators, early_stopping_rounds=self.early_stopping_rounds)
+        self.model_.fit(X_fit, y_fit, eval_set=[(X_val, y_val)], verbose=False)
+        self.best_iteration_ = self.model_.best_iteration
+        self.classes_ = self.model_.classes_
+        return self
+
+    def predict(self, X):
+        return self.model_.predict(X)
+
+    def predict_proba(self, X):
+        return self.model_.predict_proba(X)
+
+    def to_xgb(self):
+        """XGBClassifier non addestrato con gli iperparametri trovati e i giri fermati dall'early stopping."""
+        return self._xgb(self.best_iteration_ + 1)
+
+
+def n_candidates(param_grid):
+    return len(ParameterGrid(param_grid))
+
+
+def build_search(strategy, model_name, estimator, param_grid, cv, n_jobs, n_iter=None, random_state=42, store=None):
+    """
+    Costruisce la ricerca di iperparametri per strategy. Con 'halving' la risorsa e' il numero
+    di alberi per random forest e XGBoost (se n_estimators e' nella griglia) e il numero di righe
+    per gli altri modelli; con 'random' vengono provati n_iter punti (di default un quinto della griglia).
+    Con store (TuningStore) le ricerche 'grid' e 'random' riusano i candidati gia' valutati;
+    il successive halving valuta i candidati su sottoinsiemi e non usa lo store.
+    """
+    if strategy not in SEARCH_STRATEGIES:
+        raise ValueError(f"Strategia '{strategy}' non supportata. Strategie: {SEARCH_STRATEGIES}")
+    common = dict(scoring='accuracy', cv=cv, n_jobs=n_jobs, refit=True)
+    if strategy == 'random':
+        n_iter = n_iter or max(10, n_candidates(param_grid) // 5)
+
+    if store is not None and strategy != 'halving':
+        if strategy == 'grid':
+            candidates = list(ParameterGrid(param_grid))
+        else:
+            # stessi punti di RandomizedSearchCV con lo stesso random_state
+            candidates = list(ParameterSampler(param_grid, n_iter, random_state=random_state))
+        return CachedSearch(store, model_name, estimator, candidates, list(cv), n_jobs=n_jobs)
+
+    if strategy == 'grid':
+        return GridSearchCV(estimator=estimator, param_grid=param_grid, **common)
+
+    if strategy == 'random':
+        return RandomizedSearchCV(estimator=estimator, param_distributions=param_grid, n_iter=n_iter,
+                                  random_state=random_state, **common)
+
+    resource = TREE_RESOURCES.get(model_name)
+    if resource in param_grid:
+        param_grid = dict(param_grid)
+        max_resources = int(np.max(param_grid.pop(resource)))
+        return HalvingGridSearchCV(estimator=estimator, param_grid=param_grid, factor=3, resource=resource,
+                                   max_resources=max_resources, min_resources=max(10, max_resources // 9),
+                                   random_state=random_state, **common)
+    return HalvingGridSearchCV(estimator=estimator, param_grid=param_grid, factor=3, resource='n_samples',
+                               random_state=random_state, **common)
+
+
+def first_round_fits(search, param_grid):
+    """Fit indipendenti del primo giro della ricerca, per dividere i core con ParallelBudget."""
+    folds = n_splits(search.cv)
+    if isinstance(search, CachedSearch):
+        return len(search.candidates) * folds
+    if isinstance(search, RandomizedSearchCV):
+        return search.n_iter * folds
+    if isinstance(search, HalvingGridSearchCV):
+        return n_candidates(search.param_grid) * folds
+    return n_candidates(param_grid) * folds
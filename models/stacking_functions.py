@@ -3,7 +3,13 @@ import os
 import pandas as pd
 from sklearn.ensemble import StackingClassifier
 from sklearn.linear_model import LogisticRegression
-from sklearn.model_selection import KFold, cross_val_score, GridSearchCV
+from sklearn.model_selection import KFold, cross_val_score, GridSearchCV, ParameterGrid
+
+from models.folds import n_splits
+from models.oof_stacking import OOFStackingSearch
+from models.parallelism import ParallelBudget
+from set_up_scripts.artifact_store import load_artifact
+
 MODEL_DIR = "models/generated_models"
 DATA_DIR = "data"
 
@@ -11,25 +17,16 @@ def load_pickle(path):
     with open(path, "rb") as f:
         return pickle.load(f)
 
-def load_data():
-    X_train = pd.read_pickle(f"{DATA_DIR}/X_train.pkl")
-    X_test = pd.read_pickle(f"{DATA_DIR}/X_test.pkl")
-    Y_train = pd.read_pickle(f"{DATA_DIR}/Y_train.pkl")
-    test_df = pd.read_pickle(f"{DATA_DIR}/df_test.pkl")
+def load_data(data_dir=DATA_DIR):
+    X_train = load_artifact("X_train", data_dir)
+    X_test = load_artifact("X_test", data_dir)
+    Y_train = load_artifact("Y_train", data_dir)
+    test_df = load_artifact("df_test", data_dir)
     return X_train, X_test, Y_train, test_df
 
-def load_scaler(X_train, X_test):
-    scaler_path = os.path.join(MODEL_DIR, "logistic_regression_scaler.pkl")
-    print(f"Caricamento scaler da: {scaler_path}")
-    scaler = load_pickle(scaler_path)
-    X_train_scaled = scaler.transform(X_train)
-    X_test_scaled = scaler.transform(X_test)
-    return X_train_scaled, X_test_scaled
-
-
-def load_base_models():
-    logreg_best = load_pickle(os.path.join(MODEL_DIR, "logistic_regression_best_model.pkl"))
-    xgb_best = load_pickle(os.path.join(MODEL_DIR, "xgboost_best_model.pkl"))
+def load_base_models(model_dir=MODEL_DIR):
+    logreg_best = load_pickle(os.path.join(model_dir, "logistic_regression_best_model.pkl"))
+    xgb_best = load_pickle(os.path.join(model_dir, "xgboost_best_model.pkl"))
     return logreg_best, xgb_best
 
 def build_stacking_model(logreg_best, xgb_best):
@@ -47,37 +44,66 @@ def build_stacking_model(logreg_best, xgb_best):
     )
     return stack_model
 
-def tune_stacking_model(stack_model, X_train, Y_train):
+def tune_stacking_model(stack_model, X_train, Y_train, budget=None, cv=5, mode='oof'):
+    """
+    Grid search su meta-modello e passthrough dello stacking. Con mode='oof' le predizioni
+    out-of-fold dei modelli base vengono calcolate una volta per fold e riusate da tutti i
+    candidati (stessi risultati di mode='grid', che riaddestra lo stacking per ogni candidato).
+    """
+    if mode not in ('oof', 'grid'):
+        raise ValueError(f"Modalita' '{mode}' non supportata. Modalita': ('oof', 'grid')")
     param_grid = {
         'final_estimator__C': [0.01, 0.1, 1, 10, 100],
         'final_estimator__solver': ['lbfgs', 'liblinear'],
         'passthrough': [False, True]
     }
 
-    print("\n--- Inizio Grid Search per Stacking ---")
-    grid = GridSearchCV(
-        estimator=stack_model,
-        param_grid=param_grid,
-        cv=5,
-        scoring='accuracy',
-        n_jobs=-1
-    )
-    grid.fit(X_train, Y_train)
+    budget = budget or ParallelBudget()
+    if mode == 'oof':
+        # un task per fold esterno, i modelli base del fold vengono addestrati in sequenza
+        allocation = budget.allocate('stacking', n_splits(cv))
+    else:
+        allocation = budget.allocate('stacking', len(ParameterGrid(param_grid)) * n_splits(cv),
+                                     len(stack_model.estimators))
+    budget.describe('stacking', allocation)
+    budget.configure(stack_model, allocation)
+
+    print(f"\n--- Inizio Grid Search per Stacking ({mode}) ---")
+    if mode == 'oof':
+        grid = OOFStackingSearch(stack_model, param_grid, cv=cv, n_jobs=allocation.outer)
+    else:
+        grid = GridSearchCV(
+            estimator=stack_model,
+            param_grid=param_grid,
+            cv=cv,
+            scoring='accuracy',
+            n_jobs=allocation.outer
+        )
+    with budget.limits(allocation):
+        grid.fit(X_train, Y_train)
 
     print("\n--- Risultati Grid Search ---")
     print("Migliori parametri trovati:", grid.best_params_)
     print(f"Accuracy media CV migliore: {grid.best_score_:.4f}")
     return grid.best_estimator_
 
-def validate_model(model, X_train, Y_train):
-    kf = KFold(n_splits=5, shuffle=True, random_state=42)
-    cv_scores = cross_val_score(model, X_train, Y_train, cv=kf, scoring='accuracy', n_jobs=-1)
+def validate_model(model, X_train, Y_train, budget=None, cv=None):
+    kf = cv if cv is not None else KFold(n_splits=5, shuffle=True, random_state=42)
+    budget = budget or ParallelBudget()
+    allocation = budget.allocate('cv', n_splits(kf), len(getattr(model, 'estimators', [None])))
+    budget.configure(model, allocation)
+    with budget.limits(allocation):
+        cv_scores = cross_val_score(model, X_train, Y_train, cv=kf, scoring='accuracy', n_jobs=allocation.outer)
     print(f"\nAccuratezze sui 5 fold: {cv_scores}")
     print(f"Media accuracy (KFold): {cv_scores.mean():.4f}")
     print(f"Deviazione standard: {cv_scores.std():.4f}")
 
-def train_and_predict(model, X_train, Y_train, X_test, test_df):
-    model.fit(X_train, Y_train)
+def train_and_predict(model, X_train, Y_train, X_test, test_df, budget=None):
+    budget = budget or ParallelBudget()
+    allocation = budget.allocate('stacking', 1, len(getattr(model, 'estimators', [None])))
+    budget.configure(model, allocation)
+    with budget.limits(allocation):
+        model.fit(X_train, Y_train)
     y_pred = model.predict(X_test)
 
     submission = pd.DataFrame({
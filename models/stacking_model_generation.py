@@ -2,32 +2,37 @@ import os
 import pickle
 
 from models.stacking_functions import (
+    DATA_DIR,
     load_data,
-    load_scaler,
     load_base_models,
     build_stacking_model,
     tune_stacking_model,
     validate_model,
     train_and_predict,
 )
+from models.folds import get_fold_cache
+from models.parallelism import ParallelBudget
 
 MODEL_DIR = "models/generated_models"
 
 
-def main():
-    X_train, X_test, Y_train, test_df = load_data()
-    X_train_scaled, X_test_scaled = load_scaler(X_train, X_test)
-    logreg, xgb = load_base_models()
+def main(budget=None, data_dir=DATA_DIR, model_dir=MODEL_DIR):
+    budget = budget or ParallelBudget()
+    X_train, X_test, Y_train, test_df = load_data(data_dir)
+    # split e matrici scalate condivisi con il tuning dei modelli base
+    folds = get_fold_cache(X_train, Y_train, X_test)
+    X_train_scaled, X_test_scaled = folds.X_train_scaled, folds.X_test_scaled
+    logreg, xgb = load_base_models(model_dir)
     stack_model = build_stacking_model(logreg, xgb)
 
-    best_model = tune_stacking_model(stack_model, X_train_scaled, Y_train)
+    best_model = tune_stacking_model(stack_model, X_train_scaled, Y_train, budget, cv=folds.splits)
 
-    with open(os.path.join(MODEL_DIR, "stacking_best_model.pkl"), "wb") as f:
+    with open(os.path.join(model_dir, "stacking_best_model.pkl"), "wb") as f:
         pickle.dump(best_model, f)
     print("Modello di stacking ottimizzato salvato.")
 
-    validate_model(best_model, X_train_scaled, Y_train)
-    train_and_predict(best_model, X_train_scaled, Y_train, X_test_scaled, test_df)
+    validate_model(best_model, X_train_scaled, Y_train, budget, cv=folds.splits)
+    train_and_predict(best_model, X_train_scaled, Y_train, X_test_scaled, test_df, budget)
 
 
 if __name__ == "__main__":
@@ -1,16 +1,19 @@
-import pandas as pd
-
+from models.folds import get_fold_cache
 from models.tuning_function import tune_model
+from set_up_scripts.artifact_store import load_artifact
 
 DATA_DIR = "data"
 
 
-def main():
-    X_train = pd.read_pickle(f"{DATA_DIR}/X_train.pkl")
-    Y_train = pd.read_pickle(f"{DATA_DIR}/Y_train.pkl")
+def main(budget=None, search='grid', early_stopping=False, data_dir=DATA_DIR, model_dir=None):
+    X_train = load_artifact("X_train", data_dir)
+    Y_train = load_artifact("Y_train", data_dir)
+    # stessi split e stessa matrice scalata per tutti i modelli
+    folds = get_fold_cache(X_train, Y_train)
 
     for model_name in ["xgboost", "logistic_regression", "adaboost"]:
-        tune_model(model_name, X_train, Y_train)
+        tune_model(model_name, X_train, Y_train, budget, search=search, early_stopping=early_stopping, folds=folds,
+                   model_dir=model_dir)
 
 
 if __name__ == "__main__":
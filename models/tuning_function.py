@@ -1,39 +1,25 @@
 import pandas as pd
 import pickle
 import os
-from sklearn.preprocessing import StandardScaler
-from sklearn.model_selection import KFold, GridSearchCV
 from sklearn.linear_model import LogisticRegression
 from sklearn.neighbors import KNeighborsClassifier
 from sklearn.tree import DecisionTreeClassifier
 from sklearn.ensemble import RandomForestClassifier, AdaBoostClassifier
 from xgboost import XGBClassifier
 
+from models.folds import get_fold_cache
+from models.parallelism import ParallelBudget
+from models.search import EarlyStoppingXGBClassifier, build_search, first_round_fits
+from models.tuning_store import CachedSearch, TuningStore
+
 import warnings
 warnings.filterwarnings('ignore', category=UserWarning)
 warnings.filterwarnings('ignore', category=FutureWarning)
 
 
-def tune_model(model_name: str, X_train: pd.DataFrame, Y_train: pd.Series):
-    print(f"\n--- Inizio Ottimizzazione per: {model_name} ---")
-
-    base_dir = os.path.dirname(__file__)
-    roba_dir = os.path.join(base_dir, "generated_models")
-    os.makedirs(roba_dir, exist_ok=True)
-
-    if model_name in ['logistic_regression', 'knn']:
-        print("Scaling dati di addestramento...")
-        scaler = StandardScaler()
-        X_train_processed = scaler.fit_transform(X_train)
-        scaler_filename = os.path.join(roba_dir, f"{model_name}_scaler.pkl")
-        print(f"Salvataggio scaler in: {scaler_filename}")
-        with open(scaler_filename, "wb") as f:
-            pickle.dump(scaler, f)
-    else:
-        print("Nessuno scaling necessario per questo modello.")
-        X_train_processed = X_train
-
-    models_config = {
+def get_models_config():
+    """Modello di partenza e griglia di iperparametri per ogni modello supportato."""
+    return {
         'logistic_regression': (
             LogisticRegression(random_state=123, max_iter=1000),
             {
@@ -92,39 +78,101 @@ def tune_model(model_name: str, X_train: pd.DataFrame, Y_train: pd.Series):
         )
     }
 
+
+def tune_model(model_name: str, X_train: pd.DataFrame, Y_train: pd.Series, budget: ParallelBudget = None,
+               search: str = 'grid', early_stopping: bool = False, n_iter: int = None, folds=None,
+               resume: bool = True, model_dir: str = None):
+    """
+    Ottimizza gli iperparametri di model_name con una 5-fold CV e salva il modello migliore.
+    search sceglie la strategia: 'grid' (ricerca esaustiva), 'halving' (successive halving)
+    o 'random' (n_iter punti della griglia). Con early_stopping=True XGBoost ferma il boosting
+    su una quota di validazione di ogni fold e n_estimators diventa il numero massimo di alberi.
+    Split e matrice scalata vengono da folds (di default la FoldCache condivisa per questi dati).
+    Con resume=True i risultati di ogni candidato vengono salvati in generated_models/tuning_results.jsonl:
+    i candidati gia' valutati sugli stessi dati non vengono rieseguiti e, se nulla e' cambiato,
+    viene restituito direttamente il modello gia' salvato.
+    model_dir sostituisce models/generated_models (es. una cartella per set di feature).
+    """
+    print(f"\n--- Inizio Ottimizzazione per: {model_name} ---")
+
+    base_dir = os.path.dirname(__file__)
+    roba_dir = model_dir or os.path.join(base_dir, "generated_models")
+    os.makedirs(roba_dir, exist_ok=True)
+
+    folds = folds or get_fold_cache(X_train, Y_train)
+
+    if model_name in ['logistic_regression', 'knn']:
+        print("Scaling dati di addestramento...")
+        scaler = folds.scaler
+        X_train_processed = folds.X_train_scaled
+        scaler_filename = os.path.join(roba_dir, f"{model_name}_scaler.pkl")
+        print(f"Salvataggio scaler in: {scaler_filename}")
+        with open(scaler_filename, "wb") as f:
+            pickle.dump(scaler, f)
+    else:
+        print("Nessuno scaling necessario per questo modello.")
+        X_train_processed = X_train
+
+    models_config = get_models_config()
+
     if model_name not in models_config:
         print(f"Errore: Modello '{model_name}' non riconosciuto.")
         print(f"Modelli supportati: {list(models_config.keys())}")
         return None, None, None
 
     estimator, param_grid = models_config[model_name]
+    if model_name == 'xgboost' and early_stopping:
+        param_grid = dict(param_grid)
+        estimator = EarlyStoppingXGBClassifier(n_estimators=max(param_grid.pop('n_estimators')),
+                                               random_state=123, eval_metric='logloss', n_jobs=-1)
+
+    print(f"Esecuzione ricerca '{search}' (5-Fold CV) per {model_name}...")
+    store = TuningStore(os.path.join(roba_dir, "tuning_results.jsonl")) if resume else None
+    grid_search = build_search(search, model_name, estimator, param_grid, folds.splits, n_jobs=None, n_iter=n_iter,
+                               store=store)
+    model_filename = os.path.join(roba_dir, f"{model_name}_best_model.pkl")
 
-    print(f"Esecuzione Grid Search (5-Fold CV) per {model_name}...")
-    kf_grid = KFold(n_splits=5, shuffle=True, random_state=42)
-
-    grid_search = GridSearchCV(
-        estimator=estimator,
-        param_grid=param_grid,
-        scoring='accuracy',
-        cv=kf_grid,
-        n_jobs=-1,
-        refit=True
-    )
-
-    grid_search.fit(X_train_processed, Y_train)
+    # i core vanno ai fit paralleli della ricerca, i thread dei modelli si adattano
+    budget = budget or ParallelBudget()
+    allocation = budget.allocate('tuning', first_round_fits(grid_search, param_grid))
+    budget.describe('tuning', allocation)
+    budget.configure(estimator, allocation)
+    grid_search.set_params(n_jobs=allocation.outer)
+
+    with budget.limits(allocation):
+        if isinstance(grid_search, CachedSearch):
+            grid_search.fit(X_train_processed, Y_train, model_path=model_filename)
+        else:
+            grid_search.fit(X_train_processed, Y_train)
+    n_fits = getattr(grid_search, 'n_fits_', len(grid_search.cv_results_['params']) * folds.n_splits)
+    print(f"Fit eseguiti: {n_fits}")
 
     best_params = grid_search.best_params_
     best_score = grid_search.best_score_
     best_model = grid_search.best_estimator_
+    if getattr(grid_search, 'from_cache_', False):
+        print("Dati, griglia e risultati invariati: uso il modello gia' salvato.")
+        if isinstance(estimator, EarlyStoppingXGBClassifier):
+            best_params = {**best_params, 'n_estimators': best_model.n_estimators}
+        return best_model, best_params, best_score
+    if isinstance(best_model, EarlyStoppingXGBClassifier):
+        # il modello salvato e' un XGBClassifier con gli alberi scelti dall'early stopping
+        best_model = best_model.to_xgb()
+        best_params = {**best_params, 'n_estimators': best_model.n_estimators}
+        with budget.limits(budget.allocate('tuning', 1)):
+            best_model.fit(X_train_processed, Y_train)
+    # il modello salvato, usato da solo, puo' sfruttare tutti i core
+    best_model = budget.configure(best_model, budget.allocate('tuning', 1))
 
     print("\n--- Risultati Ottimizzazione ---")
     print(f"Migliori Iperparametri trovati: {best_params}")
     print(f"Accuracy media di CV: {best_score:.4f}")
 
-    model_filename = os.path.join(roba_dir, f"{model_name}_best_model.pkl")
     print(f"Salvataggio modello in: {model_filename}")
     with open(model_filename, "wb") as f:
         pickle.dump(best_model, f)
+    if isinstance(grid_search, CachedSearch):
+        store.mark_best(model_filename, grid_search.search_key_)
 
     print(f"Tutti i file salvati in: {roba_dir}")
 
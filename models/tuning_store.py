@@ -0,0 +1,160 @@
+import hashlib
+import json
+import os
+import pickle
+import warnings
+
+import numpy as np
+from joblib import Parallel, delayed
+from scipy.stats import rankdata
+from sklearn.base import clone
+from sklearn.metrics import accuracy_score
+from sklearn.utils import _safe_indexing
+
+from models.folds import data_fingerprint
+
+
+# parametri che non cambiano i risultati di un fit
+RUNTIME_PARAMS = ('n_jobs', 'verbose')
+
+
+def _sha1(*parts):
+    return hashlib.sha1("\x1f".join(parts).encode()).hexdigest()
+
+
+def estimator_fingerprint(estimator):
+    params = {k: v for k, v in estimator.get_params(deep=False).items() if k not in RUNTIME_PARAMS}
+    return f"{type(estimator).__name__}({sorted(params.items())!r})"
+
+
+def params_fingerprint(params):
+    return repr(sorted(params.items()))
+
+
+def splits_fingerprint(splits):
+    return data_fingerprint(*[idx for split in splits for idx in split])
+
+
+class TuningStore:
+    """
+    Risultati per candidato del tuning in un file JSONL (una riga per candidato valutato,
+    scritta appena tutti i fold del candidato sono finiti). La chiave di una riga e' l'hash di
+    dati, split, modello, stimatore di partenza e parametri del candidato; una ricerca interrotta
+    riparte dai candidati mancanti e una ricerca gia' completa non riesegue nessun fit.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.scores = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # ultima riga troncata da un'interruzione
+                        continue
+                    self.scores[record['key']] = record['scores']
+
+    def add(self, key, model_name, params, scores):
+        self.scores[key] = scores
+        record = {'key': key, 'model': model_name, 'params': params_fingerprint(params), 'scores': scores}
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+
+    @staticmethod
+    def _best_path(model_path):
+        return os.path.splitext(model_path)[0] + '.json'
+
+    def best_model(self, model_path, search_key):
+        """Modello salvato in model_path se e' stato prodotto dalla ricerca search_key, altrimenti None."""
+        best_path = self._best_path(model_path)
+        if not (os.path.exists(model_path) and os.path.exists(best_path)):
+            return None
+        with open(best_path) as f:
+            if json.load(f).get('search') != search_key:
+                return None
+        with open(model_path, 'rb') as f:
+            return pickle.load(f)
+
+    def mark_best(self, model_path, search_key):
+        with open(self._best_path(model_path), 'w') as f:
+            json.dump({'search': search_key}, f)
+
+
+def _fit_and_score(estimator, X, y, train_idx, val_idx):
+    try:
+        estimator.fit(_safe_indexing(X, train_idx), _safe_indexing(y, train_idx))
+        return float(accuracy_score(_safe_indexing(y, val_idx), estimator.predict(_safe_indexing(X, val_idx))))
+    except Exception as e:
+        # come GridSearchCV con error_score=nan
+        warnings.warn(f"Fit fallito per {estimator}: {e}")
+        return float('nan')
+
+
+class CachedSearch:
+    """
+    Ricerca su una lista fissa di candidati (la griglia completa o i punti di una ricerca casuale)
+    con accuracy sugli split cv, come GridSearchCV/RandomizedSearchCV, ma con i risultati
+    salvati in store: vengono valutati solo i candidati non ancora presenti.
+    """
+
+    def __init__(self, store, model_name, estimator, candidates, cv, n_jobs=None):
+        self.store = store
+        self.model_name = model_name
+        self.estimator = estimator
+        self.candidates = candidates
+        self.cv = cv
+        self.n_jobs = n_jobs
+
+    def set_params(self, **params):
+        for key, value in params.items():
+            setattr(self, key, value)
+        return self
+
+    def _key(self, base, params):
+        return _sha1(base, params_fingerprint(params))
+
+    def fit(self, X, y, model_path=None):
+        base = _sha1(data_fingerprint(X, y), splits_fingerprint(self.cv), self.model_name,
+                     estimator_fingerprint(self.estimator))
+        keys = [self._key(base, params) for params in self.candidates]
+        self.search_key_ = _sha1(base, *keys)
+
+        missing = [i for i, key in enumerate(keys) if key not in self.store.scores]
+        self.n_fits_ = len(missing) * len(self.cv)
+        print(f"Candidati gia' valutati: {len(keys) - len(missing)}/{len(keys)}")
+        if missing:
+            tasks = [(i, j) for i in missing for j in range(len(self.cv))]
+            results = Parallel(n_jobs=self.n_jobs, return_as='generator')(
+                delayed(_fit_and_score)(clone(self.estimator).set_params(**self.candidates[i]), X, y, *self.cv[j])
+                for i, j in tasks
+            )
+            pending = {}
+            for (i, j), score in zip(tasks, results):
+                pending.setdefault(i, {})[j] = score
+                if len(pending[i]) == len(self.cv):
+                    done = pending.pop(i)
+                    scores = [done[f] for f in range(len(self.cv))]
+                    self.store.add(keys[i], self.model_name, self.candidates[i], scores)
+
+        scores = np.array([self.store.scores[key] for key in keys], dtype=float)
+        means = np.average(scores, axis=1)
+        ranked = np.where(np.isnan(means), -np.inf, means)
+        self.cv_results_ = {
+            'params': self.candidates,
+            'mean_test_score': means,
+            'rank_test_score': np.asarray(rankdata(-ranked, method='min'), dtype=np.int32),
+            **{f'split{j}_test_score': scores[:, j] for j in range(len(self.cv))},
+        }
+        self.best_index_ = int(self.cv_results_['rank_test_score'].argmin())
+        self.best_params_ = self.candidates[self.best_index_]
+        self.best_score_ = means[self.best_index_]
+
+        cached = self.store.best_model(model_path, self.search_key_) if model_path and not missing else None
+        self.from_cache_ = cached is not None
+        if self.from_cache_:
+            self.best_estimator_ = cached
+        else:
+            self.best_estimator_ = clone(self.estimator).set_params(**self.best_params_).fit(X, y)
+        return self
@@ -3,7 +3,11 @@ import pickle
 
 import pandas as pd
 from sklearn.ensemble import VotingClassifier
-from sklearn.model_selection import KFold, cross_val_score
+from sklearn.model_selection import cross_val_score
+
+from models.folds import get_fold_cache
+from models.parallelism import ParallelBudget
+from set_up_scripts.artifact_store import load_artifact
 
 MODEL_DIR = "models/generated_models"
 DATA_DIR = "data"
@@ -14,22 +18,19 @@ def load_pickle(path):
         return pickle.load(f)
 
 
-def main():
-    X_train = pd.read_pickle(f"{DATA_DIR}/X_train.pkl")
-    X_test = pd.read_pickle(f"{DATA_DIR}/X_test.pkl")
-    Y_train = pd.read_pickle(f"{DATA_DIR}/Y_train.pkl")
-    test_df = pd.read_pickle(f"{DATA_DIR}/df_test.pkl")
-
-    scaler_path = os.path.join(MODEL_DIR, "logistic_regression_scaler.pkl")
-    print(f"Caricamento scaler da: {scaler_path}")
-    scaler = load_pickle(scaler_path)
+def main(budget=None, data_dir=DATA_DIR, model_dir=MODEL_DIR):
+    X_train = load_artifact("X_train", data_dir)
+    X_test = load_artifact("X_test", data_dir)
+    Y_train = load_artifact("Y_train", data_dir)
+    test_df = load_artifact("df_test", data_dir)
 
-    X_train_scaled = scaler.transform(X_train)
-    X_test_scaled = scaler.transform(X_test)
+    # split e matrici scalate condivisi con il tuning dei modelli base
+    folds = get_fold_cache(X_train, Y_train, X_test)
+    X_train_scaled, X_test_scaled = folds.X_train_scaled, folds.X_test_scaled
 
-    logreg_best = load_pickle(os.path.join(MODEL_DIR, "logistic_regression_best_model.pkl"))
-    xgb_best = load_pickle(os.path.join(MODEL_DIR, "xgboost_best_model.pkl"))
-    adaboost_best = load_pickle(os.path.join(MODEL_DIR, "adaboost_best_model.pkl"))
+    logreg_best = load_pickle(os.path.join(model_dir, "logistic_regression_best_model.pkl"))
+    xgb_best = load_pickle(os.path.join(model_dir, "xgboost_best_model.pkl"))
+    adaboost_best = load_pickle(os.path.join(model_dir, "adaboost_best_model.pkl"))
 
     voting_clf = VotingClassifier(
         estimators=[
@@ -40,17 +41,25 @@ def main():
         voting="soft",
         n_jobs=-1,
     )
-    kf = KFold(n_splits=5, shuffle=True, random_state=42)
-    cv_scores = cross_val_score(voting_clf, X_train_scaled, Y_train, cv=kf, scoring="accuracy", n_jobs=-1)
+    budget = budget or ParallelBudget()
+    allocation = budget.allocate("voting", folds.n_splits, len(voting_clf.estimators))
+    budget.describe("voting", allocation)
+    budget.configure(voting_clf, allocation)
+    with budget.limits(allocation):
+        cv_scores = cross_val_score(voting_clf, X_train_scaled, Y_train, cv=folds.splits, scoring="accuracy",
+                                    n_jobs=allocation.outer)
 
     print("\n--- Risultati Cross-Validation ---")
     print(f"Accuratezze sui 5 fold: {cv_scores}")
     print(f"Media accuracy: {cv_scores.mean():.4f}")
     print(f"Deviazione standard: {cv_scores.std():.4f}")
 
-    voting_clf.fit(X_train_scaled, Y_train)
+    allocation = budget.allocate("voting", 1, len(voting_clf.estimators))
+    budget.configure(voting_clf, allocation)
+    with budget.limits(allocation):
+        voting_clf.fit(X_train_scaled, Y_train)
 
-    with open(os.path.join(MODEL_DIR, "voting_best_model.pkl"), "wb") as f:
+    with open(os.path.join(model_dir, "voting_best_model.pkl"), "wb") as f:
         pickle.dump(voting_clf, f)
     print("\nModello di voting salvato correttamente.")
 
@@ -2,15 +2,71 @@ from set_up_scripts import set_up
 from models import tuned_models_generation
 from models import stacking_model_generation
 from models import logistic
+from models.parallelism import ParallelBudget
+from pipeline_graph import PipelineGraph, Stage
 
+RAW_DIR = "fds-pokemon-battles-prediction-2025"
+DATA_DIR = "data"
+MODEL_DIR = "models/generated_models"
 
-def main():
+RAW_DATA = [f"{RAW_DIR}/train.jsonl", f"{RAW_DIR}/test.jsonl"]
+SET_UP_CODE = ["set_up_scripts/*.py"]
+
+
+def datasets(data_dir=DATA_DIR, names=("df_train", "df_test", "X_train", "X_test", "Y_train")):
+    return [f"{data_dir}/{name}.*" for name in names]
+
+
+def training_data(data_dir=DATA_DIR):
+    return datasets(data_dir, ("df_test", "X_train", "X_test", "Y_train"))
+
+
+def tuned_models(model_dir=MODEL_DIR):
+    return [f"{model_dir}/{name}_best_model.pkl" for name in ("xgboost", "logistic_regression", "adaboost")]
+
+
+def setup_stage(name, set_up_main, code):
+    return Stage(name, set_up_main, inputs=RAW_DATA + code, outputs=datasets())
+
+
+def tuning_stage(name="tuning", data_dir=DATA_DIR, model_dir=MODEL_DIR):
+    return Stage(name, tuned_models_generation.main,
+                 inputs=training_data(data_dir),
+                 outputs=tuned_models(model_dir), params={'data_dir': data_dir, 'model_dir': model_dir}, budget=True)
+
+
+def stacking_stages(data_dir=DATA_DIR, model_dir=MODEL_DIR, suffix=""):
+    """
+    Stacking e logistic: dipendono solo dai modelli ottimizzati, quindi girano in parallelo.
+    I moduli che importano (folds, oof_stacking, ...) sono inputs tramite pipeline_graph.code_files.
+    """
+    inputs = training_data(data_dir) + tuned_models(model_dir)
+    params = {'data_dir': data_dir, 'model_dir': model_dir}
+    return [
+        Stage("stacking" + suffix, stacking_model_generation.main,
+              inputs=inputs,
+              outputs=[f"{model_dir}/stacking_best_model.pkl", f"{RAW_DIR}/submission_ST.csv"],
+              params=params, budget=True),
+        Stage("logistic" + suffix, logistic.main,
+              inputs=inputs,
+              outputs=[f"{RAW_DIR}/submission_LOG.csv"], params=params, budget=True),
+    ]
+
+
+def build_graph(budget=None):
+    stages = [
+        setup_stage("set_up", set_up.main, SET_UP_CODE),
+        tuning_stage(),
+        *stacking_stages(),
+    ]
+    return PipelineGraph(stages, budget)
+
+
+def main(budget=None, force=False):
     print("\n=== Avvio pipeline Pokémon Battles ===\n")
+    budget = budget or ParallelBudget()
 
-    set_up.main()
-    tuned_models_generation.main()
-    stacking_model_generation.main()
-    logistic.main()
+    build_graph(budget).run(force=force)
 
     print("\n=== Pipeline completata con successo ===\n")
 
@@ -0,0 +1,41 @@
+import os
+
+from set_up_scripts import set_up_all
+from set_up_scripts.set_up_all import FEATURE_SET_DIRS
+from models.parallelism import ParallelBudget
+from pipeline import MODEL_DIR, RAW_DATA, SET_UP_CODE, datasets, stacking_stages, tuning_stage
+from pipeline_graph import PipelineGraph, Stage
+from pipeline_vot import voting_stage
+
+# modelli ottimizzati di ciascun set di feature (es. models/generated_models/voting/)
+MODEL_DIRS = {feature_set: os.path.join(MODEL_DIR, feature_set) for feature_set in FEATURE_SET_DIRS}
+
+
+def build_graph(budget=None):
+    """
+    Una sola lettura dei dati con entrambi i set di feature, poi i due tuning in parallelo
+    e infine stacking, logistic e voting in parallelo.
+    """
+    stacking_data, voting_data = FEATURE_SET_DIRS['stacking'], FEATURE_SET_DIRS['voting']
+    stages = [
+        Stage("set_up_all", set_up_all.main, inputs=RAW_DATA + SET_UP_CODE,
+              outputs=datasets(stacking_data) + datasets(voting_data)),
+        tuning_stage("tuning_stacking", stacking_data, MODEL_DIRS['stacking']),
+        tuning_stage("tuning_voting", voting_data, MODEL_DIRS['voting']),
+        *stacking_stages(stacking_data, MODEL_DIRS['stacking'], suffix="_all"),
+        voting_stage(voting_data, MODEL_DIRS['voting'], suffix="_all"),
+    ]
+    return PipelineGraph(stages, budget)
+
+
+def main(budget=None, force=False):
+    print("\n=== Avvio pipeline Pokémon Battles (stacking e voting) ===\n")
+    budget = budget or ParallelBudget()
+
+    build_graph(budget).run(force=force)
+
+    print("\n=== Pipeline completata con successo ===\n")
+
+
+if __name__ == "__main__":
+    main()
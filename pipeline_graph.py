@@ -0,0 +1,227 @@
+import ast
+import glob
+import hashlib
+import importlib.util
+import json
+import multiprocessing as mp
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from models.parallelism import ParallelBudget
+
+
+STATE_PATH = ".pipeline_state.json"
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def _project_file(spec, root):
+    origin = spec.origin if spec else None
+    if origin and origin.endswith(".py") and os.path.abspath(origin).startswith(root + os.sep):
+        return origin
+    return None
+
+
+def _find_spec(name):
+    try:
+        return importlib.util.find_spec(name)
+    except (ImportError, ValueError):
+        return None
+
+
+def code_files(func, root=PROJECT_ROOT):
+    """
+    File .py del progetto (sotto root) da cui dipende func: il suo modulo e quelli che importa,
+    anche indirettamente, letti dagli import nel sorgente senza eseguirli.
+    """
+    module = sys.modules[func.__module__]
+    files = set()
+    stack = [(module.__file__, module.__package__ or "")]
+    while stack:
+        path, package = stack.pop()
+        if path in files:
+            continue
+        files.add(path)
+        with open(path) as f:
+            tree = ast.parse(f.read())
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                imports = [(alias.name, ()) for alias in node.names]
+            elif isinstance(node, ast.ImportFrom):
+                base = importlib.util.resolve_name("." * node.level + (node.module or ""), package) \
+                    if node.level else node.module
+                imports = [(base, [alias.name for alias in node.names])]
+            else:
+                continue
+            for name, members in imports:
+                spec = _find_spec(name)
+                if spec is None or _project_file(spec, root) is None:
+                    continue
+                is_package = spec.submodule_search_locations is not None
+                stack.append((spec.origin, name if is_package else name.rpartition(".")[0]))
+                # from pacchetto import modulo
+                for member in members if is_package else ():
+                    sub_spec = _find_spec(f"{name}.{member}")
+                    if sub_spec is not None and _project_file(sub_spec, root) is not None:
+                        stack.append((sub_spec.origin, name))
+    return sorted(os.path.relpath(path) for path in files)
+
+
+class Stage:
+    """
+    Stadio della pipeline: func viene chiamata con params (e con budget=ParallelBudget se
+    budget=True). inputs e outputs sono percorsi o pattern glob (es. "data/X_train.*"); uno
+    stadio dipende da quelli che dichiarano tra gli outputs uno dei suoi inputs. I moduli del
+    progetto importati da func (code_files) fanno parte degli inputs senza doverli elencare.
+    """
+
+    def __init__(self, name, func, inputs=(), outputs=(), params=None, budget=False):
+        self.name = name
+        self.func = func
+        self.inputs = tuple(inputs)
+        self.outputs = tuple(outputs)
+        self.params = params or {}
+        self.budget = budget
+
+
+def _call_stage(stage, budget):
+    kwargs = dict(stage.params)
+    if stage.budget:
+        kwargs['budget'] = budget
+    stage.func(**kwargs)
+
+
+class PipelineGraph:
+    """
+    Esegue gli stadi in ordine di dipendenza. Uno stadio viene saltato se l'hash dei suoi
+    inputs e dei params e' quello dell'ultima esecuzione e i suoi outputs non sono cambiati da
+    allora (stato in .pipeline_state.json). Gli stadi dello stesso livello da eseguire girano
+    in processi nuovi (spawn, con i core del budget divisi tra loro): il fork dopo un fit di
+    XGBoost o di OpenMP nel processo principale puo' bloccarsi in libgomp. Uno stadio da solo
+    gira nel processo principale e ne condivide le cache (es. FoldCache).
+    """
+
+    def __init__(self, stages, budget=None, state_path=STATE_PATH, max_workers=None):
+        self.stages = {stage.name: stage for stage in stages}
+        self.budget = budget or ParallelBudget()
+        self.state_path = state_path
+        self.max_workers = max_workers or self.budget.n_cores
+        self.levels = self._levels()
+        self.state = self._load_state()
+
+    def _levels(self):
+        producers = {path: stage.name for stage in self.stages.values() for path in stage.outputs}
+        deps = {name: {producers[path] for path in stage.inputs if producers.get(path, name) != name}
+                for name, stage in self.stages.items()}
+        levels, done = [], set()
+        while len(done) < len(deps):
+            level = [name for name in deps if name not in done and deps[name] <= done]
+            if not level:
+                raise ValueError(f"Dipendenze circolari tra gli stadi: {sorted(set(deps) - done)}")
+            levels.append(level)
+            done.update(level)
+        return levels
+
+    def _load_state(self):
+        if os.path.exists(self.state_path):
+            with open(self.state_path) as f:
+                return json.load(f)
+        return {'stages': {}, 'files': {}}
+
+    def _save_state(self):
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.state, f, indent=1)
+        os.replace(tmp_path, self.state_path)
+
+    def _file_hash(self, path):
+        """sha1 del contenuto, ricalcolato solo se dimensione o mtime sono cambiati."""
+        stat = os.stat(path)
+        cached = self.state['files'].get(path)
+        if cached and cached[:2] == [stat.st_size, stat.st_mtime_ns]:
+            return cached[2]
+        digest = hashlib.sha1()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        self.state['files'][path] = [stat.st_size, stat.st_mtime_ns, digest.hexdigest()]
+        return digest.hexdigest()
+
+    def _files(self, pattern):
+        for path in sorted(glob.glob(pattern)):
+            if os.path.isdir(path):
+                for root, dirs, files in os.walk(path):
+                    dirs.sort()
+                    for file_name in sorted(files):
+                        yield os.path.join(root, file_name)
+            else:
+                yield path
+
+    def fingerprint(self, patterns, extra=""):
+        digest = hashlib.sha1(extra.encode())
+        for pattern in patterns:
+            digest.update(pattern.encode())
+            for path in self._files(pattern):
+                digest.update(f"{path}:{self._file_hash(path)}".encode())
+        return digest.hexdigest()
+
+    def _input_key(self, stage):
+        func = f"{stage.func.__module__}.{stage.func.__qualname__}"
+        inputs = stage.inputs + tuple(code_files(stage.func))
+        return self.fingerprint(inputs, func + repr(sorted(stage.params.items())))
+
+    def is_fresh(self, name):
+        stage = self.stages[name]
+        previous = self.state['stages'].get(name)
+        if previous is None or not all(glob.glob(pattern) for pattern in stage.outputs):
+            return False
+        return previous == {'inputs': self._input_key(stage), 'outputs': self.fingerprint(stage.outputs)}
+
+    def run_stage(self, name):
+        _call_stage(self.stages[name], self.budget)
+
+    def _record(self, name):
+        stage = self.stages[name]
+        missing = [pattern for pattern in stage.outputs if not glob.glob(pattern)]
+        if missing:
+            raise RuntimeError(f"Lo stadio '{name}' non ha prodotto: {missing}")
+        self.state['stages'][name] = {'inputs': self._input_key(stage), 'outputs': self.fingerprint(stage.outputs)}
+        self._save_state()
+
+    def _run_parallel(self, names):
+        budget = ParallelBudget(n_cores=max(1, self.budget.n_cores // len(names)), stages=self.budget.stages)
+        with ProcessPoolExecutor(max_workers=len(names), mp_context=mp.get_context('spawn')) as pool:
+            futures = {name: pool.submit(_call_stage, self.stages[name], budget) for name in names}
+            errors = []
+            for name, future in futures.items():
+                # gli stadi completati vengono registrati anche se un altro e' fallito
+                try:
+                    future.result()
+                except Exception as e:
+                    errors.append(e)
+                    continue
+                self._record(name)
+        if errors:
+            raise errors[0]
+
+    def run(self, force=False):
+        """Esegue gli stadi non aggiornati (tutti con force=True); restituisce i nomi di quelli eseguiti."""
+        executed = []
+        for level in self.levels:
+            stale = [name for name in level if force or not self.is_fresh(name)]
+            for name in level:
+                if name not in stale:
+                    print(f"[pipeline] {name}: invariato, saltato")
+            if not stale:
+                continue
+            print(f"[pipeline] esecuzione: {', '.join(stale)}")
+            concurrent = min(len(stale), self.max_workers)
+            if concurrent > 1:
+                for start in range(0, len(stale), concurrent):
+                    self._run_parallel(stale[start:start + concurrent])
+            else:
+                for name in stale:
+                    self.run_stage(name)
+                    self._record(name)
+            executed.extend(stale)
+        return executed
@@ -1,14 +1,32 @@
 from set_up_scripts import set_up_vot
-from models import tuned_models_generation
 from models import voting_model
+from models.parallelism import ParallelBudget
+from pipeline import (DATA_DIR, MODEL_DIR, RAW_DIR, SET_UP_CODE, setup_stage, training_data, tuned_models,
+                      tuning_stage)
+from pipeline_graph import PipelineGraph, Stage
 
 
-def main():
+def voting_stage(data_dir=DATA_DIR, model_dir=MODEL_DIR, suffix=""):
+    return Stage("voting" + suffix, voting_model.main,
+                 inputs=training_data(data_dir) + tuned_models(model_dir),
+                 outputs=[f"{model_dir}/voting_best_model.pkl", f"{RAW_DIR}/submission_VOT.csv"],
+                 params={'data_dir': data_dir, 'model_dir': model_dir}, budget=True)
+
+
+def build_graph(budget=None):
+    stages = [
+        setup_stage("set_up_vot", set_up_vot.main, SET_UP_CODE),
+        tuning_stage(),
+        voting_stage(),
+    ]
+    return PipelineGraph(stages, budget)
+
+
+def main(budget=None, force=False):
     print("\n=== Avvio pipeline Pokémon Voting Model ===\n")
+    budget = budget or ParallelBudget()
 
-    set_up_vot.main()
-    tuned_models_generation.main()
-    voting_model.main()
+    build_graph(budget).run(force=force)
 
     print("\n=== Pipeline completata con successo ===\n")
 
@@ -0,0 +1,208 @@
+import glob
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+
+FORMATS = ("npy", "pickle")
+
+
+def write_columns(path, data):
+    """
+    Salva un DataFrame o una Series in formato colonnare: una directory con un file .npy per
+    colonna e uno schema.json con nomi, tipi e indice.
+    """
+    frame = data.to_frame() if isinstance(data, pd.Series) else data
+    tmp_path = path + ".tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    columns = []
+    for i, col in enumerate(frame.columns):
+        values = frame[col].to_numpy()
+        np.save(os.path.join(tmp_path, f"{i}.npy"), values, allow_pickle=values.dtype == object)
+        columns.append({"name": col, "dtype": str(values.dtype)})
+
+    index = frame.index
+    default_index = isinstance(index, pd.RangeIndex) and index.start == 0 and index.step == 1
+    if not default_index:
+        values = index.to_numpy()
+        np.save(os.path.join(tmp_path, "index.npy"), values, allow_pickle=values.dtype == object)
+
+    schema = {
+        "kind": "series" if isinstance(data, pd.Series) else "frame",
+        "columns": columns,
+        "columns_dtype": str(frame.columns.dtype),
+        "n_rows": len(frame),
+        "index": None if default_index else index.name,
+    }
+    with open(os.path.join(tmp_path, "schema.json"), "w") as f:
+        json.dump(schema, f, indent=2)
+
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+
+
+def read_columns(path, mmap=True):
+    """Carica un dataset salvato con write_columns; con mmap=True le colonne numeriche non vengono copiate."""
+    with open(os.path.join(path, "schema.json")) as f:
+        schema = json.load(f)
+
+    def load(file_name, dtype):
+        if dtype == "object":
+            return np.load(os.path.join(path, file_name), allow_pickle=True)
+        return np.load(os.path.join(path, file_name), mmap_mode="r" if mmap else None)
+
+    columns = {c["name"]: load(f"{i}.npy", c["dtype"]) for i, c in enumerate(schema["columns"])}
+    index = None
+    if os.path.exists(os.path.join(path, "index.npy")):
+        index = pd.Index(np.load(os.path.join(path, "index.npy"), allow_pickle=True), name=schema["index"])
+
+    frame = pd.DataFrame(columns, index=index, copy=False)
+    frame.columns = pd.Index(list(columns), dtype=schema["columns_dtype"])
+    if schema["kind"] == "series":
+        return frame.iloc[:, 0]
+    return frame
+
+
+class ArtifactStore:
+    """
+    Salvataggio dei dataset in data/ (df_train, df_test, X_train, X_test, Y_train).
+    Il formato di default e' colonnare (data/<name>.npy/, caricabile in memory-map), con
+    fmt="pickle" si usa il vecchio data/<name>.pkl; l'esportazione CSV e' opzionale.
+    write() riscrive il dataset intero; upsert() lo tiene in data/<name>.parts/ come segmenti
+    e ad ogni aggiornamento scrive solo le righe nuove o cambiate, riconosciute dalla chiave
+    (battle_id) e da un hash del contenuto della riga.
+    """
+
+    def __init__(self, save_dir="data", key="battle_id", max_parts=32, fmt="npy", export_csv=False):
+        if fmt not in FORMATS:
+            raise ValueError(f"Formato '{fmt}' non supportato. Formati: {FORMATS}")
+        self.save_dir = save_dir
+        self.key = key
+        self.max_parts = max_parts
+        self.fmt = fmt
+        self.export_csv = export_csv
+        os.makedirs(self.save_dir, exist_ok=True)
+
+    def _file(self, name, ext):
+        return os.path.join(self.save_dir, f"{name}.{ext}")
+
+    def _parts_dir(self, name):
+        return os.path.join(self.save_dir, f"{name}.parts")
+
+    def _save(self, base_path, data):
+        if self.fmt == "npy":
+            write_columns(base_path + ".npy", data)
+        else:
+            data.to_pickle(base_path + ".pkl")
+
+    @staticmethod
+    def _read(base_path, mmap=True):
+        if os.path.isdir(base_path + ".npy"):
+            return read_columns(base_path + ".npy", mmap=mmap)
+        return pd.read_pickle(base_path + ".pkl")
+
+    def _part_paths(self, name):
+        # solo i segmenti completi: non i .tmp lasciati da una write_columns interrotta
+        parts_dir = self._parts_dir(name)
+        return sorted(glob.glob(os.path.join(parts_dir, "part-?????.npy"))
+                      + glob.glob(os.path.join(parts_dir, "part-?????.pkl")))
+
+    def write(self, name, data):
+        """Riscrive l'intero dataset (ed elimina segmenti e versioni in un formato diverso)."""
+        shutil.rmtree(self._parts_dir(name), ignore_errors=True)
+        if self.fmt == "pickle":
+            shutil.rmtree(self._file(name, "npy"), ignore_errors=True)
+        self._save(os.path.join(self.save_dir, name), data)
+        if self.export_csv:
+            data.to_csv(self._file(name, "csv"), index=False)
+
+    def load(self, name, mmap=True):
+        """
+        Carica un dataset: dai segmenti se esistono, poi dal formato colonnare (in memory-map
+        se mmap=True), infine dal pickle. Un solo segmento gia' nell'ordine delle righe (es. dopo
+        compact) resta in memory-map; con piu' segmenti le righe vengono riunite in memoria.
+        """
+        parts_dir = self._parts_dir(name)
+        if not os.path.isdir(parts_dir):
+            return self._read(os.path.join(self.save_dir, name), mmap=mmap)
+
+        index = pd.read_pickle(os.path.join(parts_dir, "index.pkl"))
+        parts = [self._read(os.path.splitext(path)[0], mmap=mmap) for path in self._part_paths(name)]
+        data = parts[0] if len(parts) == 1 else pd.concat(parts)
+        order = index.sort_values("position").index
+        if not data.index.equals(order):
+            data = data[~data.index.duplicated(keep="last")]
+            data = data.loc[order]
+        return data.reset_index(drop=True)
+
+    def upsert(self, name, data, keys=None):
+        """
+        Aggiunge le righe nuove e sostituisce quelle cambiate, lasciando intatti i segmenti
+        gia' scritti. keys identifica le righe (di default la colonna battle_id di data).
+        Restituisce il numero di righe nuove e di righe aggiornate.
+        """
+        keys = pd.Index(data[self.key] if keys is None else keys, name=self.key)
+        hashes = pd.Series(pd.util.hash_pandas_object(data, index=False).values, index=keys)
+        parts_dir = self._parts_dir(name)
+        index_path = os.path.join(parts_dir, "index.pkl")
+
+        if os.path.isdir(parts_dir):
+            index = pd.read_pickle(index_path)
+        else:
+            os.makedirs(parts_dir)
+            index = pd.DataFrame({"hash": pd.Series(dtype="uint64"), "position": pd.Series(dtype="int64")},
+                                 index=pd.Index([], name=self.key))
+
+        known = hashes.index.isin(index.index)
+        changed = known & (index["hash"].reindex(hashes.index).values != hashes.values)
+        new = ~known
+        n_new, n_changed = int(new.sum()), int(changed.sum())
+        if not n_new and not n_changed:
+            print(f"{name}: nessuna riga nuova o modificata.")
+            return 0, 0
+
+        delta = data[new | changed].copy()
+        delta.index = keys[new | changed]
+        n_parts = len(self._part_paths(name))
+        self._save(os.path.join(parts_dir, f"part-{n_parts:05d}"), delta)
+
+        start = int(index["position"].max()) + 1 if len(index) else 0
+        added = pd.DataFrame({"hash": hashes[new].values,
+                              "position": range(start, start + n_new)}, index=keys[new])
+        index.loc[keys[changed], "hash"] = hashes[changed].values
+        index = pd.concat([index, added])
+        index.to_pickle(index_path)
+
+        if self.export_csv:
+            csv_path = self._file(name, "csv")
+            if n_changed or not os.path.exists(csv_path) or n_parts == 0:
+                self.load(name).to_csv(csv_path, index=False)
+            else:
+                data[new].to_csv(csv_path, mode="a", header=False, index=False)
+
+        if n_parts + 1 > self.max_parts:
+            self.compact(name)
+        print(f"{name}: {n_new} righe nuove, {n_changed} aggiornate.")
+        return n_new, n_changed
+
+    def compact(self, name):
+        """Riunisce i segmenti di un dataset in uno solo."""
+        parts_dir = self._parts_dir(name)
+        index = pd.read_pickle(os.path.join(parts_dir, "index.pkl"))
+        data = self.load(name)
+        data.index = index.sort_values("position").index
+        for path in self._part_paths(name):
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+        self._save(os.path.join(parts_dir, "part-00000"), data)
+
+
+def load_artifact(name, save_dir="data", mmap=True):
+    return ArtifactStore(save_dir).load(name, mmap=mmap)
@@ -0,0 +1,294 @@
+import json
+import os
+import shutil
+from array import array
+from collections.abc import Sequence
+
+import numpy as np
+
+from set_up_scripts.columnar import STATS, TurnTable
+from set_up_scripts.encoding import (
+    MISSING_NAME, NO_NAME, SIDE_CODE_INDEX, SIDE_CODES, SIDES, TURN_WIDTH, BattleRecord, BattleVocabulary,
+    PokemonRecord, encode_battle, turn_columns,
+)
+
+
+# colonne dei pokemon (team di p1 e lead di p2): id del nome e statistiche base
+POKEMON_COLUMNS = ('name',) + tuple(f'base_{stat}' for stat in STATS)
+# archivio su disco (BattleStore.save): un .npy per array, battle_id e indice per battle_id, meta.json
+ARCHIVE_VERSION = 1
+ARCHIVE_ARRAYS = ('player_won', 'offsets', 'codes', 'hp', 'team_offsets', 'has_team', 'team', 'has_lead', 'lead')
+INT64_RANGE = (-2 ** 63, 2 ** 63)
+
+
+def archive_path(file_path):
+    """Cartella dell'archivio binario di un .jsonl (train.jsonl -> train.battles)."""
+    return os.path.splitext(file_path)[0] + '.battles'
+
+
+def source_signature(file_path) -> dict:
+    """Dimensione e mtime del .jsonl da cui e' stato creato un archivio."""
+    stat = os.stat(file_path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def archive_source(path):
+    """source_signature salvata nell'archivio path, None se l'archivio manca o e' di un'altra versione."""
+    try:
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get('version') != ARCHIVE_VERSION or meta.get('turn_width') != TURN_WIDTH:
+        return None
+    return meta.get('source')
+
+
+def _int_ids(battle_id):
+    return all(type(i) is int and INT64_RANGE[0] <= i < INT64_RANGE[1] for i in battle_id)
+
+
+class BattleStore(Sequence):
+    """
+    Battaglie in memoria come struct-of-arrays: i turni di tutte le battaglie stanno negli stessi
+    array tipizzati (codes, TURN_WIDTH interi per turno, e hp, due float per turno) e la battaglia i
+    occupa i turni offsets[i]:offsets[i + 1]; i pokemon del team di p1 stanno in team, con
+    team_offsets, e i lead di p2 in lead. store[i] e' un encoding.BattleRecord che legge gli array
+    condivisi senza copiarli, quindi gli estrattori sui record e pk_functions lo usano direttamente.
+    """
+
+    def __init__(self, vocab, battle_id, player_won, offsets, codes, hp, team_offsets, has_team, team,
+                 has_lead, lead):
+        self.vocab = vocab
+        self.battle_id = battle_id
+        self.player_won = player_won
+        self.offsets = offsets
+        self.codes = codes
+        self.hp = hp
+        self.team_offsets = team_offsets
+        self.has_team = has_team
+        self.team = team
+        self.has_lead = has_lead
+        self.lead = lead
+        self._codes_view = memoryview(codes.reshape(-1))
+        self._hp_view = memoryview(hp.reshape(-1))
+        # indice per battle_id: array ordinati dall'archivio (id interi) o dict costruito al primo get
+        self._id_sorted = None
+        self._id_order = None
+        self._id_index = None
+
+    @classmethod
+    def from_battles(cls, battles, vocab=None):
+        """Store di battaglie (dict di train.jsonl), codificate una alla volta senza tenere i dict."""
+        vocab = vocab or BattleVocabulary()
+        return cls.from_records((encode_battle(battle, vocab) for battle in battles), vocab)
+
+    @classmethod
+    def from_records(cls, records, vocab):
+        """Store di BattleRecord (ad esempio EncodedBattles), copiati negli array condivisi."""
+        battle_id, player_won, lengths, team_sizes, has_team, has_lead = [], [], [], [], [], []
+        codes, hp, team, lead = array('i'), array('d'), array('i'), array('i')
+        no_lead = [NO_NAME] + [0] * len(STATS)
+        for record in records:
+            battle_id.append(record.battle_id)
+            player_won.append(-1 if record.player_won is None else record.player_won)
+            lengths.append(record.n_turns)
+            codes.extend(record.codes)
+            hp.extend(record.hp)
+            has_team.append(record.team is not None)
+            team_sizes.append(len(record.team) if record.team else 0)
+            for pokemon in record.team or ():
+                team.extend(getattr(pokemon, col) for col in POKEMON_COLUMNS)
+            has_lead.append(record.lead is not None)
+            lead.extend(no_lead if record.lead is None else (getattr(record.lead, col) for col in POKEMON_COLUMNS))
+
+        def offsets_of(sizes):
+            offsets = np.zeros(len(sizes) + 1, dtype=np.int64)
+            np.cumsum(sizes, out=offsets[1:])
+            return offsets
+
+        width = len(POKEMON_COLUMNS)
+        return cls(
+            vocab,
+            np.array(battle_id, dtype=object),
+            np.array(player_won, dtype=np.int8),
+            offsets_of(lengths),
+            np.frombuffer(codes, dtype=np.intc).reshape(-1, TURN_WIDTH),
+            np.frombuffer(hp, dtype=np.float64).reshape(-1, 2),
+            offsets_of(team_sizes),
+            np.array(has_team, dtype=bool),
+            np.frombuffer(team, dtype=np.intc).reshape(-1, width),
+            np.array(has_lead, dtype=bool),
+            np.frombuffer(lead, dtype=np.intc).reshape(-1, width),
+        )
+
+    def __len__(self):
+        return len(self.battle_id)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self._record(j) for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self._record(i)
+
+    def _record(self, i):
+        start, stop = self.offsets[i], self.offsets[i + 1]
+        team = None
+        if self.has_team[i]:
+            team = tuple(PokemonRecord(*row) for row in self.team[self.team_offsets[i]:self.team_offsets[i + 1]].tolist())
+        lead = PokemonRecord(*self.lead[i].tolist()) if self.has_lead[i] else None
+        won = int(self.player_won[i])
+        battle_id = self.battle_id[i]
+        if isinstance(battle_id, np.generic):
+            battle_id = battle_id.item()
+        return BattleRecord(battle_id, None if won < 0 else won, team, lead,
+                            self._codes_view[start * TURN_WIDTH:stop * TURN_WIDTH],
+                            self._hp_view[2 * start:2 * stop])
+
+    def view(self, start, stop):
+        """BattleStore delle battaglie start:stop, su viste (senza copia) degli array."""
+        start, stop, _ = slice(start, stop).indices(len(self))
+        stop = max(start, stop)
+        turns = slice(self.offsets[start], self.offsets[stop])
+        team = slice(self.team_offsets[start], self.team_offsets[stop])
+        return BattleStore(self.vocab, self.battle_id[start:stop], self.player_won[start:stop],
+                           self.offsets[start:stop + 1] - self.offsets[start], self.codes[turns], self.hp[turns],
+                           self.team_offsets[start:stop + 1] - self.team_offsets[start], self.has_team[start:stop],
+                           self.team[team], self.has_lead[start:stop], self.lead[start:stop])
+
+    def index_of(self, battle_id) -> int:
+        """Posizione della (prima) battaglia con battle_id; KeyError se non c'e'."""
+        if self._id_sorted is not None:
+            # anche gli interi numpy (es. df['battle_id']), non i bool
+            if isinstance(battle_id, (int, np.integer)) and not isinstance(battle_id, bool) \
+                    and INT64_RANGE[0] <= battle_id < INT64_RANGE[1]:
+                j = int(np.searchsorted(self._id_sorted, int(battle_id)))
+                if j < len(self._id_sorted) and self._id_sorted[j] == battle_id:
+                    return int(self._id_order[j])
+            raise KeyError(battle_id)
+        if self._id_index is None:
+            self._id_index = {}
+            for i, key in enumerate(self.battle_id):
+                self._id_index.setdefault(key, i)
+        return self._id_index[battle_id]
+
+    def get(self, battle_id) -> BattleRecord:
+        """BattleRecord della battaglia con battle_id."""
+        return self._record(self.index_of(battle_id))
+
+    def save(self, path, source=None):
+        """
+        Salva lo store come archivio binario nella cartella path: un .npy per array (turni a
+        larghezza fissa e offset), il vocabolario e i battle_id. Con battle_id tutti interi
+        vengono salvati anche gli id ordinati per index_of senza caricare nulla. source e'
+        la source_signature del .jsonl di origine.
+        """
+        tmp_path = path + ".tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        for name in ARCHIVE_ARRAYS:
+            np.save(os.path.join(tmp_path, f"{name}.npy"), np.ascontiguousarray(getattr(self, name)))
+
+        int_ids = _int_ids(self.battle_id)
+        if int_ids:
+            ids = np.array(self.battle_id, dtype=np.int64)
+            order = np.argsort(ids, kind='stable')
+            np.save(os.path.join(tmp_path, "battle_id.npy"), ids)
+            np.save(os.path.join(tmp_path, "id_order.npy"), order)
+            np.save(os.path.join(tmp_path, "id_sorted.npy"), ids[order])
+        else:
+            with open(os.path.join(tmp_path, "battle_id.json"), "w") as f:
+                json.dump(list(self.battle_id), f)
+
+        meta = {
+            "version": ARCHIVE_VERSION,
+            "turn_width": TURN_WIDTH,
+            "n_battles": len(self),
+            "n_turns": int(self.offsets[-1]),
+            "battle_id": "int" if int_ids else "json",
+            "vocab": self.vocab.to_dict(),
+            "source": source,
+        }
+        with open(os.path.join(tmp_path, "meta.json"), "w") as f:
+            json.dump(meta, f)
+
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def open(cls, path, mmap=True):
+        """
+        Apre un archivio di save: con mmap=True gli array sono in memory-map e non vengono letti
+        finche' non servono, quindi l'apertura non dipende dal numero di battaglie (tranne i
+        battle_id non interi, letti dal JSON).
+        """
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        if meta["version"] != ARCHIVE_VERSION or meta["turn_width"] != TURN_WIDTH:
+            raise ValueError(f"Archivio '{path}' di una versione non supportata")
+
+        def load(name):
+            return np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r" if mmap else None)
+
+        arrays = {name: load(name) for name in ARCHIVE_ARRAYS}
+        if meta["battle_id"] == "int":
+            battle_id = load("battle_id")
+        else:
+            with open(os.path.join(path, "battle_id.json")) as f:
+                ids = json.load(f)
+            battle_id = np.empty(len(ids), dtype=object)
+            battle_id[:] = ids
+        store = cls(BattleVocabulary.from_dict(meta["vocab"]), battle_id, **arrays)
+        if meta["battle_id"] == "int":
+            store._id_order = load("id_order")
+            store._id_sorted = load("id_sorted")
+        return store
+
+    @property
+    def n_turns(self):
+        return np.diff(self.offsets)
+
+    def turns(self, i) -> slice:
+        """Righe di codes e hp della battaglia i."""
+        return slice(self.offsets[i], self.offsets[i + 1])
+
+    def column(self, side, field):
+        """Vista (senza copia) di un campo di encoding.SIDE_CODES (o 'hp') di side per tutti i turni."""
+        s = SIDES.index(side)
+        if field == 'hp':
+            return self.hp[:, s]
+        return self.codes[:, s * len(SIDE_CODES) + SIDE_CODE_INDEX[field]]
+
+    @property
+    def nbytes(self):
+        arrays = (self.player_won, self.offsets, self.codes, self.hp, self.team_offsets, self.has_team, self.team,
+                  self.has_lead, self.lead)
+        return sum(a.nbytes for a in arrays)
+
+    def turn_table(self) -> TurnTable:
+        """TurnTable per columnar_features e turn_kernel, dagli array dello store."""
+        team_count = np.diff(self.team_offsets)
+        with_team = team_count > 0
+        first = np.full(len(self), NO_NAME, dtype=np.int64)
+        first[with_team] = self.team[self.team_offsets[:-1][with_team], 0]
+        lead_name = self.lead[:, 0]
+        battles_cols = {
+            'battle_id': self.battle_id,
+            'player_won': self.player_won,
+            'p1_team_count': team_count,
+            'p2_has_lead': self.has_lead,
+            # -2 senza team, come flatten_battles
+            'p1_lead_name': np.where(with_team, np.where(first == MISSING_NAME, NO_NAME, first), -2).astype(np.int32),
+            'p2_lead_name_dmg': np.where(self.has_lead & (lead_name != MISSING_NAME), lead_name, 0).astype(np.int32),
+            'p2_lead_name_sw': np.where(self.has_lead & (lead_name != MISSING_NAME), lead_name, NO_NAME).astype(np.int32),
+        }
+        team_battle = np.repeat(np.arange(len(self)), team_count)
+        for k, stat in enumerate(STATS, start=1):
+            battles_cols[f'p1_team_sum_{stat}'] = np.bincount(team_battle, weights=self.team[:, k],
+                                                              minlength=len(self)).astype(np.int64)
+            battles_cols[f'p2_lead_{stat}'] = self.lead[:, k].astype(np.int64)
+        turns = turn_columns(self.codes, self.hp, self.offsets, self.vocab)
+        return TurnTable(battles_cols, turns, self.offsets, list(self.vocab.names.values))
@@ -0,0 +1,394 @@
+import numpy as np
+import pandas as pd
+
+from set_up_scripts.dicts import status_codes, status_penalties
+from set_up_scripts.pk_functions import (
+    SPECIES_INDEX, UNKNOWN_SPECIES, UNKNOWN_TYPE, SPECIES_EFFECTIVENESS, SPECIES_STAB, TYPE_INDEX,
+)
+
+
+# vocabolario intero degli status
+STATUSES = status_codes
+STATUS_ID = {s: i for i, s in enumerate(STATUSES)}
+OTHER_STATUS = len(STATUSES)
+FNT = STATUS_ID['fnt']
+STATUS_PENALTY = np.array([status_penalties.get(s, 0) for s in STATUSES] + [0], dtype=np.int64)
+
+STATS = ('hp', 'spe', 'atk', 'def', 'spa', 'spd')
+SIDE_COLUMNS = ('name', 'hp', 'status', 'atk', 'def', 'spa', 'spd',
+                'has_move', 'accuracy', 'has_accuracy', 'base_power', 'move_type')
+
+
+class TurnTable:
+    """
+    Tutte le battaglie appiattite in array colonnari a livello di turno.
+    turns['battle'][i] e' l'indice della battaglia del turno i, i turni della battaglia b
+    stanno in offsets[b]:offsets[b + 1]. names e' il vocabolario dei nomi dei pokemon
+    (id 0 = '', -1 = nome assente).
+    """
+
+    def __init__(self, battles, turns, offsets, names):
+        self.battles = battles
+        self.turns = turns
+        self.offsets = offsets
+        self.names = names
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    @property
+    def n_turns(self):
+        return np.diff(self.offsets)
+
+    def name_species(self):
+        """Specie (indice in pk_functions.SPECIES) di ogni nome del vocabolario."""
+        return np.array([SPECIES_INDEX.get(n.lower(), UNKNOWN_SPECIES) if n else UNKNOWN_SPECIES
+                         for n in self.names], dtype=np.int16)
+
+
+def flatten_battles(battles) -> TurnTable:
+    """Appiattisce le battaglie (dict di train.jsonl) in una TurnTable, con un solo passaggio."""
+    names = {'': 0}
+    nan = float('nan')
+    empty = {}
+    status_id = STATUS_ID
+
+    def name_id(name):
+        if name is None:
+            return -1
+        i = names.get(name)
+        if i is None:
+            i = names[name] = len(names)
+        return i
+
+    move_types = {}
+
+    def encode_side(state, details, out):
+        name = state.get('name')
+        if name is None:
+            name_index = -1
+        else:
+            name_index = names.get(name)
+            if name_index is None:
+                name_index = names[name] = len(names)
+        hp = state.get('hp_pct')
+        boosts = state.get('boosts', empty)
+        out += (
+            name_index,
+            nan if hp is None else hp,
+            status_id.get(state.get('status', 'nostatus'), OTHER_STATUS),
+            boosts.get('atk', 0), boosts.get('def', 0), boosts.get('spa', 0), boosts.get('spd', 0),
+        )
+        if details:
+            accuracy = details.get('accuracy')
+            if accuracy is not None:
+                raw_type = details.get('type', '')
+                move_type = move_types.get(raw_type)
+                if move_type is None:
+                    move_type = move_types[raw_type] = TYPE_INDEX.get(raw_type.lower(), UNKNOWN_TYPE)
+                out += (1, int(accuracy), 1, int(details.get('base_power', 0)), move_type)
+            else:
+                out += (1, int(details.get('accuracy', 0)), 0, int(details.get('base_power', 0)), UNKNOWN_TYPE)
+        else:
+            out += (0, 0, 0, 0, UNKNOWN_TYPE)
+
+    rows = []
+    lengths = []
+    battle_id, player_won = [], []
+    team_sum, team_count, lead_stats, has_lead = [], [], [], []
+    p1_lead, p2_lead_dmg, p2_lead_sw = [], [], []
+
+    for battle in battles:
+        timeline = battle.get('battle_timeline', [])
+        lengths.append(len(timeline))
+        for turn in timeline:
+            encode_side(turn.get('p1_pokemon_state', empty), turn.get('p1_move_details', empty), rows)
+            encode_side(turn.get('p2_pokemon_state', empty), turn.get('p2_move_details', empty), rows)
+
+        p1_team = battle.get('p1_team_details', [])
+        team_count.append(len(p1_team) if p1_team else 0)
+        team_sum.append([sum(p.get(f'base_{s}', 0) for p in p1_team) for s in STATS] if p1_team else [0] * 6)
+        p1_lead.append(name_id(p1_team[0].get('name')) if p1_team else -2)
+
+        lead = battle.get('p2_lead_details')
+        has_lead.append(bool(lead))
+        lead_stats.append([lead.get(f'base_{s}', 0) for s in STATS] if lead else [0] * 6)
+        p2_lead_dmg.append(name_id((lead or {}).get('name', '')))
+        p2_lead_sw.append(name_id(lead.get('name')) if lead else -1)
+
+        battle_id.append(battle.get('battle_id'))
+        player_won.append(int(battle['player_won']) if 'player_won' in battle else -1)
+
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    matrix = np.array(rows, dtype=np.float64).reshape(-1, 2 * len(SIDE_COLUMNS))
+    battle_index = np.repeat(np.arange(len(lengths), dtype=np.int32), lengths)
+
+    turns = {
+        'battle': battle_index,
+        'turn': (np.arange(len(matrix)) - offsets[battle_index] + 1).astype(np.int32),
+    }
+    dtypes = {'name': np.int32, 'hp': np.float64, 'status': np.int8, 'has_move': bool,
+              'has_accuracy': bool, 'move_type': np.int8}
+    for s, side in enumerate(('p1', 'p2')):
+        for c, col in enumerate(SIDE_COLUMNS):
+            turns[f'{side}_{col}'] = matrix[:, s * len(SIDE_COLUMNS) + c].astype(dtypes.get(col, np.int64))
+
+    team_sum = np.array(team_sum, dtype=np.int64).reshape(-1, 6)
+    lead_stats = np.array(lead_stats, dtype=np.int64).reshape(-1, 6)
+    battles_cols = {
+        'battle_id': np.array(battle_id, dtype=object),
+        'player_won': np.array(player_won, dtype=np.int8),
+        'p1_team_count': np.array(team_count, dtype=np.int64),
+        'p2_has_lead': np.array(has_lead, dtype=bool),
+        # nome del primo pokemon di p1 (-2 se il team manca) e del lead di p2
+        'p1_lead_name': np.array(p1_lead, dtype=np.int32),
+        'p2_lead_name_dmg': np.array(p2_lead_dmg, dtype=np.int32),
+        'p2_lead_name_sw': np.array(p2_lead_sw, dtype=np.int32),
+    }
+    for i, s in enumerate(STATS):
+        battles_cols[f'p1_team_sum_{s}'] = team_sum[:, i]
+        battles_cols[f'p2_lead_{s}'] = lead_stats[:, i]
+
+    return TurnTable(battles_cols, turns, offsets, list(names))
+
+
+def _per_battle(table, values=None, mask=None):
+    """Somma per battaglia (in ordine di turno) dei valori, o conteggio se values e' None."""
+    battle = table.turns['battle']
+    if mask is not None:
+        battle = battle[mask]
+        values = values[mask] if values is not None else None
+    return np.bincount(battle, weights=values, minlength=len(table))
+
+
+def _normalized(diff, n):
+    return np.divide(diff, n, out=np.zeros(len(n)), where=n > 0)
+
+
+def _previous(values, table, first):
+    """Valore del turno precedente nella stessa battaglia, first al primo turno."""
+    prev = np.empty_like(values)
+    prev[1:] = values[:-1]
+    starts = table.offsets[:-1][table.n_turns > 0]
+    prev[starts] = first[table.n_turns > 0]
+    return prev
+
+
+def _forward_fill(values, valid, table):
+    """Ultimo valore valido fino al turno corrente (incluso) nella stessa battaglia, -1 se assente."""
+    idx = np.where(valid, np.arange(len(values)), -1)
+    np.maximum.accumulate(idx, out=idx)
+    start = table.offsets[table.turns['battle']]
+    return np.where(idx >= start, idx, -1)
+
+
+def _team_state(table, side):
+    """Numero di pokemon vivi, visti e somma degli hp finali di ogni battaglia (come team_state)."""
+    t = table.turns
+    names = t[f'{side}_name']
+    mask = names > 0
+    key = t['battle'][mask].astype(np.int64) * len(table.names) + names[mask]
+    status = t[f'{side}_status'][mask]
+    hp = t[f'{side}_hp'][mask]
+
+    uniq, first, inv = np.unique(key, return_index=True, return_inverse=True)
+    positions = np.arange(len(key))
+    last = np.zeros(len(uniq), dtype=np.int64)
+    np.maximum.at(last, inv, positions)
+    valid = ~np.isnan(hp)
+    last_hp = np.full(len(uniq), -1, dtype=np.int64)
+    np.maximum.at(last_hp, inv[valid], positions[valid])
+
+    group_battle = (uniq // len(table.names)).astype(np.int64)
+    final_hp = np.where(last_hp >= 0, hp[last_hp], 1.0)
+    alive = status[last] != FNT
+    # somma degli hp nell'ordine di prima apparizione, come la somma sul dict
+    order = np.lexsort((first, group_battle))
+    seen = np.bincount(group_battle, minlength=len(table)).astype(np.int64)
+    n_alive = np.bincount(group_battle, weights=alive, minlength=len(table)).astype(np.int64)
+    hp_sum = np.bincount(group_battle[order], weights=np.maximum(0, final_hp[order]), minlength=len(table))
+    return n_alive, seen - n_alive, hp_sum
+
+
+def _first_ko(table, side):
+    t = table.turns
+    ko = (t[f'{side}_status'] == FNT) | (t[f'{side}_hp'] == 0)
+    n = table.n_turns
+    first = n + 1
+    np.minimum.at(first, t['battle'][ko], t['turn'][ko])
+    return first
+
+
+def _damage(table):
+    """p1_net_damage e p1_damage_ratio (come damage_features)."""
+    t = table.turns
+    b = table.battles
+    no_team = b['p1_lead_name'] == -2
+    p1_first_name = np.where(no_team, 0, b['p1_lead_name'])
+    received = None
+    inflicted = None
+    for side, first_name in (('p1', p1_first_name), ('p2', b['p2_lead_name_dmg'])):
+        hp = np.nan_to_num(t[f'{side}_hp'], nan=0.0)
+        names = t[f'{side}_name']
+        switched = names != _previous(names, table, first_name)
+        last_hp = np.where(switched, hp, _previous(hp, table, np.ones(len(table))))
+        loss = np.maximum(0, last_hp - hp)
+        if side == 'p1':
+            received = loss
+        else:
+            inflicted = loss
+
+    net = _per_battle(table, inflicted - received)
+    total_inflicted = _per_battle(table, inflicted)
+    total_received = _per_battle(table, received)
+    ratio = np.where(total_received < 1e-7, total_inflicted,
+                     total_inflicted / np.where(total_received < 1e-7, 1, total_received))
+    return net, ratio
+
+
+def _switches(table, side):
+    """Switch volontari per battaglia (come switch_difference)."""
+    t = table.turns
+    b = table.battles
+    first_name = np.where(b['p1_lead_name'] == -2, -1, b['p1_lead_name']) if side == 'p1' else b['p2_lead_name_sw']
+    names = t[f'{side}_name']
+    truthy = names > 0
+    last_name_idx = _forward_fill(names, truthy, table)
+    tracked = np.where(last_name_idx >= 0, names[np.maximum(last_name_idx, 0)], first_name[t['battle']])
+    tracked_before = _previous(tracked, table, first_name)
+
+    hp = t[f'{side}_hp']
+    last_hp_idx = _forward_fill(hp, ~np.isnan(hp), table)
+    hp_ff = np.where(last_hp_idx >= 0, hp[np.maximum(last_hp_idx, 0)], 1.0)
+    hp_before = _previous(hp_ff, table, np.ones(len(table)))
+    status_before = _previous(t[f'{side}_status'].astype(np.int8), table, np.zeros(len(table), dtype=np.int8))
+
+    fainted = (status_before == FNT) | (hp_before == 0)
+    switch = truthy & (names != tracked_before) & ~fainted
+    return _per_battle(table, mask=switch).astype(np.int64)
+
+
+def _moves(table, side, opponent):
+    """STAB ed efficacia delle mosse di side contro opponent."""
+    t = table.turns
+    species = table.name_species()
+    own = np.where(t[f'{side}_name'] >= 0, species[np.maximum(t[f'{side}_name'], 0)], UNKNOWN_SPECIES)
+    opp = np.where(t[f'{opponent}_name'] >= 0, species[np.maximum(t[f'{opponent}_name'], 0)], UNKNOWN_SPECIES)
+    move_type = t[f'{side}_move_type']
+    eligible = t[f'{side}_has_move'] & t[f'{side}_has_accuracy']
+    stab = _per_battle(table, mask=eligible & SPECIES_STAB[move_type, own])
+    eff = SPECIES_EFFECTIVENESS[move_type, opp]
+    hits = {m: _per_battle(table, mask=eligible & (eff == m)) for m in (4, 2, 0.5, 0.25)}
+    return stab, hits
+
+
+def _optional(values, present, as_int):
+    """Colonna presente solo per alcune battaglie: 0 dove manca, float se manca in almeno una."""
+    if present.all():
+        return values.astype(np.int64) if as_int else values
+    return np.where(present, values, 0).astype(np.float64)
+
+
+def columnar_features(table: TurnTable, feature_set='stacking') -> pd.DataFrame:
+    """
+    Calcola le feature di features_ext (feature_set='stacking') o di features_ext_vot
+    (feature_set='voting') con riduzioni vettoriali sulla TurnTable. Stessi valori e stesse
+    colonne di FeatureHandler.create_advanced_features.
+    """
+    t = table.turns
+    n = table.n_turns
+    cols = static_columns(table, feature_set)
+
+    counts = {}
+    for side in ('p1', 'p2'):
+        status = t[f'{side}_status'].astype(np.int64)
+        counts[side] = np.bincount(t['battle'].astype(np.int64) * (OTHER_STATUS + 1) + status,
+                                   minlength=len(table) * (OTHER_STATUS + 1)).reshape(len(table), -1)
+    power = {side: _per_battle(table, t[f'{side}_base_power'].astype(np.float64)).astype(np.int64)
+             for side in ('p1', 'p2')}
+    stab1, hits1 = _moves(table, 'p1', 'p2')
+    stab2, hits2 = _moves(table, 'p2', 'p1')
+    alive1, fainted1, hp1 = _team_state(table, 'p1')
+    alive2, fainted2, hp2 = _team_state(table, 'p2')
+
+    if feature_set == 'stacking':
+        accuracy = {side: _per_battle(table, t[f'{side}_accuracy'].astype(np.float64)).astype(np.int64)
+                    for side in ('p1', 'p2')}
+        null = {side: _per_battle(table, mask=~t[f'{side}_has_move']) for side in ('p1', 'p2')}
+        boosts = ((t['p1_atk'] - t['p2_def']) + (t['p1_spa'] - t['p2_spd'])) \
+            - ((t['p2_atk'] - t['p1_def']) + (t['p2_spa'] - t['p1_spd']))
+        boosts_sum = _per_battle(table, boosts.astype(np.float64))
+        net_damage, damage_ratio = _damage(table)
+
+        cols.update({
+            'diff_accuracy': accuracy['p1'] - accuracy['p2'],
+            'diff_base_power': power['p1'] - power['p2'],
+            'diff_null_moves': _normalized(null['p2'], n) - _normalized(null['p1'], n),
+            'diff_boosts_score': _normalized(boosts_sum, n),
+            'switch_diff': _switches(table, 'p1') - _switches(table, 'p2'),
+            'diff_stab': _normalized(stab1 - stab2, n),
+            'diff_x4_eff': _normalized(hits1[4] - hits2[4], n),
+            'diff_x2_eff': _normalized(hits1[2] - hits2[2], n),
+            'diff_x0_5_eff': _normalized(hits1[0.5] - hits2[0.5], n),
+            'diff_x0_25_eff': _normalized(hits1[0.25] - hits2[0.25], n),
+        })
+    else:
+        penalties = {side: _per_battle(table, STATUS_PENALTY[t[f'{side}_status']].astype(np.float64))
+                     for side in ('p1', 'p2')}
+        cols.update({
+            'diff_status_penalties': (penalties['p1'] - penalties['p2']).astype(np.int64),
+            'diff_base_power': power['p1'] - power['p2'],
+            'diff_stab': _normalized(stab1 - stab2, n),
+            'diff_x2_eff': _normalized(hits1[2] - hits2[2], n),
+            'diff_x0_5_eff': _normalized(hits1[0.5] - hits2[0.5], n),
+        })
+
+    cols.update({
+        'p1_first_ko': _first_ko(table, 'p1'),
+        'p2_first_ko': _first_ko(table, 'p2'),
+        'p1_final_alive': alive1,
+        'p2_final_alive': alive2,
+        'p1_final_fainted': fainted1,
+        'p2_final_fainted': fainted2,
+        'p1_final_hp_sum': hp1,
+        'p2_final_hp_sum': hp2,
+        'p1_freeze_turns': counts['p1'][:, STATUS_ID['frz']],
+        'p2_freeze_turns': counts['p2'][:, STATUS_ID['frz']],
+    })
+    if feature_set == 'stacking':
+        for status, name in (('brn', 'brn'), ('par', 'par'), ('psn', 'psn'), ('tox', 'tox'), ('slp', 'slp')):
+            cols[f'p1_{name}_turns'] = counts['p1'][:, STATUS_ID[status]]
+            cols[f'p2_{name}_turns'] = counts['p2'][:, STATUS_ID[status]]
+        cols['p1_net_damage'] = net_damage
+        cols['p1_damage_ratio'] = damage_ratio
+    return feature_frame(table, cols)
+
+
+def static_columns(table: TurnTable, feature_set='stacking') -> dict:
+    """Feature che non dipendono dalla timeline (medie del team di p1, statistiche del lead di p2)."""
+    b = table.battles
+    cols = {}
+    has_team = b['p1_team_count'] > 0
+    has_lead = b['p2_has_lead']
+    if feature_set == 'stacking' and has_team.any():
+        count = np.maximum(b['p1_team_count'], 1)
+        for s in STATS:
+            cols[f'p1_mean_{s}'] = _optional(b[f'p1_team_sum_{s}'] / count, has_team, False)
+    if has_lead.any():
+        for s in (STATS if feature_set == 'stacking' else ('hp',)):
+            cols[f'p2_lead_{s}'] = _optional(b[f'p2_lead_{s}'], has_lead, True)
+    return cols
+
+
+def feature_frame(table: TurnTable, cols: dict) -> pd.DataFrame:
+    """DataFrame delle colonne calcolate, con battle_id e player_won in coda come nel loop sui dict."""
+    b = table.battles
+    cols['battle_id'] = b['battle_id']
+    won = b['player_won'] >= 0
+    if won.any():
+        cols['player_won'] = _optional(b['player_won'], won, True)
+
+    df = pd.DataFrame(cols)
+    df['battle_id'] = pd.Series(list(b['battle_id'])).fillna(0)
+    return df
@@ -1,23 +1,128 @@
 import json
+import multiprocessing as mp
 import os
+import random
+from collections.abc import Sequence
+from concurrent.futures import ProcessPoolExecutor
 
+import pandas as pd
+from tqdm import tqdm
+
+from set_up_scripts.artifact_store import ArtifactStore
+from set_up_scripts.battle_store import BattleStore, archive_path, archive_source, source_signature
+from set_up_scripts.decoders import get_decoder
+from set_up_scripts.encoding import BattleVocabulary, EncodedBattles, decode_battle, encode_battle
+from set_up_scripts.line_index import JsonlBattles, build_line_index
+
+
+_shared_battles = None
+
+
+def _extract_range(extract, start, stop):
+    return [extract(battle) for battle in _shared_battles[start:stop]]
+
+
+def resolve_n_jobs(n_jobs) -> int:
+    """Numero di processi per n_jobs come in joblib: None = 1, -1 = tutti i core, -2 = tutti meno uno, ..."""
+    if n_jobs is None:
+        return 1
+    if n_jobs == 0:
+        raise ValueError("n_jobs == 0 non ha significato: usa 1 per l'esecuzione seriale o -1 per tutti i core")
+    if n_jobs < 0:
+        return max(1, (os.cpu_count() or 1) + 1 + n_jobs)
+    return n_jobs
+
+
+def map_battles(extract, data, n_jobs=1, chunksize=256):
+    """
+    Applica extract a ogni battaglia e restituisce la lista delle feature nello stesso
+    ordine di data. n_jobs segue la convenzione di joblib (-1 = tutti i core, vedi
+    resolve_n_jobs); con piu' di un processo le battaglie vengono distribuite a blocchi di
+    chunksize su un pool di processi: con il fork i worker ereditano la sequenza (lista o
+    BattleStore) e ricevono solo gli intervalli di indici, altrimenti le battaglie vengono serializzate.
+    """
+    global _shared_battles
+    total = len(data) if hasattr(data, '__len__') else None
+    n_jobs = resolve_n_jobs(n_jobs)
+    if n_jobs == 1:
+        return [extract(battle) for battle in tqdm(data, desc="Extracting features", total=total)]
+
+    desc = f"Extracting features ({n_jobs} workers)"
+    if isinstance(data, Sequence) and 'fork' in mp.get_all_start_methods():
+        _shared_battles = data
+        try:
+            with ProcessPoolExecutor(max_workers=n_jobs, mp_context=mp.get_context('fork')) as pool:
+                futures = [pool.submit(_extract_range, extract, start, start + chunksize)
+                           for start in range(0, len(data), chunksize)]
+                feature_list = []
+                with tqdm(desc=desc, total=total) as bar:
+                    for future in futures:
+                        rows = future.result()
+                        feature_list.extend(rows)
+                        bar.update(len(rows))
+                return feature_list
+        finally:
+            _shared_battles = None
+
+    with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+        results = pool.map(extract, data, chunksize=chunksize)
+        return list(tqdm(results, desc=desc, total=total))
+
+
+def build_feature_frame(frames):
+    """
+    Unisce i DataFrame di feature calcolati un blocco di battaglie alla volta: in memoria
+    restano solo il blocco corrente e le righe di feature gia' estratte.
+    """
+    frames = list(frames)
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True).fillna(0)
 
 
 class DataHandler:
-    def __init__(self, data_path):
+    def __init__(self, data_path, decoder='auto', feature_fields_only=False, encode=False, archive=False,
+                 indexed=False):
+        """
+        Con encode=True ogni battaglia viene codificata appena letta (encoding.BattleRecord):
+        nomi, status e tipi delle mosse diventano id interi di un BattleVocabulary condiviso
+        (self.vocab) e train_data, test_data e i blocchi di iter_batches sono EncodedBattles.
+        Con archive=True i .jsonl vengono letti dal loro archivio binario (open_archive): train_data
+        e test_data sono BattleStore in memory-map e i blocchi di iter_batches viste dello store.
+        Con indexed=True i .jsonl restano su disco: train_data, test_data e i blocchi di iter_batches
+        sono JsonlBattles (line_index) e ogni worker di map_battles legge e decodifica i propri byte.
+        """
+        if indexed and (encode or archive):
+            raise ValueError("indexed=True legge le battaglie come dict: non si combina con encode o archive")
         self.data_path = data_path
-        self.train_data = []
-        self.test_data = []
+        self.archive = archive
+        self.indexed = indexed
+        self.decode = get_decoder(decoder, feature_fields_only)
+        self.vocab = BattleVocabulary() if encode else None
+        if encode:
+            decode = self.decode
+            self.decode = lambda line: encode_battle(decode(line), self.vocab)
+        self.train_data = self._new_batch()
+        self.test_data = self._new_batch()
         self.train_file_path = os.path.join(self.data_path, 'train.jsonl')
         self.test_file_path = os.path.join(self.data_path, 'test.jsonl')
 
+    def _new_batch(self):
+        return [] if self.vocab is None else EncodedBattles(self.vocab)
+
     def load_train_data(self):
         """Carica il file train.jsonl riga per riga."""
+        if self.archive or self.indexed:
+            data = self.open_archive(self.train_file_path) if self.archive else self.open_jsonl(self.train_file_path)
+            if data is not None:
+                self.train_data = data
+                print(f"Successfully loaded {len(self.train_data)} train battles.")
+            return
         print(f"Loading data from '{self.train_file_path}'...")
         try:
-            with open(self.train_file_path, 'r') as f:
+            with open(self.train_file_path, 'rb') as f:
                 for line in f:
-                    self.train_data.append(json.loads(line))
+                    self.train_data.append(self.decode(line))
             print(f"Successfully loaded {len(self.train_data)} train battles.")
         except FileNotFoundError:
             print(f"ERROR: Could not find the training file at '{self.train_file_path}'.")
@@ -25,24 +130,159 @@ class DataHandler:
 
     def load_test_data(self):
         """Carica il file test.jsonl riga per riga."""
+        if self.archive or self.indexed:
+            data = self.open_archive(self.test_file_path) if self.archive else self.open_jsonl(self.test_file_path)
+            if data is not None:
+                self.test_data = data
+                print(f"Successfully loaded {len(self.test_data)} test battles.")
+            return
         print(f"Loading data from '{self.test_file_path}'...")
         try:
-            with open(self.test_file_path, 'r') as f:
+            with open(self.test_file_path, 'rb') as f:
                 for line in f:
-                    self.test_data.append(json.loads(line))
+                    self.test_data.append(self.decode(line))
             print(f"Successfully loaded {len(self.test_data)} test battles.")
         except FileNotFoundError:
             print(f"ERROR: Could not find the test file at '{self.test_file_path}'.")
             print("Please make sure you have added the competition data to this notebook.")           
 
+    def load_store(self, file_path):
+        """
+        BattleStore di un file .jsonl, costruito in streaming: ogni battaglia viene copiata negli
+        array dello store appena letta, senza tenere in memoria i dict o i BattleRecord.
+        """
+        if self.vocab is not None:
+            return BattleStore.from_records(self._read_jsonl(file_path), self.vocab)
+        return BattleStore.from_battles(self._read_jsonl(file_path))
+
+    def load_train_store(self):
+        return self.load_store(self.train_file_path)
+
+    def load_test_store(self):
+        return self.load_store(self.test_file_path)
+
+    def open_archive(self, file_path):
+        """
+        BattleStore in memory-map dell'archivio binario di file_path (battle_store.archive_path).
+        L'archivio viene creato alla prima apertura e ricreato se il .jsonl e' cambiato; se il
+        .jsonl non c'e' piu' si usa l'archivio esistente. None se mancano entrambi.
+        """
+        path = archive_path(file_path)
+        source = archive_source(path)
+        if os.path.exists(file_path):
+            signature = source_signature(file_path)
+            if source != signature:
+                print(f"Building binary archive '{path}' from '{file_path}'...")
+                self.load_store(file_path).save(path, source=signature)
+        elif source is None:
+            print(f"ERROR: Could not find the file at '{file_path}'.")
+            print("Please make sure you have added the competition data to this notebook.")
+            return None
+        return BattleStore.open(path)
+
+    def get_battle(self, battle_id, file_path=None):
+        """Battaglia (dict) con battle_id, letta dall'archivio di file_path (train.jsonl) senza scandirlo."""
+        store = self.open_archive(file_path or self.train_file_path)
+        if store is None:
+            return None
+        return decode_battle(store.get(battle_id), store.vocab)
+
+    def open_jsonl(self, file_path):
+        """
+        JsonlBattles del .jsonl: solo l'indice delle righe (line_index.build_line_index, creato una
+        volta e aggiornato quando il file viene allungato) viene letto, le battaglie su richiesta.
+        """
+        try:
+            return JsonlBattles(file_path, build_line_index(file_path), self.decode)
+        except FileNotFoundError:
+            print(f"ERROR: Could not find the file at '{file_path}'.")
+            print("Please make sure you have added the competition data to this notebook.")
+            return None
+
+    def sample_battles(self, k, file_path=None, seed=None):
+        """k battaglie a caso del .jsonl (train.jsonl), lette dall'indice delle righe senza leggere tutto il file."""
+        data = self.open_jsonl(file_path or self.train_file_path)
+        if data is None:
+            return []
+        return [data[i] for i in sorted(random.Random(seed).sample(range(len(data)), min(k, len(data))))]
+
+    def iter_battles(self, file_path):
+        """
+        Legge un file .jsonl una battaglia alla volta, senza caricarlo tutto in memoria; con
+        archive=True restituisce le viste (BattleRecord) dello store dell'archivio.
+        """
+        if self.archive:
+            store = self.open_archive(file_path)
+            if store is not None:
+                yield from store
+            return
+        yield from self._read_jsonl(file_path)
+
+    def _read_jsonl(self, file_path):
+        try:
+            with open(file_path, 'rb') as f:
+                for line in f:
+                    yield self.decode(line)
+        except FileNotFoundError:
+            print(f"ERROR: Could not find the file at '{file_path}'.")
+            print("Please make sure you have added the competition data to this notebook.")
+
+    def iter_batches(self, file_path, batch_size=10000):
+        """Raggruppa le battaglie di un file .jsonl in liste di al piu' batch_size elementi."""
+        if self.archive:
+            store = self.open_archive(file_path)
+            if store is not None:
+                for start in range(0, len(store), batch_size):
+                    yield store.view(start, start + batch_size)
+            return
+        if self.indexed:
+            data = self.open_jsonl(file_path)
+            if data is not None:
+                for start in range(0, len(data), batch_size):
+                    yield data.view(start, start + batch_size)
+            return
+        batch = self._new_batch()
+        for battle in self.iter_battles(file_path):
+            batch.append(battle)
+            if len(batch) == batch_size:
+                yield batch
+                batch = self._new_batch()
+        if batch:
+            yield batch
+
+    def iter_train_battles(self):
+        return self.iter_battles(self.train_file_path)
+
+    def iter_test_battles(self):
+        return self.iter_battles(self.test_file_path)
+
+    def iter_train_batches(self, batch_size=10000):
+        return self.iter_batches(self.train_file_path, batch_size)
+
+    def iter_test_batches(self, batch_size=10000):
+        return self.iter_batches(self.test_file_path, batch_size)
+
     def inspect_first_battle(self):
         """Mostra la struttura della prima battaglia del train set."""
-        if not self.train_data:
+        vocab = self.vocab
+        if self.train_data:
+            first_battle = self.train_data[0]
+            vocab = getattr(self.train_data, 'vocab', None)
+        elif self.archive:
+            # dall'archivio si legge solo la prima battaglia
+            store = self.open_archive(self.train_file_path)
+            first_battle = store[0] if store else None
+            vocab = store.vocab if store is not None else None
+        else:
+            # in modalita' streaming si legge solo la prima riga del file
+            first_battle = next(self.iter_train_battles(), None)
+        if not first_battle:
             print("No training data loaded yet.")
             return
+        if vocab is not None:
+            first_battle = decode_battle(first_battle, vocab)
 
         print("\n--- Structure of the first train battle: ---")
-        first_battle = self.train_data[0]
 
         battle_for_display = first_battle.copy()
         battle_for_display['battle_timeline'] = battle_for_display.get('battle_timeline', [])[:2]
@@ -54,14 +294,17 @@ class DataHandler:
 
 
 class DataProcessor:
-    def __init__(self, train_df, test_df, save_dir="data"):
+    def __init__(self, train_df, test_df, save_dir="data", fmt="npy", export_csv=False):
         self.train_df = train_df
         self.test_df = test_df
         self.save_dir = save_dir
-        os.makedirs(self.save_dir, exist_ok=True)
+        self.store = ArtifactStore(save_dir, fmt=fmt, export_csv=export_csv)
 
-    def prepare_data(self):
-        """Prepara X_train, Y_train e X_test per i modelli ML"""
+    def prepare_data(self, incremental=False):
+        """
+        Prepara X_train, Y_train e X_test per i modelli ML. Con incremental=True scrive
+        solo le righe nuove o cambiate rispetto ai dataset gia' salvati (per battle_id).
+        """
         drop_cols = ['battle_id', 'player_won']
         features = [col for col in self.train_df.columns if col not in drop_cols]
 
@@ -69,14 +312,15 @@ class DataProcessor:
         Y_train = self.train_df['player_won']
         X_test = self.test_df[features]
 
-        X_train.to_pickle(f"{self.save_dir}/X_train.pkl")
-        X_train.to_csv(f"{self.save_dir}/X_train.csv", index=False)
-
-        X_test.to_pickle(f"{self.save_dir}/X_test.pkl")
-        X_test.to_csv(f"{self.save_dir}/X_test.csv", index=False)
-
-        Y_train.to_pickle(f"{self.save_dir}/Y_train.pkl")
-        Y_train.to_csv(f"{self.save_dir}/Y_train.csv", index=False)
-
-        print("Salvataggio completato in pickle e CSV nella cartella 'data'.")
-        return Y_train, X_train, X_test
\ No newline at end of file
+        if incremental:
+            self.store.upsert("X_train", X_train, keys=self.train_df['battle_id'])
+            self.store.upsert("X_test", X_test, keys=self.test_df['battle_id'])
+            self.store.upsert("Y_train", Y_train, keys=self.train_df['battle_id'])
+            print(f"Aggiornamento incrementale completato nella cartella '{self.save_dir}'.")
+        else:
+            self.store.write("X_train", X_train)
+            self.store.write("X_test", X_test)
+            self.store.write("Y_train", Y_train)
+            print(f"Salvataggio completato ({self.store.fmt}{' e CSV' if self.store.export_csv else ''}) "
+                  f"nella cartella '{self.save_dir}'.")
+        return Y_train, X_train, X_test
@@ -0,0 +1,116 @@
+import json
+from typing import Any, List, Optional, TypedDict
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+
+# campi effettivamente letti dagli estrattori di feature
+POKEMON_FIELDS = ('name', 'base_hp', 'base_atk', 'base_def', 'base_spa', 'base_spd', 'base_spe')
+STATE_FIELDS = ('name', 'hp_pct', 'status', 'boosts')
+MOVE_FIELDS = ('type', 'base_power', 'accuracy')
+
+
+class Pokemon(TypedDict, total=False):
+    name: Any
+    base_hp: Any
+    base_atk: Any
+    base_def: Any
+    base_spa: Any
+    base_spd: Any
+    base_spe: Any
+
+
+class PokemonState(TypedDict, total=False):
+    name: Any
+    hp_pct: Any
+    status: Any
+    boosts: Any
+
+
+class MoveDetails(TypedDict, total=False):
+    type: Any
+    base_power: Any
+    accuracy: Any
+
+
+class Turn(TypedDict, total=False):
+    p1_pokemon_state: PokemonState
+    p2_pokemon_state: PokemonState
+    p1_move_details: Optional[MoveDetails]
+    p2_move_details: Optional[MoveDetails]
+
+
+class Battle(TypedDict, total=False):
+    battle_id: Any
+    player_won: Any
+    p1_team_details: List[Pokemon]
+    p2_lead_details: Optional[Pokemon]
+    battle_timeline: List[Turn]
+
+
+def _pick(d, fields):
+    return {k: d[k] for k in fields if k in d}
+
+
+def project_battle(battle: dict) -> dict:
+    """Riduce una battaglia gia' decodificata ai soli campi usati dalle feature."""
+    projected = _pick(battle, ('battle_id', 'player_won'))
+    if 'p1_team_details' in battle:
+        projected['p1_team_details'] = [_pick(p, POKEMON_FIELDS) for p in battle['p1_team_details']]
+    if 'p2_lead_details' in battle:
+        lead = battle['p2_lead_details']
+        projected['p2_lead_details'] = _pick(lead, POKEMON_FIELDS) if lead else lead
+    if 'battle_timeline' in battle:
+        timeline = []
+        for turn in battle['battle_timeline']:
+            t = {}
+            for key in ('p1_pokemon_state', 'p2_pokemon_state'):
+                if key in turn:
+                    t[key] = _pick(turn[key], STATE_FIELDS)
+            for key in ('p1_move_details', 'p2_move_details'):
+                if key in turn:
+                    t[key] = _pick(turn[key], MOVE_FIELDS) if turn[key] else turn[key]
+            timeline.append(t)
+        projected['battle_timeline'] = timeline
+    return projected
+
+
+def available_backends():
+    backends = ['json']
+    if orjson is not None:
+        backends.append('orjson')
+    if msgspec is not None:
+        backends.append('msgspec')
+    return backends
+
+
+def get_decoder(backend='auto', feature_fields_only=False):
+    """
+    Restituisce una funzione che decodifica una riga (bytes o str) del .jsonl in un dict.
+    backend='auto' usa il parser piu' veloce installato e ricade sul modulo json della
+    libreria standard. Con feature_fields_only=True vengono tenuti solo i campi letti
+    dagli estrattori: msgspec li seleziona gia' in fase di parsing (ed e' quindi preferito
+    in questo caso), gli altri backend riducono la battaglia dopo la decodifica.
+    """
+    if backend == 'auto':
+        preferred = ('msgspec', 'orjson') if feature_fields_only else ('orjson', 'msgspec')
+        backend = next((b for b in preferred if b in available_backends()), 'json')
+    if backend not in available_backends():
+        raise ValueError(f"Decoder '{backend}' non disponibile. Disponibili: {available_backends()}")
+
+    if backend == 'msgspec':
+        decoder = msgspec.json.Decoder(Battle if feature_fields_only else Any)
+        return decoder.decode
+
+    loads = orjson.loads if backend == 'orjson' else json.loads
+    if feature_fields_only:
+        return lambda line: project_battle(loads(line))
+    return loads
@@ -152,6 +152,9 @@ pokemon_types = {
     'mew': ['psychic', 'notype']
 }
 
+# status in ordine di id (vocabolario intero di columnar ed encoding)
+status_codes = ('nostatus', 'fnt', 'frz', 'brn', 'par', 'psn', 'tox', 'slp')
+
 status_penalties = {
     #"frz": -100, 
     "slp": -75,  
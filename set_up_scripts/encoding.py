@@ -0,0 +1,308 @@
+from array import array
+
+import numpy as np
+
+from set_up_scripts.columnar import OTHER_STATUS, STATS, STATUSES, TurnTable, flatten_battles
+from set_up_scripts.dicts import pokemon_types, status_penalties
+from set_up_scripts.pk_functions import TYPES, TYPE_INDEX, UNKNOWN_TYPE, species_index
+
+
+# campi interi di un lato in ogni turno (l'hp sta a parte, in un array di float)
+SIDE_CODES = ('name', 'status', 'atk', 'def', 'spa', 'spd',
+              'has_move', 'accuracy', 'has_accuracy', 'base_power', 'move_type')
+SIDE_CODE_INDEX = {field: i for i, field in enumerate(SIDE_CODES)}
+TURN_WIDTH = 2 * len(SIDE_CODES)
+SIDES = ('p1', 'p2')
+# id dei nomi: -1 nome assente (None), -2 chiave 'name' mancante nei dettagli di un pokemon
+NO_NAME = -1
+MISSING_NAME = -2
+NO_TYPE = -1
+
+
+class Vocabulary:
+    """Interning dei valori (stringhe) in id interi consecutivi, nell'ordine di arrivo."""
+
+    def __init__(self, seed=()):
+        self.ids = {}
+        self.values = []
+        for value in seed:
+            self.intern(value)
+
+    def intern(self, value) -> int:
+        i = self.ids.get(value)
+        if i is None:
+            i = self.ids[value] = len(self.values)
+            self.values.append(value)
+        return i
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, i):
+        return self.values[i]
+
+
+class BattleVocabulary:
+    """
+    Vocabolari dei nomi dei pokemon, degli status e dei tipi delle mosse, inizializzati da dicts.py:
+    i nomi delle specie hanno id specie + 1 (0 e' il nome ''), gli status l'ordine di columnar.STATUSES,
+    i tipi l'indice di pk_functions.TYPE_INDEX. I valori mai visti prendono id nuovi in coda.
+    """
+
+    def __init__(self):
+        self.names = Vocabulary(('',) + tuple(pokemon_types))
+        self.statuses = Vocabulary(STATUSES)
+        self.move_types = Vocabulary(TYPES + ['notype'])
+        self._species = []
+        self._type_index = []
+        self._penalties = []
+
+    def to_dict(self) -> dict:
+        """Valori dei tre vocabolari in ordine di id (serializzabili in JSON)."""
+        return {'names': list(self.names.values), 'statuses': list(self.statuses.values),
+                'move_types': list(self.move_types.values)}
+
+    @classmethod
+    def from_dict(cls, values: dict):
+        """Vocabolario con gli stessi id di to_dict."""
+        vocab = cls()
+        vocab.names = Vocabulary(values['names'])
+        vocab.statuses = Vocabulary(values['statuses'])
+        vocab.move_types = Vocabulary(values['move_types'])
+        return vocab
+
+    def name_id(self, name) -> int:
+        return NO_NAME if name is None else self.names.intern(name)
+
+    def species(self) -> list:
+        """Specie (indice in pk_functions.SPECIES) di ogni id di nome, esteso ai nomi nuovi."""
+        for name in self.names.values[len(self._species):]:
+            self._species.append(species_index(name))
+        return self._species
+
+    def type_index(self) -> list:
+        """Indice in pk_functions.TYPE_INDEX di ogni id di tipo (come type_index(tipo.lower()))."""
+        for move_type in self.move_types.values[len(self._type_index):]:
+            self._type_index.append(TYPE_INDEX.get(move_type.lower(), UNKNOWN_TYPE))
+        return self._type_index
+
+    def penalties(self) -> list:
+        """Penalita' di dicts.status_penalties per ogni id di status."""
+        for status in self.statuses.values[len(self._penalties):]:
+            self._penalties.append(status_penalties.get(status, 0))
+        return self._penalties
+
+
+class PokemonRecord:
+    """Dettagli di un pokemon (team di p1 o lead di p2): id del nome e statistiche base."""
+    __slots__ = ('name',) + tuple(f'base_{stat}' for stat in STATS)
+
+    def __init__(self, name, *stats):
+        self.name = name
+        for stat, value in zip(STATS, stats):
+            setattr(self, f'base_{stat}', value)
+
+
+class BattleRecord:
+    """
+    Battaglia codificata: team di p1 (tupla di PokemonRecord, None se manca), lead di p2 e la timeline
+    in due array, codes con TURN_WIDTH interi per turno (SIDE_CODES di p1 poi di p2) e hp con
+    hp_pct di p1 e p2 per turno (nan se assente).
+    """
+    __slots__ = ('battle_id', 'player_won', 'team', 'lead', 'codes', 'hp')
+
+    def __init__(self, battle_id, player_won, team, lead, codes, hp):
+        self.battle_id = battle_id
+        self.player_won = player_won
+        self.team = team
+        self.lead = lead
+        self.codes = codes
+        self.hp = hp
+
+    @property
+    def n_turns(self):
+        return len(self.hp) // 2
+
+    def column(self, side, field):
+        """Valori di un campo di SIDE_CODES (o 'hp') del lato side ('p1'/'p2'), turno per turno."""
+        s = SIDES.index(side)
+        if field == 'hp':
+            return self.hp[s::2]
+        return self.codes[s * len(SIDE_CODES) + SIDE_CODE_INDEX[field]::TURN_WIDTH]
+
+    def first_name(self, side, missing=NO_NAME, absent=NO_NAME):
+        """
+        Id del nome del primo pokemon del team di p1 (side='p1') o del lead di p2: missing se nei
+        dettagli manca la chiave 'name', absent se il team o il lead mancano.
+        """
+        pokemon = (self.team[0] if self.team else None) if side == 'p1' else self.lead
+        if pokemon is None:
+            return absent
+        return missing if pokemon.name == MISSING_NAME else pokemon.name
+
+    def __reduce__(self):
+        # le viste di un BattleStore (memoryview) vengono copiate in array per il pickle
+        return BattleRecord, (self.battle_id, self.player_won, self.team, self.lead,
+                              array('i', self.codes), array('d', self.hp))
+
+
+class EncodedBattles(list):
+    """Lista di BattleRecord con il BattleVocabulary condiviso che ne decodifica gli id."""
+
+    def __init__(self, vocab, records=()):
+        super().__init__(records)
+        self.vocab = vocab
+
+
+def _encode_pokemon(pokemon, vocab):
+    name = vocab.name_id(pokemon['name']) if 'name' in pokemon else MISSING_NAME
+    return PokemonRecord(name, *(pokemon.get(f'base_{stat}', 0) for stat in STATS))
+
+
+def encode_battle(battle: dict, vocab: BattleVocabulary) -> BattleRecord:
+    """Codifica una battaglia (dict di train.jsonl) con i vocabolari di vocab."""
+    empty = {}
+    names = vocab.names.intern
+    statuses = vocab.statuses.intern
+    move_types = vocab.move_types.intern
+    codes = []
+    hp = []
+    for turn in battle.get('battle_timeline', []):
+        for side in ('p1', 'p2'):
+            state = turn.get(f'{side}_pokemon_state', empty)
+            details = turn.get(f'{side}_move_details', empty)
+            name = state.get('name')
+            boosts = state.get('boosts', empty)
+            codes += (NO_NAME if name is None else names(name), statuses(state.get('status', 'nostatus')),
+                      boosts.get('atk', 0), boosts.get('def', 0), boosts.get('spa', 0), boosts.get('spd', 0))
+            if details:
+                accuracy = details.get('accuracy')
+                if accuracy is not None:
+                    codes += (1, int(accuracy), 1, int(details.get('base_power', 0)),
+                              move_types(details.get('type', '')))
+                else:
+                    codes += (1, int(details.get('accuracy', 0)), 0, int(details.get('base_power', 0)), NO_TYPE)
+            else:
+                codes += (0, 0, 0, 0, NO_TYPE)
+            value = state.get('hp_pct')
+            hp.append(float('nan') if value is None else value)
+
+    p1_team = battle.get('p1_team_details')
+    lead = battle.get('p2_lead_details')
+    return BattleRecord(
+        battle.get('battle_id'),
+        int(battle['player_won']) if 'player_won' in battle else None,
+        None if p1_team is None else tuple(_encode_pokemon(p, vocab) for p in p1_team),
+        _encode_pokemon(lead, vocab) if lead else None,
+        array('i', codes),
+        array('d', hp),
+    )
+
+
+def _decode_pokemon(record, vocab):
+    pokemon = {} if record.name == MISSING_NAME else {'name': None if record.name == NO_NAME
+                                                      else vocab.names[record.name]}
+    for stat in STATS:
+        pokemon[f'base_{stat}'] = getattr(record, f'base_{stat}')
+    return pokemon
+
+
+def decode_battle(record: BattleRecord, vocab: BattleVocabulary) -> dict:
+    """
+    Battaglia come dict, con i soli campi letti dagli estrattori (come decoders.project_battle);
+    accuracy e base_power sono gli interi sommati dagli estrattori.
+    """
+    battle = {'battle_id': record.battle_id}
+    if record.player_won is not None:
+        battle['player_won'] = bool(record.player_won)
+    if record.team is not None:
+        battle['p1_team_details'] = [_decode_pokemon(p, vocab) for p in record.team]
+    battle['p2_lead_details'] = _decode_pokemon(record.lead, vocab) if record.lead else None
+    timeline = []
+    for t in range(record.n_turns):
+        turn = {}
+        for s, side in enumerate(('p1', 'p2')):
+            (name, status, atk, def_, spa, spd, has_move, accuracy, has_accuracy, base_power,
+             move_type) = record.codes[t * TURN_WIDTH + s * len(SIDE_CODES):t * TURN_WIDTH + (s + 1) * len(SIDE_CODES)]
+            hp = record.hp[2 * t + s]
+            turn[f'{side}_pokemon_state'] = {
+                'name': None if name == NO_NAME else vocab.names[name],
+                'hp_pct': None if np.isnan(hp) else hp,
+                'status': vocab.statuses[status],
+                'boosts': {'atk': atk, 'def': def_, 'spa': spa, 'spd': spd},
+            }
+            if not has_move:
+                turn[f'{side}_move_details'] = None
+            elif has_accuracy:
+                turn[f'{side}_move_details'] = {'type': vocab.move_types[move_type], 'base_power': base_power,
+                                                'accuracy': accuracy}
+            else:
+                turn[f'{side}_move_details'] = {'base_power': base_power}
+        timeline.append(turn)
+    battle['battle_timeline'] = timeline
+    return battle
+
+
+def turn_columns(codes, hp, offsets, vocab: BattleVocabulary) -> dict:
+    """
+    Colonne dei turni di una TurnTable dai codici (turni, TURN_WIDTH) e dagli hp (turni, 2):
+    status oltre quelli di columnar.STATUSES e tipi delle mosse portati agli indici di columnar.
+    """
+    codes = codes.reshape(-1, 2, len(SIDE_CODES))
+    hp = hp.reshape(-1, 2)
+    type_index = np.append(np.array(vocab.type_index(), dtype=np.int8), np.int8(UNKNOWN_TYPE))
+    lengths = np.diff(offsets)
+    battle_index = np.repeat(np.arange(len(lengths), dtype=np.int32), lengths)
+    turns = {
+        'battle': battle_index,
+        'turn': (np.arange(len(codes)) - offsets[battle_index] + 1).astype(np.int32),
+    }
+    column = SIDE_CODE_INDEX
+    for s, side in enumerate(SIDES):
+        side_codes = codes[:, s]
+        turns[f'{side}_name'] = side_codes[:, column['name']].astype(np.int32)
+        turns[f'{side}_hp'] = hp[:, s].copy()
+        turns[f'{side}_status'] = np.minimum(side_codes[:, column['status']], OTHER_STATUS).astype(np.int8)
+        for col in ('atk', 'def', 'spa', 'spd', 'accuracy', 'base_power'):
+            turns[f'{side}_{col}'] = side_codes[:, column[col]].astype(np.int64)
+        turns[f'{side}_has_move'] = side_codes[:, column['has_move']].astype(bool)
+        turns[f'{side}_has_accuracy'] = side_codes[:, column['has_accuracy']].astype(bool)
+        turns[f'{side}_move_type'] = type_index[side_codes[:, column['move_type']]]
+    return turns
+
+
+def records_turn_table(battles: EncodedBattles) -> TurnTable:
+    """TurnTable di battaglie codificate: gli array dei turni vengono concatenati senza rileggere dict."""
+    vocab = battles.vocab
+    lengths = [record.n_turns for record in battles]
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    codes = np.frombuffer(b''.join(record.codes.tobytes() for record in battles), dtype=np.intc)
+    hp = np.frombuffer(b''.join(record.hp.tobytes() for record in battles), dtype=np.float64)
+    turns = turn_columns(codes, hp, offsets, vocab)
+
+    battles_cols = {
+        'battle_id': np.array([record.battle_id for record in battles], dtype=object),
+        'player_won': np.array([-1 if record.player_won is None else record.player_won for record in battles],
+                               dtype=np.int8),
+        'p1_team_count': np.array([len(record.team) if record.team else 0 for record in battles], dtype=np.int64),
+        'p2_has_lead': np.array([record.lead is not None for record in battles], dtype=bool),
+        'p1_lead_name': np.array([record.first_name('p1', absent=-2) for record in battles], dtype=np.int32),
+        'p2_lead_name_dmg': np.array([record.first_name('p2', missing=0, absent=0) for record in battles],
+                                     dtype=np.int32),
+        'p2_lead_name_sw': np.array([record.first_name('p2') for record in battles], dtype=np.int32),
+    }
+    for s in STATS:
+        battles_cols[f'p1_team_sum_{s}'] = np.array(
+            [sum(getattr(p, f'base_{s}') for p in record.team) if record.team else 0 for record in battles],
+            dtype=np.int64)
+        battles_cols[f'p2_lead_{s}'] = np.array(
+            [getattr(record.lead, f'base_{s}') if record.lead else 0 for record in battles], dtype=np.int64)
+    return TurnTable(battles_cols, turns, offsets, list(vocab.names.values))
+
+
+def as_turn_table(data) -> TurnTable:
+    """TurnTable di una lista di battaglie (dict o EncodedBattles) o di un BattleStore."""
+    if hasattr(data, 'turn_table'):
+        return data.turn_table()
+    return records_turn_table(data) if isinstance(data, EncodedBattles) else flatten_battles(data)
@@ -0,0 +1,105 @@
+import glob
+import hashlib
+import json
+import os
+import pickle
+
+from set_up_scripts.data_processing import map_battles
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+CACHE_DIR = "data/feature_cache"
+SCRIPTS_DIR = os.path.dirname(__file__)
+
+# sorgenti da cui dipendono le feature di ciascun estrattore
+FEATURE_SOURCES = {
+    'stacking': ['features_ext.py', 'incremental.py', 'pk_functions.py', 'dicts.py'],
+    'voting': ['features_ext_vot.py', 'features_ext.py', 'incremental.py', 'pk_functions.py', 'dicts.py'],
+}
+
+
+def feature_set_version(feature_set: str) -> str:
+    """Hash dei sorgenti dell'estrattore: cambia quando cambiano features_ext, incremental, pk_functions o dicts."""
+    digest = hashlib.sha1(feature_set.encode())
+    for name in FEATURE_SOURCES[feature_set]:
+        with open(os.path.join(SCRIPTS_DIR, name), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+def battle_hash(battle: dict) -> str:
+    """Hash del contenuto di una battaglia, indipendente dall'ordine delle chiavi."""
+    if orjson is not None:
+        data = orjson.dumps(battle, option=orjson.OPT_SORT_KEYS)
+    else:
+        data = json.dumps(battle, sort_keys=True, separators=(',', ':')).encode()
+    return hashlib.sha1(data).hexdigest()
+
+
+class FeatureCache:
+    """
+    Cache su disco delle righe di feature, indicizzata per hash del contenuto della battaglia
+    e versione del set di feature (stacking o voting). Le versioni vecchie dello stesso set
+    vengono eliminate all'apertura; save() tiene solo le battaglie richieste durante l'esecuzione,
+    quindi quelle uscite dal dataset non si accumulano.
+    """
+
+    def __init__(self, feature_set, cache_dir=CACHE_DIR):
+        self.feature_set = feature_set
+        self.version = feature_set_version(feature_set)
+        self.cache_dir = cache_dir
+        self.path = os.path.join(cache_dir, f"{feature_set}-{self.version}.pkl")
+        os.makedirs(cache_dir, exist_ok=True)
+        self._evict_stale()
+
+        self.rows = {}
+        if os.path.exists(self.path):
+            with open(self.path, 'rb') as f:
+                self.rows = pickle.load(f)
+        self.hits = self.misses = 0
+        self._used = set()
+        self._dirty = False
+
+    def _evict_stale(self):
+        for path in glob.glob(os.path.join(self.cache_dir, f"{self.feature_set}-*.pkl")):
+            if path != self.path:
+                print(f"Rimozione cache feature obsoleta: {path}")
+                os.remove(path)
+
+    def extract(self, extract, data, n_jobs=1, chunksize=256):
+        """Righe di feature per data: quelle in cache vengono riusate, le altre estratte con extract."""
+        data = list(data)
+        keys = [battle_hash(battle) for battle in data]
+        self._used.update(keys)
+        missing = [i for i, key in enumerate(keys) if key not in self.rows]
+        self.hits += len(data) - len(missing)
+        self.misses += len(missing)
+
+        if missing:
+            new_rows = map_battles(extract, [data[i] for i in missing], n_jobs=n_jobs, chunksize=chunksize)
+            for i, row in zip(missing, new_rows):
+                self.rows[keys[i]] = row
+            self._dirty = True
+
+        print(f"Cache feature ({self.feature_set}): {len(data) - len(missing)} battaglie in cache, "
+              f"{len(missing)} da estrarre.")
+        return [self.rows[key] for key in keys]
+
+    def save(self):
+        if self._used and len(self._used) < len(self.rows):
+            # battaglie non richieste in questa esecuzione
+            print(f"Cache feature ({self.feature_set}): rimozione di {len(self.rows) - len(self._used)} battaglie non usate.")
+            self.rows = {key: row for key, row in self.rows.items() if key in self._used}
+            self._dirty = True
+        if not self._dirty:
+            return
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(self.rows, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.path)
+        self._dirty = False
+        print(f"Cache feature salvata in: {self.path} ({len(self.rows)} battaglie)")
@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+
+
+# contatori limitati dal numero di turni (30 nel dataset) o dalla dimensione della squadra
+COUNTER = "int8"
+# statistiche base (<= 255) e somme sui turni di potenze base e penalita' di stato
+WIDE_COUNTER = "int16"
+# medie, frazioni e somme di hp
+REAL = "float32"
+
+_SHARED = {
+    "p2_lead_hp": WIDE_COUNTER,
+    "diff_base_power": WIDE_COUNTER,
+    "diff_stab": REAL,
+    "diff_x2_eff": REAL,
+    "diff_x0_5_eff": REAL,
+    "p1_first_ko": COUNTER,
+    "p2_first_ko": COUNTER,
+    "p1_final_alive": COUNTER,
+    "p2_final_alive": COUNTER,
+    "p1_final_fainted": COUNTER,
+    "p2_final_fainted": COUNTER,
+    "p1_final_hp_sum": REAL,
+    "p2_final_hp_sum": REAL,
+    "p1_freeze_turns": COUNTER,
+    "p2_freeze_turns": COUNTER,
+    "battle_id": "int64",
+    "player_won": "int8",
+}
+
+FEATURE_DTYPES = {
+    "stacking": {
+        **_SHARED,
+        **{f"p1_mean_{stat}": REAL for stat in ("hp", "spe", "atk", "def", "spa", "spd")},
+        **{f"p2_lead_{stat}": WIDE_COUNTER for stat in ("spe", "atk", "def", "spa", "spd")},
+        "diff_accuracy": COUNTER,
+        "diff_null_moves": REAL,
+        "diff_boosts_score": REAL,
+        "switch_diff": COUNTER,
+        "diff_x4_eff": REAL,
+        "diff_x0_25_eff": REAL,
+        **{f"{p}_{status}_turns": COUNTER for p in ("p1", "p2") for status in ("brn", "par", "psn", "tox", "slp")},
+        "p1_net_damage": REAL,
+        "p1_damage_ratio": REAL,
+    },
+    "voting": {
+        **_SHARED,
+        "diff_status_penalties": WIDE_COUNTER,
+    },
+}
+
+
+def _fits(values, dtype):
+    """True se i valori della colonna si possono convertire in dtype senza perdere informazione."""
+    # stringhe e oggetti (es. battle_id non numerici) restano del tipo originale
+    if values.dtype.kind not in "biuf":
+        return False
+    if np.issubdtype(dtype, np.floating):
+        return True
+    if values.dtype.kind == "f" and not np.array_equal(values, np.round(values)):
+        return False
+    info = np.iinfo(dtype)
+    return len(values) == 0 or (values.min() >= info.min and values.max() <= info.max)
+
+
+def apply_feature_schema(df: pd.DataFrame, feature_set: str) -> pd.DataFrame:
+    """
+    Converte le colonne di df nei tipi dichiarati in FEATURE_DTYPES per il set di feature
+    (stacking o voting). Le colonne fuori schema restano invariate; una colonna che non
+    entra nel tipo dichiarato (es. timeline piu' lunghe di 127 turni) resta del tipo originale.
+    """
+    schema = FEATURE_DTYPES[feature_set]
+    dtypes = {}
+    for col in df.columns:
+        dtype = np.dtype(schema[col]) if col in schema else None
+        if dtype is None or df[col].dtype == dtype:
+            continue
+        if _fits(df[col].to_numpy(), dtype):
+            dtypes[col] = dtype
+        else:
+            print(f"Attenzione: la colonna '{col}' non rientra in {dtype}, resta {df[col].dtype}.")
+    return df.astype(dtypes) if dtypes else df
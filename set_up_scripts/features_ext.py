@@ -1,9 +1,237 @@
+from functools import partial
 
 import pandas as pd
-import numpy as np
-from tqdm import tqdm
-from set_up_scripts.pk_functions import damage_features, switch_difference, get_effectiveness
-from set_up_scripts.dicts import status_penalties, pokemon_types
+from set_up_scripts.data_processing import map_battles, build_feature_frame
+from set_up_scripts.battle_store import BattleStore
+from set_up_scripts.columnar import FNT, STATS, STATUS_ID, columnar_features
+from set_up_scripts.encoding import TURN_WIDTH, BattleRecord, BattleVocabulary, EncodedBattles, as_turn_table
+from set_up_scripts.feature_schema import apply_feature_schema
+from set_up_scripts.incremental import COUNTED_STATUSES, VOTING_COLUMNS, IncrementalFeatures
+from set_up_scripts.turn_kernel import NUMBA_AVAILABLE, accumulate_turns, kernel_features
+from set_up_scripts.pk_functions import EFFECTIVENESS_ROWS, STAB_ROWS, UNKNOWN_SPECIES
+
+
+def extract_battle_features(battle: dict, with_status_penalties: bool = False) -> dict:
+    """
+    Estrae le feature di una battaglia applicando IncrementalFeatures.update a ogni turno della
+    battle_timeline: oltre alle feature avanzate calcola nello stesso passaggio quelle di
+    damage_features e switch_difference (stessi valori delle funzioni in pk_functions).
+    Con with_status_penalties=True aggiunge diff_status_penalties, l'unica feature del set di voting
+    che non fa parte di questo.
+    """
+    state = IncrementalFeatures(battle)
+    for turn in battle.get('battle_timeline', []):
+        state.update(turn)
+    features = state.features(with_status_penalties=with_status_penalties)
+
+    # target
+    if 'player_won' in battle:
+        features['player_won'] = int(battle['player_won'])
+    return features
+
+
+def extract_record_features(record: BattleRecord, vocab: BattleVocabulary, with_status_penalties: bool = False) -> dict:
+    """
+    Come extract_battle_features, su una battaglia codificata (encoding.BattleRecord): nomi, status
+    e tipi sono id interi, quindi il loop sui turni non fa .get(), .lower() ne' hash di stringhe.
+    """
+    features = {}
+
+    p1_team = record.team
+    if p1_team:
+        # somma esatta di al piu' 6 interi: stesso valore di np.mean
+        for stat in STATS:
+            features[f'p1_mean_{stat}'] = sum([getattr(p, f'base_{stat}') for p in p1_team]) / len(p1_team)
+    p2_lead = record.lead
+    if p2_lead:
+        for stat in STATS:
+            features[f'p2_lead_{stat}'] = getattr(p2_lead, f'base_{stat}')
+
+    species = vocab.species()
+    type_index = vocab.type_index()
+    penalties = vocab.penalties()
+    ntimeline = record.n_turns
+
+    accuracy_1 = accuracy_2 = 0
+    base_power_1 = base_power_2 = 0
+    p1_null_moves = p2_null_moves = 0
+    diff_boosts_score = 0
+    p1_stab = p2_stab = 0
+    p1_hits = {4: 0, 2: 0, 0.5: 0, 0.25: 0}
+    p2_hits = {4: 0, 2: 0, 0.5: 0, 0.25: 0}
+    p1_first_ko_turn = p2_first_ko_turn = None
+    # team_state: id del nome -> [hp_pct, status]
+    p1_team_state = {}
+    p2_team_state = {}
+    p1_status_turns = [0] * len(vocab.statuses)
+    p2_status_turns = [0] * len(vocab.statuses)
+    diff_status_penalties = 0
+
+    # nome iniziale per danno e switch: .get('name') sul primo pokemon, '' (id 0) senza team o lead
+    p1_lead_name = record.first_name('p1')
+    p1_dmg_active = record.first_name('p1', absent=0)
+    p2_dmg_active = record.first_name('p2', missing=0, absent=0)
+    p1_dmg_last_hp = p2_dmg_last_hp = 1
+    p1_net_damage = 0
+    p1_total_damage_received = 0
+    p1_total_damage_inflicted = 0
+    p1_sw_name, p1_sw_hp, p1_sw_status = p1_lead_name, 1.0, None
+    p2_sw_name, p2_sw_hp, p2_sw_status = record.first_name('p2'), 1.0, None
+    p1_switches = p2_switches = 0
+
+    turn_counter = 1
+    hp_pairs = iter(record.hp)
+    for (p1_name, p1_status, p1_atk, p1_def, p1_spa, p1_spd, p1_has_move, p1_accuracy, p1_has_accuracy,
+         p1_base_power, p1_move_type, p2_name, p2_status, p2_atk, p2_def, p2_spa, p2_spd, p2_has_move,
+         p2_accuracy, p2_has_accuracy, p2_base_power, p2_move_type), p1_hp, p2_hp in zip(
+            zip(*[iter(record.codes)] * TURN_WIDTH), hp_pairs, hp_pairs):
+        # hp assente = nan (nan != nan)
+        p1_has_hp = p1_hp == p1_hp
+        p2_has_hp = p2_hp == p2_hp
+
+        if p1_name > 0:
+            state = p1_team_state.get(p1_name)
+            if state is None:
+                state = p1_team_state[p1_name] = [1.0, 0]
+            if p1_has_hp:
+                state[0] = p1_hp
+            state[1] = p1_status
+        if p2_name > 0:
+            state = p2_team_state.get(p2_name)
+            if state is None:
+                state = p2_team_state[p2_name] = [1.0, 0]
+            if p2_has_hp:
+                state[0] = p2_hp
+            state[1] = p2_status
+
+        if p1_first_ko_turn is None and (p1_status == FNT or p1_hp == 0):
+            p1_first_ko_turn = turn_counter
+        if p2_first_ko_turn is None and (p2_status == FNT or p2_hp == 0):
+            p2_first_ko_turn = turn_counter
+        turn_counter += 1
+
+        p1_dmg_hp = p1_hp if p1_has_hp else 0
+        p2_dmg_hp = p2_hp if p2_has_hp else 0
+        if p1_name != p1_dmg_active:
+            p1_dmg_last_hp = p1_dmg_hp
+            p1_dmg_active = p1_name
+        if p2_name != p2_dmg_active:
+            p2_dmg_last_hp = p2_dmg_hp
+            p2_dmg_active = p2_name
+        p1_damage_inflicted = p2_dmg_last_hp - p2_dmg_hp
+        if p1_damage_inflicted < 0:
+            p1_damage_inflicted = 0
+        p1_damage_received = p1_dmg_last_hp - p1_dmg_hp
+        if p1_damage_received < 0:
+            p1_damage_received = 0
+        p1_net_damage += (p1_damage_inflicted - p1_damage_received)
+        p1_total_damage_inflicted += p1_damage_inflicted
+        p1_total_damage_received += p1_damage_received
+        p1_dmg_last_hp = p1_dmg_hp
+        p2_dmg_last_hp = p2_dmg_hp
+
+        if p1_name > 0 and p1_name != p1_sw_name:
+            if not (p1_sw_status == FNT or p1_sw_hp == 0):
+                p1_switches += 1
+            p1_sw_name = p1_name
+        if p1_has_hp:
+            p1_sw_hp = p1_hp
+        p1_sw_status = p1_status
+        if p2_name > 0 and p2_name != p2_sw_name:
+            if not (p2_sw_status == FNT or p2_sw_hp == 0):
+                p2_switches += 1
+            p2_sw_name = p2_name
+        if p2_has_hp:
+            p2_sw_hp = p2_hp
+        p2_sw_status = p2_status
+
+        if p1_has_move:
+            accuracy_1 += p1_accuracy
+            base_power_1 += p1_base_power
+            if p1_has_accuracy:
+                move_type = type_index[p1_move_type]
+                if STAB_ROWS[move_type][species[p1_name] if p1_name >= 0 else UNKNOWN_SPECIES]:
+                    p1_stab += 1
+                effectiveness = EFFECTIVENESS_ROWS[move_type][species[p2_name] if p2_name >= 0 else UNKNOWN_SPECIES]
+                if effectiveness in p1_hits:
+                    p1_hits[effectiveness] += 1
+        else:
+            p1_null_moves += 1
+        if p2_has_move:
+            accuracy_2 += p2_accuracy
+            base_power_2 += p2_base_power
+            if p2_has_accuracy:
+                move_type = type_index[p2_move_type]
+                if STAB_ROWS[move_type][species[p2_name] if p2_name >= 0 else UNKNOWN_SPECIES]:
+                    p2_stab += 1
+                effectiveness = EFFECTIVENESS_ROWS[move_type][species[p1_name] if p1_name >= 0 else UNKNOWN_SPECIES]
+                if effectiveness in p2_hits:
+                    p2_hits[effectiveness] += 1
+        else:
+            p2_null_moves += 1
+
+        diff_boosts_score += ((p1_atk - p2_def) + (p1_spa - p2_spd)) - ((p2_atk - p1_def) + (p2_spa - p1_spd))
+        p1_status_turns[p1_status] += 1
+        p2_status_turns[p2_status] += 1
+        if with_status_penalties:
+            diff_status_penalties += penalties[p1_status] - penalties[p2_status]
+
+    p1_alive = sum(1 for state in p1_team_state.values() if state[1] != FNT)
+    p2_alive = sum(1 for state in p2_team_state.values() if state[1] != FNT)
+    if p1_total_damage_received < 1e-7:
+        p1_damage_ratio = p1_total_damage_inflicted
+    else:
+        p1_damage_ratio = p1_total_damage_inflicted / p1_total_damage_received
+
+    features.update({
+        'diff_accuracy': accuracy_1 - accuracy_2,
+        'diff_base_power': base_power_1 - base_power_2,
+        'diff_null_moves': (p2_null_moves / ntimeline if ntimeline else 0) - (p1_null_moves / ntimeline if ntimeline else 0),
+        'diff_boosts_score': diff_boosts_score / ntimeline if ntimeline else 0,
+        'switch_diff': p1_switches - p2_switches,
+        'diff_stab': (p1_stab - p2_stab) / ntimeline if ntimeline else 0,
+        'diff_x4_eff': (p1_hits[4] - p2_hits[4]) / ntimeline if ntimeline else 0,
+        'diff_x2_eff': (p1_hits[2] - p2_hits[2]) / ntimeline if ntimeline else 0,
+        'diff_x0_5_eff': (p1_hits[0.5] - p2_hits[0.5]) / ntimeline if ntimeline else 0,
+        'diff_x0_25_eff': (p1_hits[0.25] - p2_hits[0.25]) / ntimeline if ntimeline else 0,
+        'p1_first_ko': p1_first_ko_turn if p1_first_ko_turn is not None else ntimeline + 1,
+        'p2_first_ko': p2_first_ko_turn if p2_first_ko_turn is not None else ntimeline + 1,
+        'p1_final_alive': p1_alive,
+        'p2_final_alive': p2_alive,
+        'p1_final_fainted': len(p1_team_state) - p1_alive,
+        'p2_final_fainted': len(p2_team_state) - p2_alive,
+        'p1_final_hp_sum': sum(max(0, state[0]) for state in p1_team_state.values()),
+        'p2_final_hp_sum': sum(max(0, state[0]) for state in p2_team_state.values()),
+    })
+    for status in COUNTED_STATUSES:
+        name = 'freeze' if status == 'frz' else status
+        features[f'p1_{name}_turns'] = p1_status_turns[STATUS_ID[status]]
+        features[f'p2_{name}_turns'] = p2_status_turns[STATUS_ID[status]]
+    features['p1_net_damage'] = p1_net_damage
+    features['p1_damage_ratio'] = p1_damage_ratio
+    if with_status_penalties:
+        features['diff_status_penalties'] = diff_status_penalties
+
+    features['battle_id'] = record.battle_id
+    if record.player_won is not None:
+        features['player_won'] = record.player_won
+    return features
+
+
+def _split_feature_sets(features: dict) -> tuple:
+    voting = {col: features[col] for col in VOTING_COLUMNS if col in features}
+    del features['diff_status_penalties']
+    return features, voting
+
+
+def extract_both_feature_sets(battle: dict) -> tuple:
+    """Feature di stacking e di voting di una battaglia, con un solo passaggio sulla timeline."""
+    return _split_feature_sets(extract_battle_features(battle, with_status_penalties=True))
+
+
+def extract_both_record_feature_sets(record: BattleRecord, vocab: BattleVocabulary) -> tuple:
+    """Come extract_both_feature_sets, su una battaglia codificata."""
+    return _split_feature_sets(extract_record_features(record, vocab, with_status_penalties=True))
 
 
 class FeatureHandler:
@@ -11,237 +239,67 @@ class FeatureHandler:
         self.train_data = train_data
         self.test_data = test_data
 
-    def create_advanced_features(self, data):
-        feature_list = []
-        for battle in tqdm(data, desc="Extracting features"):
-            features = {}
-
-            # --- Team Player 1 ---
-            p1_team = battle.get('p1_team_details', [])
-            if p1_team:
-                features['p1_mean_hp'] = np.mean([p.get('base_hp', 0) for p in p1_team])
-                features['p1_mean_spe'] = np.mean([p.get('base_spe', 0) for p in p1_team])
-                features['p1_mean_atk'] = np.mean([p.get('base_atk', 0) for p in p1_team])
-                features['p1_mean_def'] = np.mean([p.get('base_def', 0) for p in p1_team])
-                features['p1_mean_spa'] = np.mean([p.get('base_spa', 0) for p in p1_team])
-                features['p1_mean_spd'] = np.mean([p.get('base_spd', 0) for p in p1_team])
-
-            # --- Lead P2 ---
-            p2_lead = battle.get('p2_lead_details')
-            if p2_lead:
-                features['p2_lead_hp'] = p2_lead.get('base_hp', 0)
-                features['p2_lead_spe'] = p2_lead.get('base_spe', 0)
-                features['p2_lead_atk'] = p2_lead.get('base_atk', 0)
-                features['p2_lead_def'] = p2_lead.get('base_def', 0)
-                features['p2_lead_spa'] = p2_lead.get('base_spa', 0)
-                features['p2_lead_spd'] = p2_lead.get('base_spd', 0)
-            
-
-            timeline = battle.get('battle_timeline', [])
-            ntimeline = len(timeline)
-             
-            #inizializzazione variabili
-            accuracy_1 = accuracy_2 = 0
-            base_power_1 = base_power_2 = 0
-            p1_null_moves = p2_null_moves = 0
-            diff_boosts_score = 0
-            p1_stab = p2_stab= 0
-            p1_x4_hits = p2_x4_hits = 0
-            p1_x2_hits = p2_x2_hits = 0
-            p1_x0_5_hits = p2_x0_5_hits = 0
-            p1_x0_25_hits = p2_x0_25_hits = 0
-            p2_known_names = set()
-            p1_first_ko_turn = None
-            p2_first_ko_turn = None
-            p1_team_state = {}
-            p2_team_state = {}
-            p1_freeze_turns = p2_freeze_turns =0
-            p1_brn_turns = p2_brn_turns =0
-            p1_par_turns = p2_par_turns =0
-            p1_psn_turns = p2_psn_turns =0
-            p1_tox_turns = p2_tox_turns =0
-            p1_slp_turns =p2_slp_turns=0
-            turn_counter = 1
-
-            #esploro i turni per battaglia e creo features
-            for turn in timeline:
-                p1_state = turn.get("p1_pokemon_state", {})
-                p2_state = turn.get("p2_pokemon_state", {})
-                p1_boosts = p1_state.get("boosts", {})
-                p2_boosts = p2_state.get("boosts", {})
-                p1_details = turn.get("p1_move_details", {})
-                p2_details = turn.get("p2_move_details", {})
-                p1_status = p1_state.get("status", "nostatus")
-                p2_status = p2_state.get("status", "nostatus")
-                p1_name = p1_state.get("name")
-                p2_name = p2_state.get("name")
-                p1_types = pokemon_types.get(p1_name.lower() if p1_name else None, [])
-                p2_types = pokemon_types.get(p2_name.lower() if p2_name else None, [])
-                if p2_name:
-                    p2_known_names.add(p2_name)
-
-                # inizializza hp/status
-                if p1_name and p1_name not in p1_team_state:
-                    p1_team_state[p1_name] = {'hp_pct': 1.0, 'status': 'nostatus'}
-                if p2_name and p2_name not in p2_team_state:
-                    p2_team_state[p2_name] = {'hp_pct': 1.0, 'status': 'nostatus'}
-                if p1_name and p1_state.get('hp_pct') is not None:
-                    p1_team_state[p1_name]['hp_pct'] = p1_state.get('hp_pct')
-                if p2_name and p2_state.get('hp_pct') is not None:
-                    p2_team_state[p2_name]['hp_pct'] = p2_state.get('hp_pct')
-                if p1_name:
-                    p1_team_state[p1_name]['status'] = p1_status
-                if p2_name:
-                    p2_team_state[p2_name]['status'] = p2_status
-
-                #FIRST KO
-                if p1_status == 'fnt' or p1_state.get('hp_pct') == 0:
-                    if p1_first_ko_turn is None:
-                        p1_first_ko_turn = turn_counter
-                if p2_status == 'fnt' or p2_state.get('hp_pct') == 0:
-                    if p2_first_ko_turn is None:
-                        p2_first_ko_turn = turn_counter
-                turn_counter += 1
-
-                # ACCURACY / BASE POWER / NULL MOVES
-                if p1_details:
-                    accuracy_1 += int(p1_details.get("accuracy", 0))
-                    base_power_1 += int(p1_details.get("base_power", 0))
-                else:
-                    p1_null_moves += 1
-
-                if p2_details:
-                    accuracy_2 += int(p2_details.get("accuracy", 0))
-                    base_power_2 += int(p2_details.get("base_power", 0))
-                else:
-                    p2_null_moves += 1
-
-                # P1 STAB E EFFECTIVENESS
-                if p1_details and p1_details.get("accuracy") is not None:
-                    p1_move_type = p1_details.get("type", "").lower()
-                    if p1_move_type in p1_types:
-                        p1_stab += 1
-                    p1_effectiveness = get_effectiveness(p1_move_type, p2_types)
-                    if p1_effectiveness == 4:
-                        p1_x4_hits += 1
-                    elif p1_effectiveness == 2:
-                        p1_x2_hits += 1
-                    elif p1_effectiveness == 0.5:
-                        p1_x0_5_hits += 1
-                    elif p1_effectiveness == 0.25:
-                        p1_x0_25_hits += 1
-
-                # P2 STAB E EFFECTIVENESS
-                if p2_details and p2_details.get("accuracy") is not None:
-                    p2_move_type = p2_details.get("type", "").lower()
-                    if p2_move_type in p2_types:
-                        p2_stab += 1
-                    p2_effectiveness = get_effectiveness(p2_move_type, p1_types)
-                    if p2_effectiveness == 4:
-                        p2_x4_hits += 1
-                    elif p2_effectiveness == 2:
-                        p2_x2_hits += 1
-                    elif p2_effectiveness == 0.5:
-                        p2_x0_5_hits += 1
-                    elif p2_effectiveness == 0.25:
-                        p2_x0_25_hits += 1
-
-
-                # DIFF BOOSTS SCORE
-                p1_boosts_score = (p1_boosts.get('atk', 0) - p2_boosts.get('def', 0)) + (p1_boosts.get('spa', 0) - p2_boosts.get('spd', 0))
-                p2_boosts_score = (p2_boosts.get('atk', 0) - p1_boosts.get('def', 0)) + (p2_boosts.get('spa', 0) - p1_boosts.get('spd', 0))
-                diff_boosts_score += (p1_boosts_score - p2_boosts_score)
-
-                #STATUS COUNT
-                if p1_status == 'frz':
-                    p1_freeze_turns += 1
-                if p2_status == 'frz':  
-                    p2_freeze_turns += 1
-                if p1_status == 'brn':
-                    p1_brn_turns += 1
-                if p2_status == 'brn':  
-                    p2_brn_turns += 1
-                if p1_status == 'par':
-                    p1_par_turns += 1
-                if p2_status == 'par':  
-                    p2_par_turns +=1 
-                if p1_status == 'psn':
-                    p1_psn_turns += 1
-                if p2_status == 'psn':
-                    p2_psn_turns += 1 
-                if p1_status == 'tox':
-                    p1_tox_turns += 1
-                if p2_status == 'tox':
-                    p2_tox_turns += 1
-                if p1_status == 'slp':
-                    p1_slp_turns += 1   
-                if p2_status == 'slp':
-                    p2_slp_turns += 1
-
-            #features
-            diff_accuracy = accuracy_1 - accuracy_2
-            diff_base_power = base_power_1 - base_power_2
-            p1_norm_null_moves = p1_null_moves / ntimeline if ntimeline else 0
-            p2_norm_null_moves = p2_null_moves / ntimeline if ntimeline else 0
-            diff_null_moves = p2_norm_null_moves - p1_norm_null_moves
-            diff_boosts_score = diff_boosts_score / ntimeline if ntimeline else 0
-            diff_stab = (p1_stab - p2_stab) / ntimeline if ntimeline else 0
-            diff_x4_eff = (p1_x4_hits - p2_x4_hits) / ntimeline if ntimeline else 0
-            diff_x2_eff = (p1_x2_hits - p2_x2_hits) / ntimeline if ntimeline else 0
-            diff_x0_5_eff = (p1_x0_5_hits - p2_x0_5_hits) / ntimeline if ntimeline else 0
-            diff_x0_25_eff = (p1_x0_25_hits - p2_x0_25_hits) / ntimeline if ntimeline else 0
-            p1_first_ko = p1_first_ko_turn if p1_first_ko_turn is not None else ntimeline + 1
-            p2_first_ko = p2_first_ko_turn if p2_first_ko_turn is not None else ntimeline + 1
-            p1_alive = sum(1 for i in p1_team_state.values() if i['status'] != 'fnt')
-            p2_alive = sum(1 for i in p2_team_state.values() if i['status'] != 'fnt')
-            p1_total_hp = sum(max(0, i.get('hp_pct', 0)) for i in p1_team_state.values())
-            p2_total_hp = sum(max(0, i.get('hp_pct', 0)) for i in p2_team_state.values())
-            p1_fainted_final = len(p1_team_state) - p1_alive
-            p2_fainted_final = len(p2_team_state) - p2_alive
-            
-
-
-            #aggiunta features
-            features.update({
-                'diff_accuracy': diff_accuracy,
-                'diff_base_power': diff_base_power,
-                'diff_null_moves': diff_null_moves,
-                'diff_boosts_score': diff_boosts_score,
-                'switch_diff': switch_difference(battle),
-                'diff_stab': diff_stab,
-                'diff_x4_eff': diff_x4_eff,
-                'diff_x2_eff': diff_x2_eff,
-                'diff_x0_5_eff': diff_x0_5_eff,
-                'diff_x0_25_eff': diff_x0_25_eff,
-                'p1_first_ko': p1_first_ko,
-                'p2_first_ko': p2_first_ko,
-                'p1_final_alive': p1_alive,
-                'p2_final_alive': p2_alive,
-                'p1_final_fainted': p1_fainted_final,
-                'p2_final_fainted': p2_fainted_final,
-                'p1_final_hp_sum': p1_total_hp,
-                'p2_final_hp_sum': p2_total_hp,
-                'p1_freeze_turns': p1_freeze_turns,
-                'p2_freeze_turns': p2_freeze_turns,
-                'p1_brn_turns': p1_brn_turns,
-                'p2_brn_turns': p2_brn_turns,
-                'p1_par_turns': p1_par_turns,
-                'p2_par_turns': p2_par_turns,
-                'p1_psn_turns': p1_psn_turns,
-                'p2_psn_turns': p2_psn_turns,
-                'p1_tox_turns': p1_tox_turns,
-                'p2_tox_turns': p2_tox_turns,
-                'p1_slp_turns': p1_slp_turns,
-                'p2_slp_turns': p2_slp_turns,
-                **damage_features(battle)
-            })
-
-
-            # ID e target
-            features['battle_id'] = battle.get('battle_id')
-            if 'player_won' in battle:
-                features['player_won'] = int(battle['player_won'])
-
-            feature_list.append(features)
-
-        return pd.DataFrame(feature_list).fillna(0)
+    def create_advanced_features(self, data, n_jobs=1, chunksize=256, engine='dict', cache=None):
+        """
+        DataFrame delle feature di data (lista di dict, EncodedBattles o BattleStore), con i tipi compatti
+        dichiarati in feature_schema.
+        """
+        encoded = isinstance(data, (EncodedBattles, BattleStore))
+        if cache is not None and encoded:
+            raise ValueError("La cache delle feature lavora sulle battaglie come dict, non su EncodedBattles o BattleStore")
+        if cache is not None and engine != 'dict':
+            raise ValueError(f"La cache delle feature usa il loop sui dict, non l'engine '{engine}'")
+        if cache is not None:
+            # le battaglie gia' viste vengono lette dalla cache, le nuove estratte con il loop sui dict
+            feature_list = cache.extract(extract_battle_features, data, n_jobs=n_jobs, chunksize=chunksize)
+            df = pd.DataFrame(feature_list).fillna(0)
+        elif engine == 'columnar':
+            df = columnar_features(as_turn_table(data), 'stacking')
+        elif engine == 'compiled' and NUMBA_AVAILABLE:
+            # senza numba 'compiled' ricade sul loop sui dict
+            df = kernel_features(as_turn_table(data), 'stacking')
+        else:
+            extract = partial(extract_record_features, vocab=data.vocab) if encoded else extract_battle_features
+            feature_list = map_battles(extract, data, n_jobs=n_jobs, chunksize=chunksize)
+            df = pd.DataFrame(feature_list).fillna(0)
+        return apply_feature_schema(df, 'stacking')
+
+    def create_features_from_batches(self, batches, n_jobs=1, chunksize=256, engine='dict', cache=None):
+        df = build_feature_frame(self.create_advanced_features(batch, n_jobs, chunksize, engine, cache)
+                                 for batch in batches)
+        # una colonna assente in qualche blocco torna float dopo il fillna
+        return apply_feature_schema(df, 'stacking')
+
+    def create_both_feature_sets(self, data, n_jobs=1, chunksize=256, engine='dict'):
+        """
+        DataFrame delle feature di stacking e di voting di data, calcolati con un solo passaggio
+        sulle timeline (o una sola TurnTable con engine='columnar' e 'compiled'). Stessi valori di
+        create_advanced_features dei due FeatureHandler.
+        """
+        if engine == 'columnar':
+            table = as_turn_table(data)
+            df_stacking = columnar_features(table, 'stacking')
+            df_voting = columnar_features(table, 'voting')
+        elif engine == 'compiled' and NUMBA_AVAILABLE:
+            table = as_turn_table(data)
+            acc = accumulate_turns(table)
+            df_stacking = kernel_features(table, 'stacking', acc)
+            df_voting = kernel_features(table, 'voting', acc)
+        else:
+            if isinstance(data, (EncodedBattles, BattleStore)):
+                extract = partial(extract_both_record_feature_sets, vocab=data.vocab)
+            else:
+                extract = extract_both_feature_sets
+            pairs = map_battles(extract, data, n_jobs=n_jobs, chunksize=chunksize)
+            df_stacking = pd.DataFrame([stacking for stacking, _ in pairs]).fillna(0)
+            df_voting = pd.DataFrame([voting for _, voting in pairs]).fillna(0)
+        return apply_feature_schema(df_stacking, 'stacking'), apply_feature_schema(df_voting, 'voting')
+
+    def create_both_from_batches(self, batches, n_jobs=1, chunksize=256, engine='dict'):
+        stacking_frames, voting_frames = [], []
+        for batch in batches:
+            df_stacking, df_voting = self.create_both_feature_sets(batch, n_jobs, chunksize, engine)
+            stacking_frames.append(df_stacking)
+            voting_frames.append(df_voting)
+        return (apply_feature_schema(build_feature_frame(stacking_frames), 'stacking'),
+                apply_feature_schema(build_feature_frame(voting_frames), 'voting'))
@@ -0,0 +1,203 @@
+from set_up_scripts.dicts import status_penalties
+from set_up_scripts.pk_functions import species_index, type_index, EFFECTIVENESS_ROWS, STAB_ROWS
+
+
+STATS = ('hp', 'spe', 'atk', 'def', 'spa', 'spd')
+# status contati turno per turno (p1_freeze_turns, p1_brn_turns, ...)
+COUNTED_STATUSES = ('frz', 'brn', 'par', 'psn', 'tox', 'slp')
+# colonne del set di voting (features_ext_vot), nello stesso ordine
+VOTING_COLUMNS = (
+    'p2_lead_hp', 'diff_status_penalties', 'diff_base_power', 'diff_stab', 'diff_x2_eff', 'diff_x0_5_eff',
+    'p1_first_ko', 'p2_first_ko', 'p1_final_alive', 'p2_final_alive', 'p1_final_fainted', 'p2_final_fainted',
+    'p1_final_hp_sum', 'p2_final_hp_sum', 'p1_freeze_turns', 'p2_freeze_turns', 'battle_id', 'player_won',
+)
+
+
+class IncrementalFeatures:
+    """
+    Feature di una battaglia in corso, aggiornate un turno alla volta. battle contiene i dati
+    noti all'inizio (p1_team_details, p2_lead_details, battle_id); update(turn) applica un turno
+    della battle_timeline in O(1) e features() restituisce in ogni momento le feature della timeline
+    vista fino a quel turno. features_ext.extract_battle_features e features_ext_vot applicano
+    update a tutta la timeline, quindi il percorso sui dict ha un'unica implementazione.
+    """
+
+    def __init__(self, battle: dict):
+        self.battle_id = battle.get('battle_id')
+        self.static = {}
+        p1_team = battle.get('p1_team_details', [])
+        if p1_team:
+            # somma esatta di al piu' 6 interi: stesso valore di np.mean
+            for stat in STATS:
+                self.static[f'p1_mean_{stat}'] = sum([p.get(f'base_{stat}', 0) for p in p1_team]) / len(p1_team)
+        p2_lead = battle.get('p2_lead_details')
+        if p2_lead:
+            for stat in STATS:
+                self.static[f'p2_lead_{stat}'] = p2_lead.get(f'base_{stat}', 0)
+
+        self.n_turns = 0
+        self.accuracy = [0, 0]
+        self.base_power = [0, 0]
+        self.null_moves = [0, 0]
+        self.diff_boosts_score = 0
+        self.stab = [0, 0]
+        self.hits = [{4: 0, 2: 0, 0.5: 0, 0.25: 0}, {4: 0, 2: 0, 0.5: 0, 0.25: 0}]
+        self.first_ko = [None, None]
+        self.team_state = [{}, {}]
+        self.status_turns = [dict.fromkeys(COUNTED_STATUSES, 0), dict.fromkeys(COUNTED_STATUSES, 0)]
+        self.diff_status_penalties = 0
+
+        # danno netto (come damage_features)
+        p1_lead_name = p1_team[0].get('name') if p1_team else None
+        p2_lead_name = p2_lead.get('name') if p2_lead else None
+        self.dmg_active = [p1_lead_name if p1_team else '', (p2_lead or {}).get('name', '')]
+        self.dmg_last_hp = [1, 1]
+        self.net_damage = 0
+        self.damage_received = 0
+        self.damage_inflicted = 0
+
+        # switch volontari (come switch_difference)
+        self.sw_name = [p1_lead_name, p2_lead_name]
+        self.sw_hp = [1.0, 1.0]
+        self.sw_status = [None, None]
+        self.switches = [0, 0]
+
+    def update(self, turn: dict):
+        """Applica un turno della battle_timeline."""
+        self.n_turns += 1
+        p1_state = turn.get("p1_pokemon_state", {})
+        p2_state = turn.get("p2_pokemon_state", {})
+        p1_name = p1_state.get("name")
+        p2_name = p2_state.get("name")
+        p1_hp = p1_state.get("hp_pct")
+        p2_hp = p2_state.get("hp_pct")
+        p1_status = p1_state.get("status", "nostatus")
+        p2_status = p2_state.get("status", "nostatus")
+        self._update_side(0, p1_name, p1_hp, p1_status, turn.get("p1_move_details", {}), p2_name)
+        self._update_side(1, p2_name, p2_hp, p2_status, turn.get("p2_move_details", {}), p1_name)
+
+        # DAMAGE: l'hp mancante vale 0, al cambio di pokemon si riparte dall'hp attuale
+        dmg_active = self.dmg_active
+        dmg_last_hp = self.dmg_last_hp
+        p1_dmg_hp = p1_hp if p1_hp is not None else 0
+        p2_dmg_hp = p2_hp if p2_hp is not None else 0
+        if p1_name != dmg_active[0]:
+            dmg_last_hp[0] = p1_dmg_hp
+            dmg_active[0] = p1_name
+        if p2_name != dmg_active[1]:
+            dmg_last_hp[1] = p2_dmg_hp
+            dmg_active[1] = p2_name
+        inflicted = max(0, dmg_last_hp[1] - p2_dmg_hp)
+        received = max(0, dmg_last_hp[0] - p1_dmg_hp)
+        self.net_damage += inflicted - received
+        self.damage_inflicted += inflicted
+        self.damage_received += received
+        dmg_last_hp[0] = p1_dmg_hp
+        dmg_last_hp[1] = p2_dmg_hp
+
+        # DIFF BOOSTS SCORE
+        p1_boosts = p1_state.get("boosts", {})
+        p2_boosts = p2_state.get("boosts", {})
+        p1_boosts_score = (p1_boosts.get('atk', 0) - p2_boosts.get('def', 0)) + (p1_boosts.get('spa', 0) - p2_boosts.get('spd', 0))
+        p2_boosts_score = (p2_boosts.get('atk', 0) - p1_boosts.get('def', 0)) + (p2_boosts.get('spa', 0) - p1_boosts.get('spd', 0))
+        self.diff_boosts_score += p1_boosts_score - p2_boosts_score
+
+        # DIFF STATUS PENALTIES (set di voting)
+        self.diff_status_penalties += status_penalties.get(p1_status, 0) - status_penalties.get(p2_status, 0)
+
+    def _update_side(self, side, name, hp, status, move, opponent_name):
+        """Parte del turno che riguarda un solo giocatore (side 0 = p1, 1 = p2)."""
+        # hp/status della squadra
+        if name:
+            team = self.team_state[side]
+            pokemon = team.get(name)
+            if pokemon is None:
+                pokemon = team[name] = {'hp_pct': 1.0, 'status': 'nostatus'}
+            if hp is not None:
+                pokemon['hp_pct'] = hp
+            pokemon['status'] = status
+
+        # FIRST KO
+        if self.first_ko[side] is None and (status == 'fnt' or hp == 0):
+            self.first_ko[side] = self.n_turns
+
+        # SWITCH: conta solo i cambi non dovuti a faint
+        if name and name != self.sw_name[side]:
+            if not (self.sw_status[side] == 'fnt' or self.sw_hp[side] == 0):
+                self.switches[side] += 1
+            self.sw_name[side] = name
+        if hp is not None:
+            self.sw_hp[side] = hp
+        self.sw_status[side] = status
+
+        # ACCURACY / BASE POWER / NULL MOVES, STAB E EFFECTIVENESS
+        if move:
+            self.accuracy[side] += int(move.get("accuracy", 0))
+            self.base_power[side] += int(move.get("base_power", 0))
+            if move.get("accuracy") is not None:
+                move_type = type_index(move.get("type", "").lower())
+                if STAB_ROWS[move_type][species_index(name)]:
+                    self.stab[side] += 1
+                effectiveness = EFFECTIVENESS_ROWS[move_type][species_index(opponent_name)]
+                hits = self.hits[side]
+                if effectiveness in hits:
+                    hits[effectiveness] += 1
+        else:
+            self.null_moves[side] += 1
+
+        # STATUS COUNT
+        status_turns = self.status_turns[side]
+        if status in status_turns:
+            status_turns[status] += 1
+
+    def _normalized(self, value):
+        return value / self.n_turns if self.n_turns else 0
+
+    def features(self, feature_set='stacking', with_status_penalties=False) -> dict:
+        """
+        Feature della timeline vista finora per il set di feature (stacking o voting). Con
+        with_status_penalties=True il set di stacking include anche diff_status_penalties.
+        """
+        n = self.n_turns
+        alive = [sum(1 for i in team.values() if i['status'] != 'fnt') for team in self.team_state]
+        if self.damage_received < 1e-7:
+            damage_ratio = self.damage_inflicted
+        else:
+            damage_ratio = self.damage_inflicted / self.damage_received
+        hits = self.hits
+
+        features = dict(self.static)
+        features.update({
+            'diff_accuracy': self.accuracy[0] - self.accuracy[1],
+            'diff_base_power': self.base_power[0] - self.base_power[1],
+            'diff_null_moves': self._normalized(self.null_moves[1]) - self._normalized(self.null_moves[0]),
+            'diff_boosts_score': self._normalized(self.diff_boosts_score),
+            'switch_diff': self.switches[0] - self.switches[1],
+            'diff_stab': self._normalized(self.stab[0] - self.stab[1]),
+            'diff_x4_eff': self._normalized(hits[0][4] - hits[1][4]),
+            'diff_x2_eff': self._normalized(hits[0][2] - hits[1][2]),
+            'diff_x0_5_eff': self._normalized(hits[0][0.5] - hits[1][0.5]),
+            'diff_x0_25_eff': self._normalized(hits[0][0.25] - hits[1][0.25]),
+            'p1_first_ko': self.first_ko[0] if self.first_ko[0] is not None else n + 1,
+            'p2_first_ko': self.first_ko[1] if self.first_ko[1] is not None else n + 1,
+            'p1_final_alive': alive[0],
+            'p2_final_alive': alive[1],
+            'p1_final_fainted': len(self.team_state[0]) - alive[0],
+            'p2_final_fainted': len(self.team_state[1]) - alive[1],
+            'p1_final_hp_sum': sum(max(0, i.get('hp_pct', 0)) for i in self.team_state[0].values()),
+            'p2_final_hp_sum': sum(max(0, i.get('hp_pct', 0)) for i in self.team_state[1].values()),
+            'p1_freeze_turns': self.status_turns[0]['frz'],
+            'p2_freeze_turns': self.status_turns[1]['frz'],
+        })
+        for status in COUNTED_STATUSES[1:]:
+            features[f'p1_{status}_turns'] = self.status_turns[0][status]
+            features[f'p2_{status}_turns'] = self.status_turns[1][status]
+        features['p1_net_damage'] = self.net_damage
+        features['p1_damage_ratio'] = damage_ratio
+        if with_status_penalties or feature_set == 'voting':
+            features['diff_status_penalties'] = self.diff_status_penalties
+        features['battle_id'] = self.battle_id
+
+        if feature_set == 'voting':
+            return {col: features[col] for col in VOTING_COLUMNS if col in features}
+        return features
@@ -0,0 +1,147 @@
+import json
+import os
+import shutil
+import zlib
+from collections.abc import Sequence
+
+import numpy as np
+
+
+# indice delle righe di un .jsonl (train.jsonl -> train.lines/): lines.npy con (inizio, fine) in byte
+# di ogni riga non vuota e meta.json con il punto fino a cui il file e' stato letto
+LINE_INDEX_VERSION = 1
+# byte prima di scanned_to confrontati (crc32) per riconoscere un file riscritto da uno allungato
+TAIL_BYTES = 4096
+BLOCK_SIZE = 1 << 24
+
+
+def line_index_path(file_path):
+    """Cartella dell'indice delle righe di un .jsonl (train.jsonl -> train.lines)."""
+    return os.path.splitext(file_path)[0] + '.lines'
+
+
+def _tail_crc(f, scanned_to):
+    start = max(0, scanned_to - TAIL_BYTES)
+    f.seek(start)
+    return zlib.crc32(f.read(scanned_to - start))
+
+
+def _scan_lines(f, start, stop):
+    """
+    Righe dei byte start:stop del file come array (righe, 2) di (inizio, fine senza '\\n'), senza
+    le righe vuote, e la posizione dopo l'ultimo '\\n' (da li' riparte il prossimo aggiornamento).
+    """
+    newlines = []
+    pos = start
+    f.seek(start)
+    while pos < stop:
+        block = f.read(min(BLOCK_SIZE, stop - pos))
+        if not block:
+            break
+        newlines.append(np.flatnonzero(np.frombuffer(block, dtype=np.uint8) == ord('\n')) + pos)
+        pos += len(block)
+    ends = np.concatenate(newlines).astype(np.int64) if newlines else np.empty(0, dtype=np.int64)
+    starts = np.concatenate([[start], ends + 1]).astype(np.int64)
+    # l'ultima riga arriva alla fine del file anche senza '\n' finale
+    lines = np.stack([starts, np.append(ends, pos)], axis=1)
+    return lines[lines[:, 1] > lines[:, 0]], int(starts[-1])
+
+
+def _read_line_index(path):
+    try:
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        if meta.get('version') != LINE_INDEX_VERSION:
+            return None, None
+        return np.load(os.path.join(path, 'lines.npy')), meta
+    except (OSError, ValueError):
+        return None, None
+
+
+def _write_line_index(path, lines, meta):
+    tmp_path = path + ".tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    np.save(os.path.join(tmp_path, 'lines.npy'), lines)
+    with open(os.path.join(tmp_path, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+
+
+def build_line_index(file_path) -> np.ndarray:
+    """
+    Righe (inizio, fine) in byte del .jsonl, dall'indice salvato accanto al file. L'indice viene
+    creato alla prima chiamata e riusato finche' dimensione e mtime del file non cambiano; se il
+    file e' stato allungato (stessi byte prima dell'ultimo '\\n' indicizzato) vengono letti solo i
+    byte nuovi, altrimenti l'indice viene ricreato.
+    """
+    path = line_index_path(file_path)
+    lines, meta = _read_line_index(path)
+    stat = os.stat(file_path)
+    if lines is not None and meta['size'] == stat.st_size and meta['mtime_ns'] == stat.st_mtime_ns:
+        return lines
+    with open(file_path, 'rb') as f:
+        appended = lines is not None and meta['size'] < stat.st_size \
+                and _tail_crc(f, meta['scanned_to']) == meta['tail_crc']
+        if appended:
+            # la riga senza '\n' finale puo' essere stata allungata: si rilegge da scanned_to
+            scanned_to = meta['scanned_to']
+            lines = lines[lines[:, 0] < scanned_to]
+        else:
+            scanned_to = 0
+            lines = np.empty((0, 2), dtype=np.int64)
+        new_lines, scanned_to = _scan_lines(f, scanned_to, stat.st_size)
+        lines = np.concatenate([lines, new_lines])
+        meta = {'version': LINE_INDEX_VERSION, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+                'scanned_to': scanned_to, 'tail_crc': _tail_crc(f, scanned_to)}
+    _write_line_index(path, lines, meta)
+    return lines
+
+
+class JsonlBattles(Sequence):
+    """
+    Battaglie di un .jsonl lette su richiesta attraverso l'indice delle righe: data[i] legge e
+    decodifica solo la riga i e data[start:stop] legge il blocco di byte contiguo delle righe.
+    Con map_battles e il fork i worker ricevono gli intervalli di indici e leggono e decodificano
+    ciascuno il proprio blocco del file, quindi anche il parsing avviene in parallelo.
+    """
+
+    def __init__(self, file_path, lines, decode):
+        self.file_path = file_path
+        self.lines = lines
+        self.decode = decode
+
+    def __len__(self):
+        return len(self.lines)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            start, stop, step = i.indices(len(self))
+            if step != 1:
+                return [self[j] for j in range(start, stop, step)]
+            return [self.decode(line) for line in self.read_lines(start, stop)]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self.decode(self.read_lines(i, i + 1)[0])
+
+    def __iter__(self):
+        for start in range(0, len(self), 1024):
+            yield from self[start:start + 1024]
+
+    def read_lines(self, start, stop) -> list:
+        """Righe start:stop (bytes, senza '\\n') lette con un solo read."""
+        lines = self.lines[start:stop]
+        if not len(lines):
+            return []
+        offset = int(lines[0, 0])
+        with open(self.file_path, 'rb') as f:
+            f.seek(offset)
+            block = f.read(int(lines[-1, 1]) - offset)
+        return [block[a - offset:b - offset] for a, b in lines.tolist()]
+
+    def view(self, start, stop):
+        """JsonlBattles delle righe start:stop."""
+        return JsonlBattles(self.file_path, self.lines[start:stop], self.decode)
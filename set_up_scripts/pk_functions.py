@@ -1,10 +1,76 @@
-from set_up_scripts.dicts import gen1_type
+import numpy as np
+
+from set_up_scripts.dicts import gen1_type, pokemon_types, status_codes
+
+
+# tabella dei tipi e tipi delle specie compilati una volta in array indicizzati da interi
+TYPES = list(gen1_type)
+TYPE_INDEX = {t: i for i, t in enumerate(TYPES)}
+NOTYPE = len(TYPES)
+UNKNOWN_TYPE = NOTYPE + 1
+TYPE_INDEX['notype'] = NOTYPE
+
+# TYPE_CHART[attacco, difesa] sui 15 tipi; _CHART aggiunge 'notype' e il tipo sconosciuto (x1)
+TYPE_CHART = np.ones((NOTYPE, NOTYPE))
+for _attack, _row in gen1_type.items():
+    for _defense, _multiplier in _row.items():
+        TYPE_CHART[TYPE_INDEX[_attack], TYPE_INDEX[_defense]] = _multiplier
+_CHART = np.ones((UNKNOWN_TYPE + 1, UNKNOWN_TYPE + 1))
+_CHART[:NOTYPE, :NOTYPE] = TYPE_CHART
+_CHART_ROWS = _CHART.tolist()
+
+SPECIES = list(pokemon_types)
+SPECIES_INDEX = {s: i for i, s in enumerate(SPECIES)}
+UNKNOWN_SPECIES = len(SPECIES)
+# SPECIES_TYPES[specie] = (tipo1, tipo2), l'ultima riga e' la specie sconosciuta
+SPECIES_TYPES = np.array([[TYPE_INDEX[t] for t in pokemon_types[s]] for s in SPECIES]
+                         + [[UNKNOWN_TYPE, UNKNOWN_TYPE]], dtype=np.int8)
+
+# efficacia e STAB per (tipo della mossa, specie), anche come liste per il loop sui dict
+SPECIES_EFFECTIVENESS = _CHART[:, SPECIES_TYPES[:, 0]] * _CHART[:, SPECIES_TYPES[:, 1]]
+SPECIES_STAB = (SPECIES_TYPES[None, :, :] == np.arange(UNKNOWN_TYPE + 1)[:, None, None]).any(axis=2)
+SPECIES_STAB[UNKNOWN_TYPE] = False
+EFFECTIVENESS_ROWS = SPECIES_EFFECTIVENESS.tolist()
+STAB_ROWS = SPECIES_STAB.tolist()
+
+# id dello status 'fnt' nelle battaglie codificate (encoding.BattleRecord)
+FAINTED = status_codes.index('fnt')
+
+_species_by_name = {}
+
+
+def type_index(move_type) -> int:
+    """Indice del tipo (gia' in minuscolo) nella tabella, UNKNOWN_TYPE se non esiste."""
+    return TYPE_INDEX.get(move_type, UNKNOWN_TYPE)
+
+
+def species_index(name) -> int:
+    """Indice della specie di un pokemon dal nome (case-insensitive), UNKNOWN_SPECIES se non esiste."""
+    if not name:
+        return UNKNOWN_SPECIES
+    index = _species_by_name.get(name)
+    if index is None:
+        index = _species_by_name[name] = SPECIES_INDEX.get(name.lower(), UNKNOWN_SPECIES)
+    return index
+
+
+def effectiveness_batch(move_types, defender_species):
+    """Moltiplicatori di efficacia per array di indici di tipo della mossa e di specie difensore."""
+    return SPECIES_EFFECTIVENESS[np.asarray(move_types), np.asarray(defender_species)]
+
+
+def stab_batch(move_types, attacker_species):
+    """True dove il tipo della mossa e' uno dei tipi della specie attaccante."""
+    return SPECIES_STAB[np.asarray(move_types), np.asarray(attacker_species)]
 
 
 def damage_features(battle: dict) -> dict: 
     """
     Estrae feature legate al danno netto e al rapporto danni inflitti/subiti per P1.
+    battle puo' essere anche una battaglia codificata (encoding.BattleRecord o vista di un BattleStore).
     """
+    if not isinstance(battle, dict):
+        return _record_damage_features(battle)
     timeline = battle.get('battle_timeline', [])
     p1_net_damage = 0
     p1_last_hp_pct = 1
@@ -52,11 +118,55 @@ def damage_features(battle: dict) -> dict:
         'p1_damage_ratio': p1_damage_ratio
     }
 
+def _record_damage_features(record) -> dict:
+    p1_net_damage = 0
+    p1_last_hp_pct = p2_last_hp_pct = 1
+    p1_total_damage_received = 0
+    p1_total_damage_inflicted = 0
+    # nome '' (id 0) senza team o lead
+    p1_active_pokemon = record.first_name('p1', absent=0)
+    p2_active_pokemon = record.first_name('p2', missing=0, absent=0)
+
+    for p1_current_name, p1_current_hp_pct, p2_current_name, p2_current_hp_pct in zip(
+            record.column('p1', 'name'), record.column('p1', 'hp'),
+            record.column('p2', 'name'), record.column('p2', 'hp')):
+        # hp assente (nan) = 0
+        if p1_current_hp_pct != p1_current_hp_pct:
+            p1_current_hp_pct = 0
+        if p2_current_hp_pct != p2_current_hp_pct:
+            p2_current_hp_pct = 0
+        if p1_current_name != p1_active_pokemon:
+            p1_last_hp_pct = p1_current_hp_pct
+            p1_active_pokemon = p1_current_name
+        if p2_current_name != p2_active_pokemon:
+            p2_last_hp_pct = p2_current_hp_pct
+            p2_active_pokemon = p2_current_name
+
+        p1_damage_inflicted = max(0, p2_last_hp_pct - p2_current_hp_pct)
+        p1_damage_received = max(0, p1_last_hp_pct - p1_current_hp_pct)
+        p1_net_damage += (p1_damage_inflicted - p1_damage_received)
+        p1_total_damage_inflicted += p1_damage_inflicted
+        p1_total_damage_received += p1_damage_received
+        p1_last_hp_pct = p1_current_hp_pct
+        p2_last_hp_pct = p2_current_hp_pct
+
+    if p1_total_damage_received < 1e-7:
+        p1_damage_ratio = p1_total_damage_inflicted
+    else:
+        p1_damage_ratio = p1_total_damage_inflicted / p1_total_damage_received
+    return {
+        'p1_net_damage': p1_net_damage,
+        'p1_damage_ratio': p1_damage_ratio
+    }
+
 def switch_difference(battle: dict) -> int:
     """
     Restituisce la differenza (p1_switches - p2_switches) contando solo i switch volontari
     (cioè cambi non dovuti a faint).
+    battle puo' essere anche una battaglia codificata (encoding.BattleRecord o vista di un BattleStore).
     """
+    if not isinstance(battle, dict):
+        return _record_switch_difference(battle)
     timeline = battle.get('battle_timeline', [])
 
     p1_active_pokemon = battle.get('p1_team_details', [{}])[0].get('name') if battle.get('p1_team_details') else None
@@ -104,22 +214,36 @@ def switch_difference(battle: dict) -> int:
 
     return p1_switches - p2_switches
 
+def _record_switch_difference(record) -> int:
+    switches = []
+    for side in ('p1', 'p2'):
+        last_name, last_hp, last_status = record.first_name(side), 1.0, None
+        count = 0
+        for name, hp, status in zip(record.column(side, 'name'), record.column(side, 'hp'),
+                                    record.column(side, 'status')):
+            # nome assente = -1, '' = 0
+            if name > 0 and name != last_name:
+                if not (last_status == FAINTED or last_hp == 0):
+                    count += 1
+                last_name = name
+            # hp assente (nan): resta l'ultimo
+            if hp == hp:
+                last_hp = hp
+            last_status = status
+        switches.append(count)
+    return switches[0] - switches[1]
+
 def get_effectiveness(move_type, opponent_types):
     """Calcola il moltiplicatore di efficacia (x0, x0.25, x0.5, x1, x2, x4)"""
     if not opponent_types or not move_type:
         return 1.0
-        
-    effectiveness = 1.0
-    
-    if move_type in gen1_type:
-        attack_map = gen1_type[move_type]
-        
-        for opp_type in opponent_types:
-            if opp_type in attack_map:
-                effectiveness *= attack_map[opp_type]
-
-    else: 
+
+    attack = TYPE_INDEX.get(move_type, NOTYPE)
+    if attack >= NOTYPE:
         return 1
-                
-    return effectiveness
 
+    attack_row = _CHART_ROWS[attack]
+    effectiveness = 1.0
+    for opp_type in opponent_types:
+        effectiveness *= attack_row[TYPE_INDEX.get(opp_type, NOTYPE)]
+    return effectiveness
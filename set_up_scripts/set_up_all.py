@@ -0,0 +1,57 @@
+import os
+
+from set_up_scripts.data_processing import DataHandler, DataProcessor
+from set_up_scripts.features_ext import FeatureHandler
+
+DATA_DIR = "data"
+# cartelle dei dataset di ciascun set di feature, per far convivere stacking e voting
+FEATURE_SET_DIRS = {
+    'stacking': os.path.join(DATA_DIR, "stacking"),
+    'voting': os.path.join(DATA_DIR, "voting"),
+}
+
+
+def main(n_jobs=1, chunksize=256, streaming=False, batch_size=10000, engine='dict', fmt='npy', export_csv=False,
+         encode=False, archive=False, indexed=False):
+    """
+    Legge train.jsonl e test.jsonl una volta sola e calcola le feature di stacking e di voting
+    nello stesso passaggio sulle timeline; i dataset vanno in data/stacking/ e data/voting/.
+    """
+    DATA_PATH = 'fds-pokemon-battles-prediction-2025'
+    handler = DataHandler(DATA_PATH, encode=encode, archive=archive, indexed=indexed)
+    feature_handler = FeatureHandler(None)
+
+    if streaming:
+        handler.inspect_first_battle()
+        train = feature_handler.create_both_from_batches(
+            handler.iter_train_batches(batch_size), n_jobs=n_jobs, chunksize=chunksize, engine=engine)
+        test = feature_handler.create_both_from_batches(
+            handler.iter_test_batches(batch_size), n_jobs=n_jobs, chunksize=chunksize, engine=engine)
+    else:
+        handler.load_train_data()
+        handler.load_test_data()
+
+        handler.inspect_first_battle()
+
+        train = feature_handler.create_both_feature_sets(handler.train_data, n_jobs=n_jobs, chunksize=chunksize,
+                                                         engine=engine)
+        test = feature_handler.create_both_feature_sets(handler.test_data, n_jobs=n_jobs, chunksize=chunksize,
+                                                        engine=engine)
+
+    print(f"\nTrain battles loaded: {len(train[0])}")
+    print(f"Test battles loaded:  {len(test[0])}")
+
+    for (feature_set, save_dir), df_train, df_test in zip(FEATURE_SET_DIRS.items(), train, test):
+        print(f"Prime righe del dataset con feature di {feature_set}:")
+        print(df_train.head())
+
+        processor = DataProcessor(df_train, df_test, save_dir=save_dir, fmt=fmt, export_csv=export_csv)
+        processor.store.write("df_train", df_train)
+        processor.store.write("df_test", df_test)
+        processor.prepare_data()
+
+    print("Data processing completato.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,36 +1,56 @@
 from set_up_scripts.data_processing import DataHandler, DataProcessor
+from set_up_scripts.feature_cache import FeatureCache
 from set_up_scripts.features_ext_vot import FeatureHandler
 
 
-def main():
+def main(n_jobs=1, chunksize=256, streaming=False, batch_size=10000, engine='dict', use_cache=False,
+         incremental=False, fmt='npy', export_csv=False, encode=False, archive=False, indexed=False):
     DATA_PATH = 'fds-pokemon-battles-prediction-2025'
-    handler = DataHandler(DATA_PATH)
+    handler = DataHandler(DATA_PATH, encode=encode, archive=archive, indexed=indexed)
+    cache = FeatureCache('voting') if use_cache else None
 
-    handler.load_train_data()
-    handler.load_test_data()
+    if streaming:
+        # le battaglie passano a blocchi di batch_size dal file all'estrazione delle feature
+        handler.inspect_first_battle()
 
-    handler.inspect_first_battle()
+        feature_handler = FeatureHandler(None)
+        df_train = feature_handler.create_features_from_batches(
+            handler.iter_train_batches(batch_size), n_jobs=n_jobs, chunksize=chunksize, engine=engine, cache=cache)
+        df_test = feature_handler.create_features_from_batches(
+            handler.iter_test_batches(batch_size), n_jobs=n_jobs, chunksize=chunksize, engine=engine, cache=cache)
 
-    print(f"\nTrain battles loaded: {len(handler.train_data)}")
-    print(f"Test battles loaded:  {len(handler.test_data)}")
+        print(f"\nTrain battles loaded: {len(df_train)}")
+        print(f"Test battles loaded:  {len(df_test)}")
+    else:
+        handler.load_train_data()
+        handler.load_test_data()
 
-    train_data = handler.train_data
-    test_data = handler.test_data
+        handler.inspect_first_battle()
 
-    feature_handler = FeatureHandler(train_data)
-    df_train = feature_handler.create_advanced_features(train_data)
-    df_test = feature_handler.create_advanced_features(test_data)
+        print(f"\nTrain battles loaded: {len(handler.train_data)}")
+        print(f"Test battles loaded:  {len(handler.test_data)}")
+
+        train_data = handler.train_data
+        test_data = handler.test_data
+
+        feature_handler = FeatureHandler(train_data)
+        df_train = feature_handler.create_advanced_features(train_data, n_jobs=n_jobs, chunksize=chunksize, engine=engine, cache=cache)
+        df_test = feature_handler.create_advanced_features(test_data, n_jobs=n_jobs, chunksize=chunksize, engine=engine, cache=cache)
+
+    if cache is not None:
+        cache.save()
 
     print("Prime righe del dataset con feature estratte:")
     print(df_train.head())
 
-    df_train.to_pickle("data/df_train.pkl")
-    df_train.to_csv("data/df_train.csv", index=False)
-    df_test.to_pickle("data/df_test.pkl")
-    df_test.to_csv("data/df_test.csv", index=False)
-
-    processor = DataProcessor(df_train, df_test)
-    Y_train, X_train, X_test = processor.prepare_data()
+    processor = DataProcessor(df_train, df_test, fmt=fmt, export_csv=export_csv)
+    if incremental:
+        processor.store.upsert("df_train", df_train)
+        processor.store.upsert("df_test", df_test)
+    else:
+        processor.store.write("df_train", df_train)
+        processor.store.write("df_test", df_test)
+    Y_train, X_train, X_test = processor.prepare_data(incremental=incremental)
 
     print("Data processing completato.")
 
@@ -0,0 +1,234 @@
+import numpy as np
+import pandas as pd
+
+from set_up_scripts.columnar import (
+    FNT, OTHER_STATUS, STATUS_ID, STATUS_PENALTY, TurnTable, _normalized, feature_frame, static_columns,
+)
+from set_up_scripts.pk_functions import SPECIES_EFFECTIVENESS, SPECIES_STAB, UNKNOWN_SPECIES
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+NUMBA_AVAILABLE = njit is not None
+
+# colonne del vettore di accumulatori per battaglia (p1 in i, p2 in i + 1)
+N_TURNS = 0
+ACCURACY = 1
+BASE_POWER = 3
+NULL_MOVES = 5
+BOOSTS = 7
+STAB = 8
+X4 = 10
+X2 = 12
+X0_5 = 14
+X0_25 = 16
+FIRST_KO = 18
+ALIVE = 20
+SEEN = 22
+HP_SUM = 24
+SWITCHES = 26
+NET_DAMAGE = 28
+INFLICTED = 29
+RECEIVED = 30
+PENALTIES = 31
+STATUS_COUNTS = 32
+N_STATUSES = OTHER_STATUS + 1
+N_ACCUMULATORS = STATUS_COUNTS + 2 * N_STATUSES
+
+
+def _accumulate(offsets, names, hp, status, boosts, has_move, accuracy, has_accuracy, base_power, move_type,
+                name_species, first_dmg, first_sw, stab_table, eff_table, penalty, out):
+    """
+    Un solo passaggio sui turni di tutte le battaglie con gli stessi accumulatori di
+    extract_battle_features, su array numerici (compilato con numba quando e' installato).
+    names/hp/status/... hanno una colonna per lato, boosts e' (turni, 2, [atk, def, spa, spd]).
+    """
+    for b in range(len(offsets) - 1):
+        start = offsets[b]
+        nt = offsets[b + 1] - start
+        out[b, N_TURNS] = nt
+        # team_state: nomi nell'ordine di prima apparizione con l'ultimo hp e status
+        seen = np.empty((2, nt), dtype=np.int64)
+        seen_hp = np.empty((2, nt))
+        seen_status = np.empty((2, nt), dtype=np.int64)
+        n_seen = np.zeros(2, dtype=np.int64)
+        first_ko = np.full(2, nt + 1, dtype=np.int64)
+        dmg_active = first_dmg[b].copy()
+        dmg_last_hp = np.ones(2)
+        sw_name = first_sw[b].copy()
+        sw_hp = np.ones(2)
+        sw_status = np.full(2, -1, dtype=np.int64)
+
+        for i in range(start, start + nt):
+            turn = i - start + 1
+            losses = np.zeros(2)
+            for s in range(2):
+                name = names[i, s]
+                h = hp[i, s]
+                st = np.int64(status[i, s])
+                if name > 0:
+                    j = 0
+                    while j < n_seen[s] and seen[s, j] != name:
+                        j += 1
+                    if j == n_seen[s]:
+                        seen[s, j] = name
+                        seen_hp[s, j] = 1.0
+                        n_seen[s] += 1
+                    if not np.isnan(h):
+                        seen_hp[s, j] = h
+                    seen_status[s, j] = st
+
+                if first_ko[s] == nt + 1 and (st == FNT or h == 0):
+                    first_ko[s] = turn
+
+                # DAMAGE: l'hp mancante vale 0, al cambio di pokemon si riparte dall'hp attuale
+                dmg_hp = 0.0 if np.isnan(h) else h
+                if name != dmg_active[s]:
+                    dmg_last_hp[s] = dmg_hp
+                    dmg_active[s] = name
+                loss = dmg_last_hp[s] - dmg_hp
+                losses[s] = loss if loss > 0 else 0.0
+                dmg_last_hp[s] = dmg_hp
+
+                # SWITCH: conta solo i cambi non dovuti a faint
+                if name > 0 and name != sw_name[s]:
+                    if not (sw_status[s] == FNT or sw_hp[s] == 0):
+                        out[b, SWITCHES + s] += 1
+                    sw_name[s] = name
+                if not np.isnan(h):
+                    sw_hp[s] = h
+                sw_status[s] = st
+
+                if has_move[i, s]:
+                    out[b, ACCURACY + s] += accuracy[i, s]
+                    out[b, BASE_POWER + s] += base_power[i, s]
+                    if has_accuracy[i, s]:
+                        mt = move_type[i, s]
+                        own = name_species[name] if name >= 0 else UNKNOWN_SPECIES
+                        opp_name = names[i, 1 - s]
+                        opp = name_species[opp_name] if opp_name >= 0 else UNKNOWN_SPECIES
+                        if stab_table[mt, own]:
+                            out[b, STAB + s] += 1
+                        eff = eff_table[mt, opp]
+                        if eff == 4:
+                            out[b, X4 + s] += 1
+                        elif eff == 2:
+                            out[b, X2 + s] += 1
+                        elif eff == 0.5:
+                            out[b, X0_5 + s] += 1
+                        elif eff == 0.25:
+                            out[b, X0_25 + s] += 1
+                else:
+                    out[b, NULL_MOVES + s] += 1
+
+                out[b, STATUS_COUNTS + s * N_STATUSES + st] += 1
+
+            out[b, INFLICTED] += losses[1]
+            out[b, RECEIVED] += losses[0]
+            out[b, NET_DAMAGE] += losses[1] - losses[0]
+            p1_score = (boosts[i, 0, 0] - boosts[i, 1, 1]) + (boosts[i, 0, 2] - boosts[i, 1, 3])
+            p2_score = (boosts[i, 1, 0] - boosts[i, 0, 1]) + (boosts[i, 1, 2] - boosts[i, 0, 3])
+            out[b, BOOSTS] += p1_score - p2_score
+            out[b, PENALTIES] += penalty[status[i, 0]] - penalty[status[i, 1]]
+
+        for s in range(2):
+            out[b, FIRST_KO + s] = first_ko[s]
+            out[b, SEEN + s] = n_seen[s]
+            alive = 0
+            hp_sum = 0.0
+            for j in range(n_seen[s]):
+                if seen_status[s, j] != FNT:
+                    alive += 1
+                if seen_hp[s, j] > 0:
+                    hp_sum += seen_hp[s, j]
+            out[b, ALIVE + s] = alive
+            out[b, HP_SUM + s] = hp_sum
+
+
+_kernel = njit(cache=True, nogil=True)(_accumulate) if NUMBA_AVAILABLE else _accumulate
+
+
+def accumulate_turns(table: TurnTable) -> np.ndarray:
+    """Matrice (battaglie, N_ACCUMULATORS) degli accumulatori per battaglia della TurnTable."""
+    t = table.turns
+    b = table.battles
+    sides = ('p1', 'p2')
+
+    def pair(col, dtype):
+        return np.ascontiguousarray(np.stack([t[f'{side}_{col}'] for side in sides], axis=1), dtype=dtype)
+
+    boosts = np.stack([pair(stat, np.int64) for stat in ('atk', 'def', 'spa', 'spd')], axis=2)
+    first_dmg = np.stack([np.where(b['p1_lead_name'] == -2, 0, b['p1_lead_name']), b['p2_lead_name_dmg']], axis=1)
+    first_sw = np.stack([np.where(b['p1_lead_name'] == -2, -1, b['p1_lead_name']), b['p2_lead_name_sw']], axis=1)
+    out = np.zeros((len(table), N_ACCUMULATORS))
+    _kernel(table.offsets, pair('name', np.int64), pair('hp', np.float64), pair('status', np.int64), boosts,
+            pair('has_move', np.bool_), pair('accuracy', np.int64), pair('has_accuracy', np.bool_),
+            pair('base_power', np.int64), pair('move_type', np.int64), table.name_species().astype(np.int64),
+            first_dmg.astype(np.int64), first_sw.astype(np.int64), SPECIES_STAB, SPECIES_EFFECTIVENESS,
+            STATUS_PENALTY, out)
+    return out
+
+
+def kernel_features(table: TurnTable, feature_set='stacking', acc=None) -> pd.DataFrame:
+    """
+    Feature di features_ext (stacking) o features_ext_vot (voting) dagli accumulatori di
+    accumulate_turns; stesse colonne e stessi valori di columnar_features. acc permette di
+    calcolare i due set con un solo passaggio.
+    """
+    if acc is None:
+        acc = accumulate_turns(table)
+    n = acc[:, N_TURNS].astype(np.int64)
+
+    def diff(col, as_int=True):
+        values = acc[:, col] - acc[:, col + 1]
+        return values.astype(np.int64) if as_int else values
+
+    def status_turns(side, status):
+        return acc[:, STATUS_COUNTS + side * N_STATUSES + STATUS_ID[status]].astype(np.int64)
+
+    cols = static_columns(table, feature_set)
+    if feature_set == 'stacking':
+        cols.update({
+            'diff_accuracy': diff(ACCURACY),
+            'diff_base_power': diff(BASE_POWER),
+            'diff_null_moves': _normalized(acc[:, NULL_MOVES + 1], n) - _normalized(acc[:, NULL_MOVES], n),
+            'diff_boosts_score': _normalized(acc[:, BOOSTS], n),
+            'switch_diff': diff(SWITCHES),
+            'diff_stab': _normalized(diff(STAB, False), n),
+            'diff_x4_eff': _normalized(diff(X4, False), n),
+            'diff_x2_eff': _normalized(diff(X2, False), n),
+            'diff_x0_5_eff': _normalized(diff(X0_5, False), n),
+            'diff_x0_25_eff': _normalized(diff(X0_25, False), n),
+        })
+    else:
+        cols.update({
+            'diff_status_penalties': acc[:, PENALTIES].astype(np.int64),
+            'diff_base_power': diff(BASE_POWER),
+            'diff_stab': _normalized(diff(STAB, False), n),
+            'diff_x2_eff': _normalized(diff(X2, False), n),
+            'diff_x0_5_eff': _normalized(diff(X0_5, False), n),
+        })
+
+    cols.update({
+        'p1_first_ko': acc[:, FIRST_KO].astype(np.int64),
+        'p2_first_ko': acc[:, FIRST_KO + 1].astype(np.int64),
+        'p1_final_alive': acc[:, ALIVE].astype(np.int64),
+        'p2_final_alive': acc[:, ALIVE + 1].astype(np.int64),
+        'p1_final_fainted': (acc[:, SEEN] - acc[:, ALIVE]).astype(np.int64),
+        'p2_final_fainted': (acc[:, SEEN + 1] - acc[:, ALIVE + 1]).astype(np.int64),
+        'p1_final_hp_sum': acc[:, HP_SUM],
+        'p2_final_hp_sum': acc[:, HP_SUM + 1],
+        'p1_freeze_turns': status_turns(0, 'frz'),
+        'p2_freeze_turns': status_turns(1, 'frz'),
+    })
+    if feature_set == 'stacking':
+        for status in ('brn', 'par', 'psn', 'tox', 'slp'):
+            cols[f'p1_{status}_turns'] = status_turns(0, status)
+            cols[f'p2_{status}_turns'] = status_turns(1, status)
+        inflicted, received = acc[:, INFLICTED], acc[:, RECEIVED]
+        cols['p1_net_damage'] = acc[:, NET_DAMAGE]
+        cols['p1_damage_ratio'] = np.where(received < 1e-7, inflicted,
+                                           inflicted / np.where(received < 1e-7, 1, received))
+    return feature_frame(table, cols)
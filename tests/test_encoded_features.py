@@ -0,0 +1,49 @@
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import make_edge_battles
+from set_up_scripts import features_ext, features_ext_vot
+from set_up_scripts.battle_store import BattleStore
+from set_up_scripts.encoding import BattleVocabulary, EncodedBattles, encode_battle
+
+
+BATTLES = make_edge_battles()
+MODULES = {'stacking': features_ext, 'voting': features_ext_vot}
+
+
+@pytest.fixture(params=['record', 'store', 'archive'])
+def encoded(request, tmp_path):
+    """Le battaglie limite come EncodedBattles, BattleStore in memoria e BattleStore da archivio."""
+    if request.param == 'record':
+        vocab = BattleVocabulary()
+        return EncodedBattles(vocab, [encode_battle(battle, vocab) for battle in BATTLES])
+    store = BattleStore.from_battles(BATTLES)
+    if request.param == 'store':
+        return store
+    path = str(tmp_path / 'train.battles')
+    store.save(path)
+    return BattleStore.open(path)
+
+
+@pytest.mark.parametrize('feature_set', ['stacking', 'voting'])
+def test_record_extractor_matches_dict_loop(encoded, feature_set):
+    module = MODULES[feature_set]
+    reference = pd.DataFrame([module.extract_battle_features(b) for b in BATTLES]).fillna(0)
+    df = pd.DataFrame([module.extract_record_features(r, encoded.vocab) for r in encoded]).fillna(0)
+    pd.testing.assert_frame_equal(reference, df, check_exact=True)
+
+
+@pytest.mark.parametrize('engine', ['dict', 'columnar', 'compiled'])
+@pytest.mark.parametrize('feature_set', ['stacking', 'voting'])
+def test_handler_engines_match_dict_loop(encoded, feature_set, engine):
+    handler = MODULES[feature_set].FeatureHandler(None)
+    reference = handler.create_advanced_features(BATTLES)
+    df = handler.create_advanced_features(encoded, engine=engine)
+    assert set(df.columns) == set(reference.columns)
+    pd.testing.assert_frame_equal(reference, df[reference.columns], check_exact=True)
+
+
+def test_both_feature_sets_match_dict_loop(encoded):
+    handler = features_ext.FeatureHandler(None)
+    for reference, df in zip(handler.create_both_feature_sets(BATTLES), handler.create_both_feature_sets(encoded)):
+        pd.testing.assert_frame_equal(reference, df, check_exact=True)
@@ -0,0 +1,67 @@
+import copy
+
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import make_edge_battles
+from set_up_scripts import features_ext, features_ext_vot, turn_kernel
+from set_up_scripts.columnar import columnar_features, flatten_battles
+
+
+BATTLES = make_edge_battles()
+MODULES = {'stacking': features_ext, 'voting': features_ext_vot}
+
+
+def _kernels():
+    kernels = [pytest.param(turn_kernel._accumulate, id='interpretato')]
+    try:
+        from numba import njit
+    except ImportError:
+        kernels.append(pytest.param(None, id='numba', marks=pytest.mark.skip(reason="numba non installato")))
+    else:
+        kernels.append(pytest.param(njit(cache=True)(turn_kernel._accumulate), id='numba'))
+    return kernels
+
+
+@pytest.fixture(params=_kernels())
+def kernel(request, monkeypatch):
+    monkeypatch.setattr(turn_kernel, '_kernel', request.param)
+    return request.param
+
+
+@pytest.mark.parametrize('feature_set', ['stacking', 'voting'])
+def test_kernel_matches_dict_loop(kernel, feature_set):
+    reference = pd.DataFrame([MODULES[feature_set].extract_battle_features(b) for b in BATTLES]).fillna(0)
+    df = turn_kernel.kernel_features(flatten_battles(BATTLES), feature_set)
+    assert set(df.columns) == set(reference.columns)
+    pd.testing.assert_frame_equal(reference, df[reference.columns], check_exact=True)
+
+
+@pytest.mark.parametrize('feature_set', ['stacking', 'voting'])
+def test_kernel_matches_columnar(kernel, feature_set):
+    table = flatten_battles(BATTLES)
+    pd.testing.assert_frame_equal(columnar_features(table, feature_set),
+                                  turn_kernel.kernel_features(table, feature_set), check_exact=True)
+
+
+def test_shared_accumulators(kernel):
+    table = flatten_battles(BATTLES)
+    acc = turn_kernel.accumulate_turns(table)
+    assert acc.shape == (len(BATTLES), turn_kernel.N_ACCUMULATORS)
+    for feature_set in MODULES:
+        pd.testing.assert_frame_equal(turn_kernel.kernel_features(table, feature_set, acc),
+                                      turn_kernel.kernel_features(table, feature_set), check_exact=True)
+
+
+@pytest.mark.parametrize('engine', ['dict', 'columnar', 'compiled'])
+@pytest.mark.parametrize('feature_set', ['stacking', 'voting'])
+def test_string_battle_ids(feature_set, engine):
+    """battle_id non numerici restano stringhe e le altre colonne non cambiano (apply_feature_schema)."""
+    battles = copy.deepcopy(BATTLES)
+    for i, battle in enumerate(battles):
+        battle['battle_id'] = f"b{i}"
+    handler = MODULES[feature_set].FeatureHandler(None)
+    reference = handler.create_advanced_features(BATTLES, engine=engine)
+    df = handler.create_advanced_features(battles, engine=engine)
+    assert df['battle_id'].tolist() == [battle['battle_id'] for battle in battles]
+    pd.testing.assert_frame_equal(reference.drop(columns='battle_id'), df.drop(columns='battle_id'), check_exact=True)